@@ -0,0 +1,80 @@
+# bench_chunking.py
+"""
+Microbenchmark chunking: cách cũ (cắt cứng theo số từ) so với chunking.split_into_chunks
+(gom câu theo ngân sách token + overlap) trên văn bản vài MB, kiểm tra thời gian tăng tuyến tính.
+Chạy từ thư mục gốc của repo:
+    python benchmarks/bench_chunking.py --sizes 1 2 4 8 --max-tokens 256 --overlap 32
+    python benchmarks/bench_chunking.py --tokenizer /models/bge-m3/tokenizer.json
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chunking import load_tokenizer, split_into_chunks  # noqa: E402
+
+_WORDS = ("hợp đồng các bên thỏa thuận thực hiện điều khoản thanh toán bảo hành giao hàng "
+          "contract party agreement payment warranty delivery invoice schedule 2024 15% VND").split()
+
+
+def legacy_chunk_text(text: str, max_tokens: int):
+    words = text.split()
+    return [" ".join(words[i:i + max_tokens]) for i in range(0, len(words), max_tokens)]
+
+
+def make_text(size_mb: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts, size = [], 0
+    target = int(size_mb * 1024 * 1024)
+    while size < target:
+        sentences = []
+        for _ in range(rng.randint(2, 8)):
+            words = [rng.choice(_WORDS) for _ in range(rng.randint(5, 40))]
+            sentences.append(" ".join(words).capitalize() + rng.choice(".!?"))
+        paragraph = " ".join(sentences)
+        parts.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(parts)
+
+
+def _best(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 2, 4, 8], help="kích thước văn bản (MB)")
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--overlap", type=int, default=32)
+    parser.add_argument("--tokenizer", default="", help="vocab.txt hoặc tokenizer.json cục bộ (mặc định: đếm từ)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tokenizer = load_tokenizer(args.tokenizer)
+    print(f"tokenizer: {tokenizer.name}, max_tokens={args.max_tokens}, overlap={args.overlap}")
+    print(f"{'MB':>5} {'impl':<8} {'time (s)':>9} {'MB/s':>7} {'chunks':>8} {'max tokens':>11}")
+    for size in args.sizes:
+        text = make_text(size)
+        cases = {
+            "legacy": lambda: legacy_chunk_text(text, args.max_tokens),
+            "chunking": lambda: split_into_chunks(text, args.max_tokens, args.overlap, tokenizer),
+        }
+        for name, fn in cases.items():
+            elapsed, chunks = _best(fn, args.repeat)
+            if name == "legacy":
+                biggest = max(tokenizer.count_many(chunks)) if chunks else 0
+            else:
+                biggest = max(c.tokens for c in chunks) if chunks else 0
+            print(f"{size:>5g} {name:<8} {elapsed:>9.3f} {size / elapsed:>7.1f} {len(chunks):>8} {biggest:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# bench_docx.py
+"""
+So sánh tốc độ và peak RSS khi đọc DOCX: python-docx (dựng toàn bộ Document) và engine stream
+(iterparse word/document.xml). File được sinh trực tiếp dưới dạng OOXML, gồm đoạn văn, bảng,
+header và footer. Mỗi lần đo chạy trong một process riêng.
+Chạy từ thư mục gốc của repo:
+    python benchmarks/bench_docx.py --paragraphs 20000 --tables 300
+"""
+import argparse
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+_W_NS = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" ' \
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+_REL_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+_CONTENT_TYPES = (
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/header1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.header+xml"/>'
+    '<Override PartName="/word/footer1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.footer+xml"/>'
+    '</Types>'
+)
+
+
+def _paragraph(text: str) -> str:
+    # Chia thành nhiều run như file Word thật
+    words = text.split(" ")
+    half = len(words) // 2
+    return (f'<w:p><w:r><w:rPr><w:b/></w:rPr><w:t xml:space="preserve">{" ".join(words[:half])} </w:t></w:r>'
+            f'<w:r><w:t>{" ".join(words[half:])}</w:t></w:r></w:p>')
+
+
+def _table(n: int, rows: int = 6, cols: int = 4) -> str:
+    return "<w:tbl>" + "".join(
+        "<w:tr>" + "".join(f"<w:tc>{_paragraph(f'table {n} row {r} cell {c}')}</w:tc>" for c in range(cols)) + "</w:tr>"
+        for r in range(rows)
+    ) + "</w:tbl>"
+
+
+def make_docx(path: Path, paragraphs: int, tables: int):
+    table_every = max(1, paragraphs // max(tables, 1))
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        z.writestr("_rels/.rels",
+                   '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                   f'<Relationship Id="rId1" Type="{_REL_TYPE}officeDocument" Target="word/document.xml"/>'
+                   '</Relationships>')
+        z.writestr("word/_rels/document.xml.rels",
+                   '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                   f'<Relationship Id="rId1" Type="{_REL_TYPE}header" Target="header1.xml"/>'
+                   f'<Relationship Id="rId2" Type="{_REL_TYPE}footer" Target="footer1.xml"/>'
+                   '</Relationships>')
+        z.writestr("word/header1.xml", f"<w:hdr {_W_NS}>{_paragraph('CONFIDENTIAL contract header')}</w:hdr>")
+        z.writestr("word/footer1.xml", f"<w:ftr {_W_NS}>{_paragraph('Company footer text')}</w:ftr>")
+        body = []
+        for i in range(paragraphs):
+            body.append(_paragraph(f"Điều {i}: các bên thỏa thuận thực hiện hợp đồng theo những điều khoản sau đây"))
+            if tables and i % table_every == table_every - 1:
+                body.append(_table(i // table_every))
+        z.writestr("word/document.xml", f"<w:document {_W_NS}><w:body>{''.join(body)}</w:body></w:document>")
+
+
+def _run_python_docx(path: Path) -> str:
+    from extractor_service import extract_text_from_word
+    return extract_text_from_word(path, engine="python-docx")
+
+
+def _run_stream(path: Path) -> str:
+    from docx_text import extract_docx_blocks
+    return "\n\n".join(extract_docx_blocks(path))
+
+
+def _run_stream_headers(path: Path) -> str:
+    from docx_text import extract_docx_blocks
+    return "\n\n".join(extract_docx_blocks(path, include_headers=True))
+
+
+ENGINES = {
+    "python-docx": _run_python_docx,
+    "stream": _run_stream,
+    "stream+headers": _run_stream_headers,
+}
+
+
+def _measure(name: str, path: str, results):
+    start = time.perf_counter()
+    text = ENGINES[name](Path(path))
+    elapsed = time.perf_counter() - start
+    # Linux: ru_maxrss tính bằng KiB
+    peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    results.put((name, elapsed, peak_mib, len(text), text.count("| table")))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=20_000)
+    parser.add_argument("--tables", type=int, default=300)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="bench_docx_") as tmp:
+        path = Path(tmp) / "contract.docx"
+        make_docx(path, args.paragraphs, args.tables)
+        print(f"generated {path.name}: {args.paragraphs} paragraphs, {args.tables} tables, "
+              f"{path.stat().st_size / 1024 ** 2:.1f} MiB")
+
+        print(f"{'engine':<15} {'time (s)':>10} {'peak RSS (MiB)':>15} {'chars':>10} {'table cells':>12}")
+        for name in ENGINES:
+            results = ctx.Queue()
+            proc = ctx.Process(target=_measure, args=(name, str(path), results))
+            proc.start()
+            name, elapsed, peak_mib, n_chars, n_cells = results.get()
+            proc.join()
+            print(f"{name:<15} {elapsed:>10.2f} {peak_mib:>15.1f} {n_chars:>10} {n_cells:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# bench_excel.py
+"""
+So sánh extract_data_from_excel_as_markdown (read-only, streaming) với cách cũ
+(load_workbook đầy đủ + list(sheet.values)) trên workbook lớn được sinh ra.
+
+Mỗi lần đo chạy trong một process riêng để lấy đúng peak RSS (ru_maxrss).
+Chạy từ thư mục gốc của repo:
+    python benchmarks/bench_excel.py --rows 500000 --cols 20
+"""
+import argparse
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import openpyxl  # noqa: E402
+
+from extractor_service import extract_data_from_excel_as_markdown  # noqa: E402
+
+
+def legacy_extract_data_from_excel_as_markdown(path: Path, row_limit: int = 50):
+    """Bản cũ: dựng toàn bộ workbook trong RAM trước khi tạo chunk đầu tiên."""
+    chunks = []
+    workbook = openpyxl.load_workbook(path, data_only=True)
+    for sheet_name in workbook.sheetnames:
+        sheet = workbook[sheet_name]
+        rows = list(sheet.values)
+        if not rows:
+            continue
+        header = [str(cell) if cell is not None else "" for cell in rows[0]]
+        data_rows = rows[1:]
+        for i in range(0, len(data_rows), row_limit):
+            chunk_rows = data_rows[i:i + row_limit]
+            chunk_md_lines = [f"## Sheet: {sheet_name}\n"]
+            chunk_md_lines.append(f"| {' | '.join(header)} |")
+            chunk_md_lines.append(f"| {' | '.join(['---'] * len(header))} |")
+            for row in chunk_rows:
+                row_str = [str(cell) if cell is not None else "" for cell in row]
+                chunk_md_lines.append(f"| {' | '.join(row_str)} |")
+            chunks.append("\n".join(chunk_md_lines))
+    return chunks
+
+
+IMPLEMENTATIONS = {
+    "legacy": legacy_extract_data_from_excel_as_markdown,
+    "streaming": extract_data_from_excel_as_markdown,
+}
+
+
+def make_workbook(path: Path, rows: int, cols: int, empty_tail: int):
+    """Workbook 1 sheet: header + `rows` dòng dữ liệu, thêm cột/dòng rỗng ở cuối như file export thật."""
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("data")
+    sheet.append([f"col_{c}" for c in range(cols)] + [None] * empty_tail)
+    for r in range(rows):
+        sheet.append([r, f"name {r}", r * 0.5] + [f"v{r}_{c}" for c in range(3, cols)] + [None] * empty_tail)
+    for _ in range(empty_tail):
+        sheet.append([None] * (cols + empty_tail))
+    workbook.save(path)
+
+
+def _measure(name: str, path: str, row_limit: int, results):
+    start = time.perf_counter()
+    chunks = IMPLEMENTATIONS[name](Path(path), row_limit)
+    elapsed = time.perf_counter() - start
+    # Linux: ru_maxrss tính bằng KiB
+    peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    results.put((name, elapsed, peak_mib, len(chunks), sum(len(c) for c in chunks)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--cols", type=int, default=20)
+    parser.add_argument("--empty-tail", type=int, default=5, help="số cột và dòng rỗng ở cuối sheet")
+    parser.add_argument("--row-limit", type=int, default=50)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="bench_excel_") as tmp:
+        path = Path(tmp) / "large.xlsx"
+        start = time.perf_counter()
+        make_workbook(path, args.rows, args.cols, args.empty_tail)
+        print(f"generated {path.name}: {args.rows} rows x {args.cols} cols, "
+              f"{path.stat().st_size / 1024 ** 2:.1f} MiB in {time.perf_counter() - start:.1f}s")
+
+        print(f"{'impl':<10} {'time (s)':>10} {'peak RSS (MiB)':>15} {'chunks':>8} {'output chars':>14}")
+        for name in IMPLEMENTATIONS:
+            results = ctx.Queue()
+            proc = ctx.Process(target=_measure, args=(name, str(path), args.row_limit, results))
+            proc.start()
+            name, elapsed, peak_mib, n_chunks, n_chars = results.get()
+            proc.join()
+            print(f"{name:<10} {elapsed:>10.2f} {peak_mib:>15.1f} {n_chunks:>8} {n_chars:>14}")
+
+
+if __name__ == "__main__":
+    main()
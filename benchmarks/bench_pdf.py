@@ -0,0 +1,133 @@
+# bench_pdf.py
+"""
+So sánh các backend trích xuất PDF (pdf_backends.py): trang/giây, peak RSS và độ khớp text
+với một backend tham chiếu (tỉ lệ từ của bản tham chiếu cũng xuất hiện trong kết quả, trung bình theo file).
+Mỗi backend chạy trong một process riêng, một luồng, trên cùng bộ file. Backend chưa cài được bỏ qua.
+Chạy từ thư mục gốc của repo:
+    python benchmarks/bench_pdf.py --corpus /data/pdfs            bộ PDF thật của bạn
+    python benchmarks/bench_pdf.py --pages 300                    PDF sinh sẵn (chỉ có text)
+    python benchmarks/bench_pdf.py --corpus /data/pdfs --backends pypdf2 pymupdf --reference pymupdf
+"""
+import argparse
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def make_pdf(path: Path, pages: int, lines_per_page: int = 45):
+    """PDF tối giản (font Helvetica chuẩn, text ASCII) để không cần reportlab."""
+    objects: List[bytes] = [b"<< /Type /Catalog /Pages 2 0 R >>", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for p in range(pages):
+        lines = [f"Section {p + 1}.{i + 1}: the parties agree to perform the contract under these terms {i * 7 % 13}"
+                 for i in range(lines_per_page)]
+        stream = "BT /F1 10 Tf 50 800 Td 14 TL " + " ".join(f"({line}) '" for line in lines) + " ET"
+        data = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(data), data))
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, obj)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+
+
+def _measure(name: str, paths: List[str], results):
+    from pdf_backends import get_pdf_backend
+
+    backend = get_pdf_backend(name)
+    texts: Dict[str, str] = {}
+    n_pages = 0
+    start = time.perf_counter()
+    for path in paths:
+        try:
+            pages = backend.extract_range(path)
+        except Exception as e:
+            pages = []
+            print(f"  {name}: {Path(path).name} failed: {e}")
+        n_pages += len(pages)
+        texts[path] = "\n".join(pages)
+    elapsed = time.perf_counter() - start
+    # Linux: ru_maxrss tính bằng KiB
+    peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    results.put((name, elapsed, peak_mib, n_pages, texts))
+
+
+def word_recall(reference: str, text: str) -> float:
+    """Tỉ lệ từ của bản tham chiếu (tính cả số lần lặp) có trong text."""
+    ref = Counter(reference.lower().split())
+    if not ref:
+        return 1.0
+    got = Counter(text.lower().split())
+    return sum(min(n, got[w]) for w, n in ref.items()) / sum(ref.values())
+
+
+def main():
+    from pdf_backends import PDF_BACKENDS, available_backends
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, help="thư mục chứa PDF (đọc đệ quy)")
+    parser.add_argument("--pages", type=int, default=300, help="số trang của PDF sinh sẵn khi không có --corpus")
+    parser.add_argument("--backends", nargs="*", default=list(PDF_BACKENDS))
+    parser.add_argument("--reference", default="", help="backend tham chiếu cho cột match (mặc định backend đầu tiên)")
+    args = parser.parse_args()
+
+    backends = [b for b in args.backends if b in available_backends()]
+    skipped = [b for b in args.backends if b not in backends]
+    if skipped:
+        print(f"skipped (not installed): {', '.join(skipped)}")
+    if not backends:
+        return
+    reference = args.reference if args.reference in backends else backends[0]
+
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="bench_pdf_") as tmp:
+        if args.corpus:
+            paths = sorted(str(p) for p in args.corpus.rglob("*") if p.suffix.lower() == ".pdf")
+            print(f"corpus {args.corpus}: {len(paths)} files")
+        else:
+            path = Path(tmp) / "generated.pdf"
+            make_pdf(path, args.pages)
+            paths = [str(path)]
+            print(f"generated {path.name}: {args.pages} pages, {path.stat().st_size / 1024 ** 2:.1f} MiB")
+        if not paths:
+            return
+
+        runs = {}
+        for name in backends:
+            results = ctx.Queue()
+            proc = ctx.Process(target=_measure, args=(name, paths, results))
+            proc.start()
+            runs[name] = results.get()[1:]
+            proc.join()
+
+        ref_texts = runs[reference][3]
+        print(f"{'backend':<10} {'time (s)':>9} {'pages/s':>9} {'peak RSS (MiB)':>15} {'chars':>11} "
+              f"{'match vs ' + reference:>20}")
+        for name in backends:
+            elapsed, peak_mib, n_pages, texts = runs[name]
+            n_chars = sum(len(t) for t in texts.values())
+            match = sum(word_recall(ref_texts[p], texts[p]) for p in paths) / len(paths)
+            print(f"{name:<10} {elapsed:>9.2f} {n_pages / elapsed if elapsed else 0:>9.1f} {peak_mib:>15.1f} "
+                  f"{n_chars:>11} {match:>19.1%}")
+
+
+if __name__ == "__main__":
+    main()
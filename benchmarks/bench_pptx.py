@@ -0,0 +1,116 @@
+# bench_pptx.py
+"""
+Đo throughput (slide/s) trích xuất PPTX: bản cũ (ET.fromstring + findall, sắp xếp theo tên)
+so với extract_pptx_slides (iterparse, thứ tự từ presentation.xml) chạy tuần tự và song song.
+
+Deck được sinh trực tiếp dưới dạng OOXML (không cần python-pptx), mỗi slide có tiêu đề,
+nội dung, một bảng và ghi chú. Chạy từ thư mục gốc của repo:
+    python benchmarks/bench_pptx.py --slides 600 --workers 4
+"""
+import argparse
+import re
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pptx_text import extract_pptx_slides  # noqa: E402
+
+_NS = ('xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+       'xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main" '
+       'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"')
+_RELS_NS = 'xmlns="http://schemas.openxmlformats.org/package/2006/relationships"'
+_REL_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+
+
+def legacy_extract_text_from_pptx(path: Path) -> str:
+    """Bản cũ: đọc cả slide vào bộ nhớ, thứ tự slide theo sắp xếp chuỗi."""
+    text_chunks = []
+    with zipfile.ZipFile(path, 'r') as z:
+        slide_files = [f for f in z.namelist() if f.startswith("ppt/slides/slide") and f.endswith(".xml")]
+        for slide_file in sorted(slide_files):
+            tree = ET.fromstring(z.read(slide_file))
+            ns = {"a": "http://schemas.openxmlformats.org/drawingml/2006/main"}
+            texts = [node.text for node in tree.findall(".//a:t", ns) if node.text]
+            if texts:
+                text_chunks.append("\n".join(texts))
+    return "\n\n".join(text_chunks)
+
+
+def _paragraph(text: str) -> str:
+    return f"<a:p><a:r><a:t>{text}</a:t></a:r></a:p>"
+
+
+def _slide_xml(n: int, paragraphs: int, table_rows: int) -> str:
+    body = "".join(_paragraph(f"Slide {n} bullet {i}: lorem ipsum dolor sit amet") for i in range(paragraphs))
+    rows = "".join(
+        "<a:tr>" + "".join(f"<a:tc><a:txBody>{_paragraph(f'r{r}c{c}')}</a:txBody></a:tc>" for c in range(4)) + "</a:tr>"
+        for r in range(table_rows)
+    )
+    return (f'<p:sld {_NS}><p:cSld><p:spTree>'
+            f'<p:sp><p:txBody>{_paragraph(f"Title {n}")}</p:txBody></p:sp>'
+            f'<p:sp><p:txBody>{body}</p:txBody></p:sp>'
+            f'<p:graphicFrame><a:graphic><a:graphicData><a:tbl>{rows}</a:tbl></a:graphicData></a:graphic></p:graphicFrame>'
+            f'</p:spTree></p:cSld></p:sld>')
+
+
+def make_deck(path: Path, slides: int, paragraphs: int = 8, table_rows: int = 5):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        ids = "".join(f'<p:sldId id="{256 + n}" r:id="rId{n}"/>' for n in range(1, slides + 1))
+        z.writestr("ppt/presentation.xml", f"<p:presentation {_NS}><p:sldIdLst>{ids}</p:sldIdLst></p:presentation>")
+        rels = "".join(f'<Relationship Id="rId{n}" Type="{_REL_TYPE}slide" Target="slides/slide{n}.xml"/>'
+                       for n in range(1, slides + 1))
+        z.writestr("ppt/_rels/presentation.xml.rels", f"<Relationships {_RELS_NS}>{rels}</Relationships>")
+        for n in range(1, slides + 1):
+            z.writestr(f"ppt/slides/slide{n}.xml", _slide_xml(n, paragraphs, table_rows))
+            z.writestr(f"ppt/slides/_rels/slide{n}.xml.rels",
+                       f'<Relationships {_RELS_NS}><Relationship Id="rId1" Type="{_REL_TYPE}notesSlide" '
+                       f'Target="../notesSlides/notesSlide{n}.xml"/></Relationships>')
+            z.writestr(f"ppt/notesSlides/notesSlide{n}.xml",
+                       f"<p:notes {_NS}><p:cSld><p:spTree><p:sp><p:txBody>"
+                       f"{_paragraph(f'Speaker notes for slide {n}')}</p:txBody></p:sp></p:spTree></p:cSld></p:notes>")
+
+
+def _timed(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slides", type=int, default=600)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_pptx_") as tmp:
+        path = Path(tmp) / "deck.pptx"
+        make_deck(path, args.slides)
+        print(f"generated {path.name}: {args.slides} slides, {path.stat().st_size / 1024 ** 2:.1f} MiB")
+
+        cases = {
+            "legacy": lambda: legacy_extract_text_from_pptx(path).split("\n\n"),
+            "iterparse": lambda: extract_pptx_slides(path, workers=1),
+            "iterparse+notes": lambda: extract_pptx_slides(path, include_notes=True, workers=1),
+            f"parallel x{args.workers}": lambda: extract_pptx_slides(path, workers=args.workers, block=True),
+        }
+        # Khởi động process pool trước để không tính thời gian spawn
+        extract_pptx_slides(path, workers=args.workers, block=True)
+
+        print(f"{'impl':<18} {'time (s)':>10} {'slides/s':>10} {'in order':>9}")
+        for name, fn in cases.items():
+            elapsed, slides = _timed(fn, args.repeat)
+            numbers = [int(m.group(1)) for m in (re.match(r"Title (\d+)", s) for s in slides) if m]
+            print(f"{name:<18} {elapsed:>10.3f} {args.slides / elapsed:>10.0f} {str(numbers == sorted(numbers)):>9}")
+
+
+if __name__ == "__main__":
+    main()
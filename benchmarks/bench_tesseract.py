@@ -0,0 +1,133 @@
+# bench_tesseract.py
+"""
+Độ trễ mỗi trang của chế độ model=tesseract trong ocr_service (text của các box đã detect):
+- per-box:    cách cũ, pytesseract.image_to_string cho từng box (mỗi box một process tesseract + file ảnh tạm)
+- page-pass:  tesseract_engine không có tesserocr, pytesseract một lần cho cả trang
+- tesserocr:  tesseract_engine với instance Tesseract giữ sẵn trong process, SetRectangle cho từng box
+Trang được sinh sẵn (mỗi dòng một box, biết trước text) nên không cần PaddleOCR; cột recall là tỉ lệ từ
+đúng so với text gốc. Lần chạy đầu của mỗi chế độ (khởi tạo instance) không được tính.
+Chạy từ thư mục gốc của repo:
+    python benchmarks/bench_tesseract.py --lines 60 --pages 5
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_pdf import word_recall  # noqa: E402
+
+_FONTS = ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "/usr/share/fonts/TTF/DejaVuSans.ttf", "DejaVuSans.ttf")
+
+
+def _font(size: int):
+    from PIL import ImageFont
+
+    for name in _FONTS:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+
+def make_page(lines: int, width: int = 1700, font_size: int = 28):
+    """Ảnh trang RGB (numpy), box 4 điểm kiểu PaddleOCR cho từng dòng và text của từng dòng."""
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    font = _font(font_size)
+    line_height = int(font_size * 1.8)
+    image = Image.new("RGB", (width, 80 + lines * line_height), "white")
+    draw = ImageDraw.Draw(image)
+    boxes, texts = [], []
+    for i in range(lines):
+        text = f"Section {i + 1}: the parties agree to perform contract {1000 + i * 37} under these terms"
+        x, y = 60, 40 + i * line_height
+        draw.text((x, y), text, fill="black", font=font)
+        left, top, right, bottom = draw.textbbox((x, y), text, font=font)
+        left, top, right, bottom = left - 6, top - 6, right + 6, bottom + 6
+        boxes.append([[left, top], [right, top], [right, bottom], [left, bottom]])
+        texts.append(text)
+    return np.array(image), boxes, texts
+
+
+def _per_box(image, boxes, lang: str) -> List[str]:
+    import pytesseract
+
+    texts = []
+    for box in boxes:
+        xs = [int(pt[0]) for pt in box]
+        ys = [int(pt[1]) for pt in box]
+        cropped = image[max(0, min(ys)):max(ys), max(0, min(xs)):max(xs)]
+        texts.append(pytesseract.image_to_string(cropped, lang=lang).strip())
+    return texts
+
+
+def _engine(name: str) -> Callable:
+    from tesseract_engine import box_to_rect, recognize_boxes
+
+    def run(image, boxes, lang: str) -> List[str]:
+        height, width = image.shape[:2]
+        rects = [box_to_rect(box, width, height) for box in boxes]
+        return [t.strip() for t in recognize_boxes(image, rects, lang, engine=name)]
+
+    return run
+
+
+def available_modes() -> Dict[str, Callable]:
+    import shutil
+
+    from tesseract_engine import tesserocr_available
+
+    modes: Dict[str, Callable] = {}
+    if shutil.which("tesseract"):
+        modes["per-box"] = _per_box
+        modes["page-pass"] = _engine("pytesseract")
+    if tesserocr_available():
+        modes["tesserocr"] = _engine("tesserocr")
+    return modes
+
+
+def measure(run: Callable, pages: List[Tuple], lang: str) -> Tuple[List[float], float]:
+    image, boxes, _ = pages[0]
+    run(image, boxes, lang)  # khởi tạo, không tính
+    latencies, recalls = [], []
+    for image, boxes, truth in pages:
+        start = time.perf_counter()
+        texts = run(image, boxes, lang)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(word_recall("\n".join(truth), "\n".join(texts)))
+    return latencies, sum(recalls) / len(recalls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=60, help="số dòng (box) mỗi trang")
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--lang", default="eng")
+    args = parser.parse_args()
+
+    modes = available_modes()
+    if "per-box" not in modes:
+        print("skipped per-box, page-pass: tesseract binary not installed")
+    if "tesserocr" not in modes:
+        print("skipped tesserocr: pip install tesserocr")
+    if not modes:
+        return
+
+    pages = [make_page(args.lines) for _ in range(args.pages)]
+    print(f"{args.pages} pages x {args.lines} boxes, {pages[0][0].shape[1]}x{pages[0][0].shape[0]} px")
+    print(f"{'mode':<10} {'mean (ms)':>10} {'p50 (ms)':>9} {'max (ms)':>9} {'ms/box':>7} {'recall':>7}")
+    for name, run in modes.items():
+        latencies, recall = measure(run, pages, args.lang)
+        mean = statistics.mean(latencies)
+        print(f"{name:<10} {mean:>10.1f} {statistics.median(latencies):>9.1f} {max(latencies):>9.1f} "
+              f"{mean / args.lines:>7.2f} {recall:>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# chunk_output.py
+"""
+Bản ghi chunk phẳng kèm nguồn gốc (file, dải trang, vị trí ký tự, hash nội dung) và các định dạng xuất:
+- json: {tên file: [chunk, ...]} như trước đây
+- jsonl: mỗi dòng một bản ghi
+- parquet: file dạng cột để nạp hàng loạt (cần package `pyarrow`, chỉ import khi dùng)
+
+Vị trí [char_start, char_end) tính trên text đã trích xuất của file (chưa thêm custom prefix).
+Trang bắt đầu từ 1: trang PDF, slide PPTX. Word và Excel không có trang; Excel không có vị trí ký tự
+vì chunk Markdown được dựng lại từ các ô.
+"""
+import hashlib
+import importlib.util
+import json
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from chunking import Chunk
+
+OUTPUT_FORMATS = ("json", "jsonl", "parquet")
+
+# Số bản ghi mỗi row group của file parquet
+PARQUET_ROW_GROUP_SIZE = 10_000
+
+
+@dataclass
+class ChunkRecord:
+    file: str
+    chunk_index: int
+    page_start: Optional[int]
+    page_end: Optional[int]
+    char_start: Optional[int]
+    char_end: Optional[int]
+    sha256: str
+    text: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+RECORD_FIELDS = [f.name for f in fields(ChunkRecord)]
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def text_record(file: str, chunk_index: int, text: str) -> ChunkRecord:
+    """Bản ghi không có trang và vị trí (chunk Excel, thông báo lỗi)."""
+    return ChunkRecord(file, chunk_index, None, None, None, None, text_sha256(text), text)
+
+
+def chunk_records(file: str, chunks: List[Chunk], prefix: str = "",
+                  page_at: Optional[Callable[[int], int]] = None) -> List[ChunkRecord]:
+    """Bản ghi của các chunk text; `page_at(offset)` trả về số trang chứa vị trí đó (nếu file có trang)."""
+    records = []
+    for i, chunk in enumerate(chunks):
+        text = prefix + chunk.text
+        page_start = page_end = None
+        if page_at is not None:
+            page_start = page_at(chunk.start)
+            page_end = page_at(max(chunk.start, chunk.end - 1))
+        records.append(ChunkRecord(file, i, page_start, page_end, chunk.start, chunk.end, text_sha256(text), text))
+    return records
+
+
+def record_line(record: ChunkRecord) -> str:
+    return json.dumps(record.to_dict(), ensure_ascii=False) + "\n"
+
+
+def parquet_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+class ParquetRecordWriter:
+    """
+    Ghi bản ghi ra file parquet theo từng row group (nén zstd), không giữ toàn bộ kết quả trong RAM.
+    Dùng với `with`: file chỉ hoàn chỉnh sau khi close().
+    """
+
+    def __init__(self, path: Path, row_group_size: int = PARQUET_ROW_GROUP_SIZE):
+        import pyarrow as pa  # chỉ cần khi xuất parquet
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self.schema = pa.schema([
+            ("file", pa.string()),
+            ("chunk_index", pa.int32()),
+            ("page_start", pa.int32()),
+            ("page_end", pa.int32()),
+            ("char_start", pa.int64()),
+            ("char_end", pa.int64()),
+            ("sha256", pa.string()),
+            ("text", pa.large_string()),
+        ])
+        self._writer = pq.ParquetWriter(str(path), self.schema, compression="zstd")
+        self.row_group_size = row_group_size
+        self._pending: List[ChunkRecord] = []
+        self.rows = 0
+
+    def write(self, records: Iterable[ChunkRecord]):
+        self._pending.extend(records)
+        while len(self._pending) >= self.row_group_size:
+            self._flush(self._pending[:self.row_group_size])
+            self._pending = self._pending[self.row_group_size:]
+
+    def _flush(self, records: List[ChunkRecord]):
+        columns = {name: [getattr(r, name) for r in records] for name in RECORD_FIELDS}
+        self._writer.write_table(self._pa.table(columns, schema=self.schema))
+        self.rows += len(records)
+
+    def close(self):
+        if self._pending:
+            self._flush(self._pending)
+            self._pending = []
+        self._writer.close()
+
+    def abort(self):
+        """Đóng file khi có lỗi, bỏ các bản ghi chưa ghi (file không dùng được, caller xóa nó)."""
+        self._pending = []
+        self._writer.close()
+
+    def __enter__(self) -> "ParquetRecordWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
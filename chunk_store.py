@@ -0,0 +1,163 @@
+# chunk_store.py
+"""
+Local store of chunk output per member, for incremental re-extraction.
+
+Entries are keyed by SHA-256 of the member bytes plus a fingerprint of every
+parameter that affects chunking (custom prefix, chunk sizes, format options,
+tokenizer), so a member that did not change is served without parsing it again.
+A manifest returned to the client maps each member to its content hash and
+chunk ids; sending it back with the next upload yields a diff of added and
+removed chunks for updating a vector index.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from chunk_output import ChunkRecord
+from chunking import CHUNK_TOKENIZER
+from conversion_cache import LruFileStore
+
+CHUNK_STORE_DIR = os.getenv("CHUNK_STORE_DIR", str(Path(tempfile.gettempdir()) / "chunk_store"))
+CHUNK_STORE_MAX_BYTES = int(os.getenv("CHUNK_STORE_MAX_BYTES", str(512 * 1024 ** 2)))
+
+# Tăng khi cách trích xuất/chunk thay đổi để không dùng lại kết quả cũ
+CHUNK_STORE_VERSION = "2"
+MANIFEST_VERSION = 1
+
+
+def chunk_params_key(options: Dict[str, Any]) -> str:
+    """Fingerprint of the chunking parameters, stored in the manifest as `params`."""
+    tokenizer = CHUNK_TOKENIZER
+    if tokenizer and os.path.exists(tokenizer):
+        tokenizer = f"{tokenizer}:{os.path.getmtime(tokenizer)}"
+    data = json.dumps({"version": CHUNK_STORE_VERSION, "tokenizer": tokenizer, "options": options}, sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def chunk_ids(member: str, chunks: List[str]) -> List[str]:
+    """Stable id per chunk: same member + same text (+ occurrence for repeats) gives the same id."""
+    seen: Dict[str, int] = {}
+    ids = []
+    for chunk in chunks:
+        occurrence = seen.get(chunk, 0)
+        seen[chunk] = occurrence + 1
+        ids.append(hashlib.blake2b(f"{member}\0{occurrence}\0{chunk}".encode("utf-8"), digest_size=16).hexdigest())
+    return ids
+
+
+def parse_manifest(data: bytes) -> Dict[str, Any]:
+    """Validate a manifest sent back by a client. Raises ValueError when it is not usable."""
+    try:
+        manifest = json.loads(data)
+    except ValueError as e:
+        raise ValueError(f"Manifest is not valid JSON: {e}")
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Manifest version must be {MANIFEST_VERSION}.")
+    members = manifest.get("members")
+    if not isinstance(members, dict) or not all(
+        isinstance(m, dict) and isinstance(m.get("sha256"), str) and isinstance(m.get("chunks"), list)
+        for m in members.values()
+    ):
+        raise ValueError("Manifest members must map names to {sha256, chunks}.")
+    return manifest
+
+
+class ManifestDiff:
+    """
+    Builds the new manifest for one request and the diff against the manifest the client sent.
+    Members whose extraction failed keep their previous entry so the index is not wiped.
+    """
+
+    def __init__(self, params_key: str, previous: Optional[Dict[str, Any]] = None):
+        self.params_key = params_key
+        self.previous_params = (previous or {}).get("params")
+        self.previous: Dict[str, Dict[str, Any]] = (previous or {}).get("members", {})
+        self.members: Dict[str, Dict[str, Any]] = {}
+        self.files: Dict[str, List[str]] = {"added": [], "changed": [], "unchanged": [], "deleted": [], "failed": []}
+        self.removed: List[Dict[str, str]] = []
+
+    def reusable(self) -> Dict[str, str]:
+        """{member: sha256} that can be skipped entirely: only when the chunking parameters did not change."""
+        if self.previous_params != self.params_key:
+            return {}
+        return {name: member["sha256"] for name, member in self.previous.items()}
+
+    def unchanged(self, name: str):
+        self.members[name] = self.previous[name]
+        self.files["unchanged"].append(name)
+
+    def failed(self, name: str):
+        if name in self.previous:
+            self.members[name] = self.previous[name]
+        self.files["failed"].append(name)
+
+    def update(self, name: str, sha256: str, records: List[ChunkRecord]) -> List[Dict[str, Any]]:
+        """Record new output for a member; returns its chunk records (with ids) that are not in the previous manifest."""
+        ids = chunk_ids(name, [r.text for r in records])
+        old = self.previous.get(name)
+        old_ids = set(old["chunks"]) if old else set()
+        if old:
+            new_ids = set(ids)
+            self.removed.extend({"id": i, "file": name} for i in old["chunks"] if i not in new_ids)
+        self.files["changed" if old else "added"].append(name)
+        self.members[name] = {"sha256": sha256, "chunks": ids}
+        return [{"id": chunk_id, **record.to_dict()} for chunk_id, record in zip(ids, records) if chunk_id not in old_ids]
+
+    def finish(self) -> Dict[str, Any]:
+        """Members missing from this upload are deleted; returns the new manifest."""
+        for name, member in self.previous.items():
+            if name not in self.members:
+                self.files["deleted"].append(name)
+                self.removed.extend({"id": i, "file": name} for i in member["chunks"])
+        return {"version": MANIFEST_VERSION, "params": self.params_key, "members": self.members}
+
+
+class ChunkStore(LruFileStore):
+    """Size-bounded LRU store of chunk records (JSON) stored under `directory`."""
+
+    suffix = ".json"
+
+    def __init__(self, directory: str = CHUNK_STORE_DIR, max_bytes: int = CHUNK_STORE_MAX_BYTES):
+        super().__init__(directory, max_bytes)
+
+    @staticmethod
+    def make_key(content_sha256: str, params_key: str) -> str:
+        return hashlib.sha256(f"{content_sha256}:{params_key}".encode()).hexdigest()
+
+    def get(self, key: str, file: str) -> Optional[List[ChunkRecord]]:
+        """Stored chunk records for `key` attributed to `file`, or None on a miss."""
+        path = self._lookup(key)
+        if path is None:
+            return None
+        try:
+            rows = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)  # giữ thứ tự LRU khi khởi động lại
+        except (FileNotFoundError, ValueError):
+            # Bị process khác evict giữa chừng hoặc file hỏng
+            self._lost()
+            return None
+        return [ChunkRecord(file=file, **row) for row in rows]
+
+    def put(self, key: str, records: List[ChunkRecord]):
+        # Cùng nội dung có thể được upload dưới tên khác: không lưu tên file
+        rows = [{k: v for k, v in r.to_dict().items() if k != "file"} for r in records]
+        self._write(key, lambda tmp_path: tmp_path.write_text(json.dumps(rows, ensure_ascii=False), encoding="utf-8"))
+
+
+_store: Optional[ChunkStore] = None
+_store_lock = threading.Lock()
+
+
+def get_chunk_store() -> Optional[ChunkStore]:
+    """Process-wide store instance, or None when disabled (CHUNK_STORE_MAX_BYTES=0)."""
+    global _store
+    if CHUNK_STORE_MAX_BYTES <= 0:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = ChunkStore()
+    return _store
@@ -0,0 +1,263 @@
+# chunking.py
+"""
+Chia văn bản thành chunk theo ngân sách token thật của model embedding.
+
+Văn bản được tách thành đoạn (dòng trống) và câu; các câu được gom vào chunk cho tới khi chạm
+max_tokens, chunk sau lặp lại `overlap` token cuối của chunk trước (theo đơn vị câu).
+Câu dài hơn ngân sách được cắt theo từ. Mỗi chunk giữ vị trí [start, end) trong văn bản gốc.
+Toàn bộ chạy tuyến tính theo độ dài văn bản: mỗi câu chỉ được đếm token một lần.
+
+Tokenizer cấu hình bằng CHUNK_TOKENIZER (đường dẫn file cục bộ, không tải qua mạng):
+- vocab.txt (WordPiece kiểu BERT): cài sẵn, không cần thư viện ngoài
+- tokenizer.json (HuggingFace): cần package `tokenizers`
+Không cấu hình thì token = từ (tách theo khoảng trắng) như trước đây.
+"""
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", "")
+CHUNK_TOKENIZER_LOWERCASE = os.getenv("CHUNK_TOKENIZER_LOWERCASE", "1") != "0"
+
+# Kết thúc câu: dấu câu + khoảng trắng, hoặc xuống dòng. Đoạn văn: dòng trống.
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?…;:])\s+|\n+")
+_WORD = re.compile(r"\S+")
+
+
+class WhitespaceTokenizer:
+    """Token = từ tách theo khoảng trắng (cách đếm cũ của chunk_text)."""
+
+    name = "whitespace"
+
+    def count(self, text: str) -> int:
+        return len(text.split())
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        return [len(t.split()) for t in texts]
+
+
+class CharTokenizer:
+    """Đếm theo ký tự, dùng cho chunk_size."""
+
+    name = "chars"
+
+    def count(self, text: str) -> int:
+        return len(text)
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        return [len(t) for t in texts]
+
+
+class WordPieceTokenizer:
+    """
+    Đếm token WordPiece (BERT) từ file vocab.txt: tách từ và dấu câu như BasicTokenizer,
+    mỗi từ được chia theo khớp dài nhất trong vocab. Kết quả theo từ được cache.
+    """
+
+    name = "wordpiece"
+    _BASIC_TOKEN = re.compile(r"\w+|[^\w\s]")
+    _CACHE_LIMIT = 200_000
+
+    def __init__(self, vocab_path: Path, lowercase: bool = True, max_chars_per_word: int = 100):
+        with open(vocab_path, encoding="utf-8") as f:
+            self.vocab = {line.rstrip("\n") for line in f if line.strip()}
+        self.lowercase = lowercase
+        self.max_chars_per_word = max_chars_per_word
+        self._cache: Dict[str, int] = {}
+
+    def _word_count(self, word: str) -> int:
+        count = self._cache.get(word)
+        if count is not None:
+            return count
+        if len(word) > self.max_chars_per_word:
+            count = 1  # [UNK]
+        else:
+            count, start = 0, 0
+            while start < len(word):
+                end = len(word)
+                while end > start:
+                    piece = word[start:end] if start == 0 else "##" + word[start:end]
+                    if piece in self.vocab:
+                        break
+                    end -= 1
+                if end == start:
+                    count = 1  # cả từ thành [UNK]
+                    break
+                count += 1
+                start = end
+        if len(self._cache) >= self._CACHE_LIMIT:
+            self._cache.clear()
+        self._cache[word] = count
+        return count
+
+    def count(self, text: str) -> int:
+        if self.lowercase:
+            text = text.lower()
+        return sum(self._word_count(w) for w in self._BASIC_TOKEN.findall(text))
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        return [self.count(t) for t in texts]
+
+
+class HuggingFaceTokenizer:
+    """Đếm token bằng file tokenizer.json của HuggingFace (package `tokenizers`, đọc file cục bộ)."""
+
+    name = "huggingface"
+
+    def __init__(self, path: Path):
+        from tokenizers import Tokenizer  # chỉ cần khi dùng tokenizer.json
+        self._tokenizer = Tokenizer.from_file(str(path))
+
+    def count(self, text: str) -> int:
+        return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        encodings = self._tokenizer.encode_batch(texts, add_special_tokens=False)
+        return [len(e.ids) for e in encodings]
+
+
+@lru_cache(maxsize=None)
+def load_tokenizer(path: str = ""):
+    """Tokenizer từ file cục bộ theo phần mở rộng (.json: HuggingFace, còn lại: vocab WordPiece)."""
+    if not path:
+        return WhitespaceTokenizer()
+    file = Path(path)
+    if not file.is_file():
+        raise ValueError(f"Tokenizer file not found: {path}")
+    if file.suffix.lower() == ".json":
+        return HuggingFaceTokenizer(file)
+    return WordPieceTokenizer(file, lowercase=CHUNK_TOKENIZER_LOWERCASE)
+
+
+def get_tokenizer():
+    """Tokenizer cấu hình qua CHUNK_TOKENIZER, nạp một lần cho mỗi process."""
+    return load_tokenizer(CHUNK_TOKENIZER)
+
+
+@dataclass
+class Chunk:
+    text: str
+    start: int
+    end: int
+    tokens: int
+
+
+def _iter_units(text: str) -> Iterator[Tuple[int, int]]:
+    """Vị trí [start, end) của từng câu (không gồm khoảng trắng bao quanh), đoạn văn luôn ngắt câu."""
+    for paragraph in _split_spans(text, _PARAGRAPH_BREAK, 0, len(text)):
+        yield from _split_spans(text, _SENTENCE_END, *paragraph)
+
+
+def _split_spans(text: str, pattern: "re.Pattern", start: int, end: int) -> Iterator[Tuple[int, int]]:
+    pos = start
+    for match in pattern.finditer(text, start, end):
+        if match.start() > pos:
+            yield _strip_span(text, pos, match.start())
+        pos = match.end()
+    if pos < end:
+        span = _strip_span(text, pos, end)
+        if span[0] < span[1]:
+            yield span
+
+
+def _strip_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _split_long_unit(text: str, start: int, end: int, max_tokens: int, tokenizer) -> List[Tuple[int, int, int]]:
+    """
+    Cắt câu dài hơn ngân sách theo từ. Theo ký tự thì từ quá dài bị cắt cứng;
+    theo token thì một từ dài hơn ngân sách vẫn được giữ nguyên.
+    """
+    by_chars = isinstance(tokenizer, CharTokenizer)
+    words: List[Tuple[int, int]] = []
+    for m in _WORD.finditer(text, start, end):
+        if by_chars and m.end() - m.start() > max_tokens:
+            words.extend((s, min(s + max_tokens, m.end())) for s in range(m.start(), m.end(), max_tokens))
+        else:
+            words.append((m.start(), m.end()))
+    counts = [e - s for s, e in words] if by_chars else tokenizer.count_many([text[s:e] for s, e in words])
+
+    pieces: List[Tuple[int, int, int]] = []
+    piece_start, piece_end, piece_tokens = None, 0, 0
+    for (s, e), n in zip(words, counts):
+        if piece_start is not None:
+            cost = e - piece_start if by_chars else piece_tokens + n
+            if cost > max_tokens:
+                pieces.append((piece_start, piece_end, piece_tokens))
+                piece_start, piece_tokens = None, 0
+        if piece_start is None:
+            piece_start = s
+        piece_end = e
+        piece_tokens = piece_end - piece_start if by_chars else piece_tokens + n
+    if piece_start is not None:
+        pieces.append((piece_start, piece_end, piece_tokens))
+    return pieces
+
+
+def split_into_chunks(text: str, max_tokens: int, overlap: int = 0, tokenizer=None) -> List[Chunk]:
+    """
+    Gom câu thành chunk <= max_tokens token (trừ khi một từ đơn lẻ đã vượt ngân sách).
+    overlap: số token tối đa của các câu cuối chunk trước được lặp lại ở đầu chunk sau.
+    Số token của chunk = tổng token của các câu (gần đúng với BPE ở chỗ nối câu);
+    với CharTokenizer thì là độ dài thật của chunk, kể cả khoảng trắng giữa các câu.
+    """
+    if not text:
+        return []
+    tokenizer = tokenizer or get_tokenizer()
+    if max_tokens <= 0:
+        return [Chunk(text, 0, len(text), tokenizer.count(text))]
+    overlap = max(0, min(overlap, max_tokens - 1))
+    by_chars = isinstance(tokenizer, CharTokenizer)
+
+    spans = list(_iter_units(text))
+    counts = [e - s for s, e in spans] if by_chars else tokenizer.count_many([text[s:e] for s, e in spans])
+    units: List[Tuple[int, int, int]] = []
+    for (s, e), n in zip(spans, counts):
+        if n > max_tokens:
+            units.extend(_split_long_unit(text, s, e, max_tokens, tokenizer))
+        else:
+            units.append((s, e, n))
+
+    # prefix[k] = tổng token của units[:k]
+    prefix = [0]
+    for unit in units:
+        prefix.append(prefix[-1] + unit[2])
+
+    def cost(a: int, b: int) -> int:
+        """Chi phí của chunk gồm units[a:b]."""
+        return units[b - 1][1] - units[a][0] if by_chars else prefix[b] - prefix[a]
+
+    chunks: List[Chunk] = []
+    i, n_units = 0, len(units)
+    while i < n_units:
+        j = i + 1
+        while j < n_units and cost(i, j + 1) <= max_tokens:
+            j += 1
+        chunks.append(Chunk(text[units[i][0]:units[j - 1][1]], units[i][0], units[j - 1][1], cost(i, j)))
+        if j >= n_units:
+            break
+        # Lùi lại các câu cuối làm overlap; chunk sau luôn bắt đầu sau chunk trước
+        # và phải còn chỗ cho ít nhất câu mới đầu tiên
+        k = j
+        while k - 1 > i and cost(k - 1, j) <= overlap and cost(k - 1, j + 1) <= max_tokens:
+            k -= 1
+        i = k
+    return chunks
+
+
+def chunk_text_spans(text: str, chunk_size: int = 0, max_tokens: int = 0, overlap: int = 0) -> List[Chunk]:
+    """max_tokens > 0: theo token của tokenizer cấu hình; chunk_size > 0: theo ký tự; overlap cùng đơn vị."""
+    if max_tokens > 0:
+        return split_into_chunks(text, max_tokens, overlap)
+    if chunk_size > 0:
+        return split_into_chunks(text, chunk_size, overlap, CharTokenizer())
+    return split_into_chunks(text, 0) if text else []
@@ -0,0 +1,173 @@
+# conversion_cache.py
+"""
+Content-addressed on-disk cache for Office -> PDF conversions.
+
+Entries are keyed by SHA-256 of the input bytes plus the LibreOffice version,
+so an upgrade of the converter never serves stale output. The cache is bounded
+by total size and evicts the least recently used PDFs first.
+"""
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+CONVERSION_CACHE_DIR = os.getenv("CONVERSION_CACHE_DIR", str(Path(tempfile.gettempdir()) / "office_pdf_cache"))
+CONVERSION_CACHE_MAX_BYTES = int(os.getenv("CONVERSION_CACHE_MAX_BYTES", str(1024 ** 3)))
+
+
+def file_sha256(path: Path) -> str:
+    """Hash a file in 1 MB blocks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def converter_version(soffice_path: str) -> str:
+    """Version string of the LibreOffice binary, e.g. 'LibreOffice 7.3.7.2 30(Build:2)'."""
+    try:
+        out = subprocess.run([soffice_path, "--version"], capture_output=True, timeout=60)
+        return out.stdout.decode(errors="replace").strip() or soffice_path
+    except Exception:
+        return soffice_path
+
+
+class LruFileStore:
+    """
+    Size-bounded LRU store of one file per key under `directory` (sharded by the first two hex digits).
+    Subclasses decide the file suffix and how values are read and written.
+    """
+
+    suffix = ""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> size, thứ tự từ cũ nhất tới mới dùng gần nhất
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+
+        existing = sorted(self.directory.glob(f"*/*{self.suffix}"), key=lambda p: p.stat().st_mtime)
+        for path in existing:
+            size = path.stat().st_size
+            self._entries[path.stem] = size
+            self._total_bytes += size
+        # A leftover directory may be larger than the current limit (e.g. max_bytes was lowered)
+        with self._lock:
+            self._evict()
+
+    def _path_for(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}{self.suffix}"
+
+    def _lookup(self, key: str) -> Optional[Path]:
+        """Path of the stored file for `key`, marked as most recently used, or None on a miss."""
+        path = self._path_for(key)
+        with self._lock:
+            if key not in self._entries or not path.exists():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return path
+
+    def _lost(self):
+        """The file found by _lookup was evicted by another process before it could be read."""
+        with self._lock:
+            self.hits -= 1
+            self.misses += 1
+
+    def _write(self, key: str, write: Callable[[Path], None]):
+        """Write an entry through `write(tmp_path)`, then evict least recently used entries to stay under max_bytes."""
+        path = self._path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        write(tmp_path)
+        size = tmp_path.stat().st_size
+        if size > self.max_bytes:
+            tmp_path.unlink(missing_ok=True)
+            return
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._total_bytes += size
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the store fits in max_bytes. Caller holds the lock."""
+        while self._total_bytes > self.max_bytes and self._entries:
+            old_key, old_size = self._entries.popitem(last=False)
+            self._total_bytes -= old_size
+            self._path_for(old_key).unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class ConversionCache(LruFileStore):
+    """Size-bounded LRU cache of converted PDFs stored under `directory`."""
+
+    suffix = ".pdf"
+
+    def __init__(self, directory: str = CONVERSION_CACHE_DIR, max_bytes: int = CONVERSION_CACHE_MAX_BYTES):
+        super().__init__(directory, max_bytes)
+
+    @staticmethod
+    def make_key(content_sha256: str, version: str) -> str:
+        return hashlib.sha256(f"{content_sha256}:{version}".encode()).hexdigest()
+
+    def get(self, key: str, dest: Path) -> bool:
+        """Copy the cached PDF for `key` to `dest`. Returns False on a miss."""
+        path = self._lookup(key)
+        if path is None:
+            return False
+        try:
+            shutil.copyfile(path, dest)
+            os.utime(path)  # giữ thứ tự LRU khi khởi động lại
+        except FileNotFoundError:
+            # Bị process khác evict giữa chừng
+            self._lost()
+            return False
+        return True
+
+    def put(self, key: str, pdf_path: Path):
+        """Store a converted PDF, evicting least recently used entries to stay under max_bytes."""
+        if pdf_path.stat().st_size > self.max_bytes:
+            return
+        self._write(key, lambda tmp_path: shutil.copyfile(pdf_path, tmp_path))
+
+
+_cache: Optional[ConversionCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_conversion_cache() -> Optional[ConversionCache]:
+    """Process-wide cache instance, or None when disabled (CONVERSION_CACHE_MAX_BYTES=0)."""
+    global _cache
+    if CONVERSION_CACHE_MAX_BYTES <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ConversionCache()
+    return _cache
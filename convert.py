@@ -1,26 +1,106 @@
 # convert.py
+import os
+import queue
 import subprocess
+import tempfile
 import textwrap
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List
-from PyPDF2 import PdfMerger, PdfReader
+from typing import Dict, List, Optional, Tuple
+from PyPDF2 import PdfMerger
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 import shutil
 
-def convert_office_folder_to_pdf(folder_path: str, output_dir: str) -> List[Path]:
+from conversion_cache import converter_version, file_sha256, get_conversion_cache
+from office_pool import get_office_pool
+
+OFFICE_CONVERT_WORKERS = int(os.getenv("OFFICE_CONVERT_WORKERS", str(os.cpu_count() or 1)))
+
+
+@dataclass
+class ConversionResult:
+    """Result of converting a single Office file; `error` is set when the conversion failed."""
+    source: Path
+    pdf_path: Optional[Path] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+# Mỗi job soffice song song cần một profile riêng (-env:UserInstallation) để không tranh lock.
+# Các profile được giữ lại giữa các request để khỏi phải tạo profile mới mỗi lần.
+_profile_slots: "queue.Queue[Path]" = queue.Queue()
+_profile_root: Optional[Path] = None
+_profile_lock = threading.Lock()
+
+
+def _ensure_profile_slots(count: int):
+    global _profile_root
+    with _profile_lock:
+        if _profile_root is None:
+            _profile_root = Path(tempfile.mkdtemp(prefix="soffice_profiles_"))
+        created = len(list(_profile_root.iterdir()))
+        for i in range(created, count):
+            slot = _profile_root / f"profile_{i}"
+            slot.mkdir()
+            _profile_slots.put(slot)
+
+
+def _convert_with_soffice(soffice_path: str, office_file: Path, output_dir: Path) -> Path:
+    profile = _profile_slots.get()
+    try:
+        subprocess.run([
+            soffice_path,
+            f"-env:UserInstallation={profile.as_uri()}",
+            "--headless",
+            "--convert-to", "pdf",
+            "--outdir", str(output_dir),
+            str(office_file)
+        ], check=True, capture_output=True)
+    finally:
+        _profile_slots.put(profile)
+    pdf_path = output_dir / (office_file.stem + ".pdf")
+    if not pdf_path.exists():
+        raise RuntimeError(f"LibreOffice did not produce a PDF for '{office_file.name}'.")
+    return pdf_path
+
+
+def _pdf_names(office_files: List[Path]) -> Dict[Path, str]:
     """
-    Convert all Office files (pptx, doc, docx) in a folder to PDF.
-    Returns a list of paths to the created PDFs.
+    Output PDF name for each file: `<stem>.pdf`, or `<name>.pdf` when another file shares the stem
+    (a.doc and a.docx would otherwise both write a.pdf and overwrite each other).
     """
-    folder = Path(folder_path)
-    if not folder.exists() or not folder.is_dir():
-        raise ValueError(f"Folder '{folder_path}' does not exist or is not a directory.")
+    names: Dict[Path, str] = {}
+    taken = set()
+    for office_file in office_files:
+        for candidate in (f"{office_file.stem}.pdf", f"{office_file.name}.pdf"):
+            if candidate not in taken:
+                break
+        else:
+            candidate = f"{office_file.name}_{len(taken)}.pdf"
+        taken.add(candidate)
+        names[office_file] = candidate
+    return names
+
 
+def convert_office_files_to_pdf(office_files: List[Path], output_dir: Path,
+                                max_workers: int = OFFICE_CONVERT_WORKERS,
+                                digests: Optional[Dict[Path, str]] = None) -> List[ConversionResult]:
+    """
+    Converts Office files to PDF, running up to `max_workers` conversions at once.
+    Results are returned in input order; a failing file only marks its own result as failed.
+    `digests` maps files to SHA-256 hashes computed at upload time so the cache skips re-hashing.
+    Each file gets its own output name (see _pdf_names) and soffice writes into a private directory,
+    so concurrent conversions never share a PDF path.
+    """
+    digests = digests or {}
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
-
-    office_files = list(folder.glob("*.pptx")) + list(folder.glob("*.doc")) + list(folder.glob("*.docx"))
     if not office_files:
         return []
 
@@ -28,21 +108,76 @@ def convert_office_folder_to_pdf(folder_path: str, output_dir: str) -> List[Path
     LIBREOFFICE_PATH = shutil.which("soffice")
     if not LIBREOFFICE_PATH:
         raise RuntimeError("LibreOffice not found. Please install it or ensure 'soffice' is in PATH.")
-        
-    pdf_files = []
 
-    for office_file in office_files:
-        subprocess.run([
-            LIBREOFFICE_PATH,
-            "--headless",
-            "--convert-to", "pdf",
-            "--outdir", str(output_dir),
-            str(office_file)
-        ], check=True)
-        pdf_path = output_dir / (office_file.stem + ".pdf")
-        pdf_files.append(pdf_path)
+    # Dùng pool LibreOffice đã khởi động sẵn nếu có, nếu không thì chạy soffice cho từng file
+    pool = get_office_pool(LIBREOFFICE_PATH)
+    if pool is not None:
+        max_workers = min(max_workers, pool.size)
+    else:
+        _ensure_profile_slots(max_workers)
+    max_workers = max(1, min(max_workers, len(office_files)))
+    cache = get_conversion_cache()
+    # Sắp xếp theo stem để a.doc luôn được a.pdf và a.docx được a.docx.pdf, không phụ thuộc thứ tự glob
+    pdf_names = _pdf_names(sorted(office_files, key=lambda f: (f.stem, f.name)))
+
+    def convert_one(office_file: Path) -> ConversionResult:
+        try:
+            # Cùng nội dung + cùng phiên bản LibreOffice -> lấy PDF từ cache, không chạy soffice
+            pdf_path = output_dir / pdf_names[office_file]
+            cache_key = None
+            if cache is not None:
+                content_hash = digests.get(office_file) or file_sha256(office_file)
+                cache_key = cache.make_key(content_hash, converter_version(LIBREOFFICE_PATH))
+                if cache.get(cache_key, pdf_path):
+                    return ConversionResult(office_file, pdf_path)
+
+            if pool is not None:
+                pool.convert(office_file, pdf_path)
+            else:
+                # soffice tự đặt tên <stem>.pdf: convert vào thư mục riêng rồi đổi tên
+                work_dir = Path(tempfile.mkdtemp(prefix=".soffice_", dir=output_dir))
+                try:
+                    _convert_with_soffice(LIBREOFFICE_PATH, office_file, work_dir).replace(pdf_path)
+                finally:
+                    shutil.rmtree(work_dir, ignore_errors=True)
 
-    return pdf_files
+            if cache_key is not None:
+                cache.put(cache_key, pdf_path)
+            return ConversionResult(office_file, pdf_path)
+        except subprocess.CalledProcessError as e:
+            stderr = e.stderr.decode(errors="replace").strip() if e.stderr else ""
+            return ConversionResult(office_file, error=stderr or str(e))
+        except Exception as e:
+            return ConversionResult(office_file, error=str(e))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(convert_one, office_files))
+
+
+def convert_office_folder_to_pdf(folder_path: str, output_dir: str, digests: Optional[Dict[str, str]] = None
+                                 ) -> Tuple[List[Path], List[Tuple[str, str]]]:
+    """
+    Convert all Office files (pptx, doc, docx) in a folder to PDF.
+    Returns (paths of the created PDFs, [(file name, error), ...] of the files that failed).
+    Failed files are reported to the caller instead of being dropped silently; an error is raised
+    only if every file failed.
+    `digests` optionally maps file names relative to the folder to their SHA-256.
+    """
+    folder = Path(folder_path)
+    if not folder.exists() or not folder.is_dir():
+        raise ValueError(f"Folder '{folder_path}' does not exist or is not a directory.")
+
+    office_files = list(folder.glob("*.pptx")) + list(folder.glob("*.doc")) + list(folder.glob("*.docx"))
+    file_digests = {folder / name: digest for name, digest in (digests or {}).items()}
+    results = convert_office_files_to_pdf(office_files, Path(output_dir), digests=file_digests)
+
+    failed = [r for r in results if not r.ok]
+    for r in failed:
+        print(f"Error converting {r.source.name}: {r.error}")
+    if results and len(failed) == len(results):
+        raise RuntimeError("; ".join(f"{r.source.name}: {r.error}" for r in failed))
+
+    return [r.pdf_path for r in results if r.ok], [(r.source.name, r.error) for r in failed]
 
 def merge_pdfs(pdf_list: List[Path], output_path: Path):
     """Merges multiple PDF files into one. This function is now specifically for text-only PDFs."""
@@ -77,14 +212,14 @@ def extract_text_from_folder(folder_path: str, output_dir: str) -> List[Path]:
     return output_files
 
 
-def extract_text_from_pdf(pdf_path: Path) -> list[str]:
-    """Extracts text from a PDF, returning a list of strings per page."""
-    reader = PdfReader(str(pdf_path))
-    texts = []
-    for page in reader.pages:
-        text = page.extract_text()
-        texts.append(text.strip() if text else "")
-    return texts
+def extract_text_from_pdf(pdf_path: Path, workers: Optional[int] = None) -> list[str]:
+    """
+    Extracts text from a PDF, returning a list of strings per page.
+    Large PDFs are split into page ranges extracted by `workers` processes (PDF_EXTRACT_WORKERS by default).
+    """
+    # Only this legacy helper reads PDFs; the Office conversion path does not need pdf_text
+    from pdf_text import load_pdf_document
+    return load_pdf_document(pdf_path, workers=workers).pages
 
 def save_texts_to_pdf(pages_text: list[str], output_dir: Path, original_file_stem: str, lines_per_chunk: int = 10) -> Path:
     """
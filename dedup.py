@@ -0,0 +1,154 @@
+# dedup.py
+"""
+Loại chunk trùng lặp giữa các file của một request (header, footer, disclaimer, text slide master...).
+
+- Trùng hoàn toàn: hash của text đã chuẩn hóa (chữ thường, gộp khoảng trắng).
+- Gần trùng: MinHash trên shingle 5 từ, dùng one-permutation hashing (một lần hash cho mỗi shingle,
+  chia vào num_perm ô) + LSH theo band để chỉ so sánh với các ứng viên, nên chạy được với
+  hàng chục nghìn chunk. Ứng viên được kiểm tra lại bằng độ tương đồng ước lượng từ chữ ký.
+Chunk gặp trước được giữ lại: main.py gọi filter() theo thứ tự file upload (không theo thứ tự file xong trước)
+nên cùng một upload luôn cho cùng kết quả.
+"""
+import hashlib
+import os
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Set, Tuple, TypeVar
+
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", "128"))
+DEDUP_SHINGLE_WORDS = int(os.getenv("DEDUP_SHINGLE_WORDS", "5"))
+
+_MASK64 = (1 << 64) - 1
+
+T = TypeVar("T")
+
+
+def _integrate(f, a: float, b: float, steps: int = 100) -> float:
+    width = (b - a) / steps
+    return sum(f(a + (i + 0.5) * width) for i in range(steps)) * width
+
+
+# Ứng viên luôn được kiểm tra lại bằng chữ ký nên bỏ sót (âm tính giả) đắt hơn ứng viên thừa
+_FALSE_POSITIVE_WEIGHT = 0.1
+_FALSE_NEGATIVE_WEIGHT = 0.9
+
+
+@lru_cache(maxsize=None)
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """(số band, số hàng mỗi band) với b * r = num_perm, sai số có trọng số (dương tính giả + âm tính giả) nhỏ nhất."""
+    best, best_error = (num_perm, 1), float("inf")
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+
+        def candidate(s: float) -> float:
+            return 1 - (1 - s ** rows) ** bands
+
+        error = (_FALSE_POSITIVE_WEIGHT * _integrate(candidate, 0.0, threshold)
+                 + _FALSE_NEGATIVE_WEIGHT * _integrate(lambda s: 1 - candidate(s), threshold, 1.0))
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+def _normalize(text: str) -> List[str]:
+    return text.lower().split()
+
+
+class ChunkDeduplicator:
+    """
+    Bộ lọc trùng lặp cho một request/job: gọi filter() cho chunk của từng file theo thứ tự xử lý.
+    `prefix`: custom prefix được thêm vào mọi chunk, bỏ qua khi so sánh.
+    """
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, num_perm: int = DEDUP_NUM_PERM,
+                 shingle_words: int = DEDUP_SHINGLE_WORDS, prefix: str = ""):
+        # num_perm làm tròn lên lũy thừa của 2 để chia ô bằng phép AND
+        self.num_perm = 1 << max(1, num_perm - 1).bit_length()
+        self._shift = self.num_perm.bit_length() - 1
+        self.threshold = threshold
+        self.shingle_words = shingle_words
+        self.prefix = prefix
+        self.bands, self.rows = lsh_params(threshold, self.num_perm)
+        self._exact: Set[bytes] = set()
+        self._signatures: List[List[int]] = []
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in range(self.bands)]
+        self.exact_removed = 0
+        self.near_removed = 0
+        self.kept = 0
+
+    def _signature(self, words: List[str]) -> List[int]:
+        n = self.shingle_words
+        if len(words) <= n:
+            shingles = {hash(tuple(words)) & _MASK64}
+        else:
+            shingles = {h & _MASK64 for h in map(hash, zip(*(words[i:] for i in range(n))))}
+
+        k, mask, shift = self.num_perm, self.num_perm - 1, self._shift
+        empty = _MASK64
+        signature = [empty] * k
+        for h in shingles:
+            b = h & mask
+            v = h >> shift
+            if v < signature[b]:
+                signature[b] = v
+        if empty in signature:
+            # Densification: ô rỗng lấy giá trị của ô có dữ liệu kế tiếp (vòng tròn), cộng thêm khoảng cách
+            # để hai ô rỗng khác nhau không luôn trùng nhau
+            last, distance = None, 0
+            for i in range(2 * k - 1, -1, -1):
+                value = signature[i % k]
+                if i < k and value == empty and last is not None:
+                    signature[i] = (last + distance * 0x9E3779B97F4A7C15) & _MASK64
+                if value != empty:
+                    last, distance = value, 0
+                distance += 1
+        return signature
+
+    def _similarity(self, a: List[int], b: List[int]) -> float:
+        return sum(x == y for x, y in zip(a, b)) / self.num_perm
+
+    def check(self, chunk: str) -> Optional[str]:
+        """None nếu chunk được giữ (và ghi nhận), "exact" / "near" nếu bị loại."""
+        if self.prefix and chunk.startswith(self.prefix):
+            chunk = chunk[len(self.prefix):]
+        words = _normalize(chunk)
+        digest = hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=16).digest()
+        if digest in self._exact:
+            self.exact_removed += 1
+            return "exact"
+        self._exact.add(digest)
+
+        signature = self._signature(words)
+        keys = [hash(tuple(signature[i * self.rows:(i + 1) * self.rows])) for i in range(self.bands)]
+        seen: Set[int] = set()
+        for band, key in zip(self._buckets, keys):
+            for candidate in band.get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if self._similarity(signature, self._signatures[candidate]) >= self.threshold:
+                    self.near_removed += 1
+                    return "near"
+
+        doc_id = len(self._signatures)
+        self._signatures.append(signature)
+        for band, key in zip(self._buckets, keys):
+            band.setdefault(key, []).append(doc_id)
+        self.kept += 1
+        return None
+
+    def filter(self, chunks: List[T], text: Optional[Callable[[T], str]] = None) -> List[T]:
+        """Các chunk được giữ; `text` lấy nội dung để so sánh khi chunk không phải chuỗi (ví dụ ChunkRecord)."""
+        if text is None:
+            return [chunk for chunk in chunks if self.check(chunk) is None]
+        return [chunk for chunk in chunks if self.check(text(chunk)) is None]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "exact_removed": self.exact_removed,
+            "near_removed": self.near_removed,
+            "removed": self.exact_removed + self.near_removed,
+            "kept": self.kept,
+        }
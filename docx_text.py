@@ -0,0 +1,119 @@
+# docx_text.py
+"""
+Trích xuất text DOCX không qua python-docx: đọc word/document.xml dạng stream (iterparse) ngay trong zip,
+trả về đoạn văn và bảng theo đúng thứ tự trong tài liệu. Phần đã xử lý được gỡ khỏi cây XML
+nên bộ nhớ chỉ giữ đoạn/bảng đang đọc, kể cả với hợp đồng vài trăm trang.
+"""
+import xml.etree.ElementTree as ET
+import zipfile
+from pathlib import Path
+from typing import IO, Iterator, List
+
+from ooxml import read_rels
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+
+# Part con trực tiếp của các phần tử này được gỡ khỏi cây ngay khi đọc xong
+_CONTAINERS = {_W + "body", _W + "hdr", _W + "ftr"}
+
+
+def _paragraph_text(p: ET.Element) -> str:
+    parts = []
+    for node in p.iter():
+        tag = node.tag
+        if tag == _W + "t":
+            parts.append(node.text or "")
+        elif tag == _W + "tab":
+            parts.append("\t")
+        elif tag in (_W + "br", _W + "cr"):
+            parts.append("\n")
+    return "".join(parts).strip()
+
+
+def iter_docx_blocks(stream: IO[bytes], include_tables: bool = True) -> Iterator[str]:
+    """
+    Các khối text của một part (document, header, footer) theo thứ tự: mỗi đoạn văn một khối,
+    mỗi bảng một khối gồm các dòng "| ô | ô |". Bảng lồng trong ô được gộp thành text của ô đó.
+    """
+    stack: List[ET.Element] = []
+    # Mỗi bảng đang mở: text các đoạn trong ô hiện tại, các ô của hàng hiện tại, các hàng đã xong
+    cells: List[List[str]] = []
+    rows: List[List[str]] = []
+    tables: List[List[str]] = []
+    fallback_depth = 0
+
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            stack.append(elem)
+            if tag == _W + "tbl":
+                cells.append([])
+                rows.append([])
+                tables.append([])
+            elif tag == _MC + "Fallback":
+                fallback_depth += 1
+            continue
+
+        stack.pop()
+        if tag == _W + "p":
+            # Text box có cả bản Choice và Fallback, chỉ lấy bản Choice
+            if not fallback_depth:
+                text = _paragraph_text(elem)
+                if cells:
+                    cells[-1].append(text)
+                elif text:
+                    yield text
+            # Xóa nội dung để đoạn chứa text box không đọc lại text của text box
+            elem.clear()
+        elif tag == _W + "tc" and cells:
+            rows[-1].append(" ".join(t for t in cells[-1] if t))
+            cells[-1] = []
+        elif tag == _W + "tr" and rows:
+            row, rows[-1] = rows[-1], []
+            if any(row):
+                tables[-1].append(f"| {' | '.join(row)} |")
+        elif tag == _W + "tbl":
+            cells.pop()
+            rows.pop()
+            table = tables.pop()
+            if cells:
+                cells[-1].append(" ".join(table))
+            elif include_tables and table:
+                yield "\n".join(table)
+        elif tag == _MC + "Fallback":
+            fallback_depth -= 1
+
+        if stack and stack[-1].tag in _CONTAINERS:
+            stack[-1].remove(elem)
+
+
+def _header_footer_parts(z: zipfile.ZipFile, kind: str) -> List[str]:
+    names = set(z.namelist())
+    return [target for rel_type, target in read_rels(z, "word/document.xml").values()
+            if rel_type.endswith("/" + kind) and target in names]
+
+
+def _header_footer_blocks(z: zipfile.ZipFile, kind: str, include_tables: bool) -> List[str]:
+    """Text của các header/footer (mặc định, trang đầu, trang chẵn), bỏ khối trùng nhau."""
+    blocks: List[str] = []
+    for part in _header_footer_parts(z, kind):
+        with z.open(part) as f:
+            for block in iter_docx_blocks(f, include_tables):
+                if block not in blocks:
+                    blocks.append(block)
+    return blocks
+
+
+def extract_docx_blocks(path: Path, include_tables: bool = True, include_headers: bool = False) -> List[str]:
+    """
+    Các khối text của file .docx theo thứ tự trong tài liệu.
+    include_headers: thêm text của header ở đầu và footer ở cuối.
+    """
+    with zipfile.ZipFile(path, 'r') as z:
+        blocks = _header_footer_blocks(z, "header", include_tables) if include_headers else []
+        with z.open("word/document.xml") as f:
+            blocks.extend(iter_docx_blocks(f, include_tables))
+        if include_headers:
+            blocks.extend(_header_footer_blocks(z, "footer", include_tables))
+    return blocks
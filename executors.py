@@ -0,0 +1,118 @@
+# executors.py
+"""
+Executor riêng cho từng loại công việc blocking (stage) + kiểm soát tải.
+
+Mỗi stage có số worker (giới hạn chạy đồng thời) và hàng đợi giới hạn riêng:
+- convert: chạy soffice/UNO (thread, chủ yếu chờ subprocess)
+- extract: parse PDF/DOCX/PPTX (process, CPU)
+- excel:   đọc openpyxl (process, CPU + RAM)
+- render:  vẽ PDF bằng reportlab, merge PDF (process, CPU)
+- ocr:     OCR ảnh và trang PDF scan (process, CPU); mỗi worker nạp model một lần, giới hạn thread
+           và có thể gán core riêng (ocr_worker.py)
+- io:      ghi file, zip (thread)
+Khi hàng đợi của stage đầy, StageOverloaded được raise để API trả về 503 + Retry-After
+thay vì để request xếp hàng vô hạn.
+"""
+import asyncio
+import importlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+_CPU = os.cpu_count() or 1
+
+# name -> (dùng process hay thread, số worker mặc định, kích thước hàng đợi mặc định)
+STAGE_DEFAULTS = {
+    "convert": (False, 2, 8),
+    "extract": (True, _CPU, 4 * _CPU),
+    "excel": (True, max(1, _CPU // 2), 2 * _CPU),
+    "render": (True, _CPU, 4 * _CPU),
+    "ocr": (True, max(1, _CPU // 2), 8 * _CPU),
+    "io": (False, 4, 32),
+}
+# name -> "module:function" chạy một lần khi mỗi process worker của stage khởi động,
+# nhận (số thứ tự worker dùng chung, số worker) để tự chia thread / core
+STAGE_INITIALIZERS = {
+    "ocr": "ocr_worker:init_worker",
+}
+OVERLOAD_RETRY_AFTER = int(os.getenv("OVERLOAD_RETRY_AFTER", "5"))
+
+
+class StageOverloaded(Exception):
+    """Hàng đợi của một stage đã đầy."""
+
+    def __init__(self, stage: str, retry_after: int = OVERLOAD_RETRY_AFTER):
+        super().__init__(f"Server is busy ({stage} queue is full), retry after {retry_after}s.")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+class Stage:
+    """Executor có giới hạn: `workers` job chạy cùng lúc, tối đa `queue_size` job chờ."""
+
+    def __init__(self, name: str, use_processes: bool, workers: int, queue_size: int,
+                 initializer: Optional[Callable] = None):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        if use_processes:
+            # spawn thay vì fork: process chính có nhiều thread (uvicorn, UNO, job runner)
+            ctx = multiprocessing.get_context("spawn")
+            initargs = (ctx.Value("i", 0), workers) if initializer else ()
+            self.executor: Executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=ctx, initializer=initializer, initargs=initargs
+            )
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"stage-{name}")
+
+    def submit(self, fn: Callable, *args, block: bool = False, **kwargs) -> Future:
+        """
+        Gửi job vào stage. Nếu hàng đợi đầy: raise StageOverloaded,
+        hoặc chờ tới khi có chỗ nếu block=True (dùng cho job nền).
+        """
+        if not self._slots.acquire(blocking=block):
+            raise StageOverloaded(self.name)
+        try:
+            future = self.executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+
+def in_worker_process() -> bool:
+    """True khi đang chạy trong process con của một stage: khi đó chạy tuần tự, không tạo pool lồng nhau."""
+    return multiprocessing.parent_process() is not None
+
+
+_stages: Dict[str, Stage] = {}
+_stages_lock = threading.Lock()
+
+
+def get_stage(name: str) -> Stage:
+    """Stage được tạo khi dùng lần đầu; cấu hình qua STAGE_<NAME>_WORKERS / STAGE_<NAME>_QUEUE."""
+    with _stages_lock:
+        if name not in _stages:
+            use_processes, workers, queue_size = STAGE_DEFAULTS[name]
+            workers = int(os.getenv(f"STAGE_{name.upper()}_WORKERS", str(workers)))
+            queue_size = int(os.getenv(f"STAGE_{name.upper()}_QUEUE", str(queue_size)))
+            initializer = None
+            if name in STAGE_INITIALIZERS:
+                module, _, function = STAGE_INITIALIZERS[name].partition(":")
+                initializer = getattr(importlib.import_module(module), function)
+            _stages[name] = Stage(name, use_processes, workers, queue_size, initializer)
+    return _stages[name]
+
+
+def run_stage(name: str, fn: Callable, *args, block: bool = False, **kwargs) -> Any:
+    """Chạy fn trong stage và chờ kết quả (gọi từ thread, không gọi trực tiếp trong event loop)."""
+    return get_stage(name).submit(fn, *args, block=block, **kwargs).result()
+
+
+async def run_stage_async(name: str, fn: Callable, *args, **kwargs) -> Any:
+    """Chạy fn trong stage mà không chặn event loop."""
+    return await asyncio.wrap_future(get_stage(name).submit(fn, *args, **kwargs))
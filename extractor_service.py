@@ -1,33 +1,59 @@
 # extractor.py
+from itertools import chain, islice
 from pathlib import Path
-from typing import List
+from typing import Iterator, List, Optional
 import docx
 import openpyxl
-import zipfile
-import xml.etree.ElementTree as ET
-from PyPDF2 import PdfReader
+from openpyxl.utils import get_column_letter
+
+from chunking import chunk_text_spans, get_tokenizer
+from docx_text import extract_docx_blocks
+from executors import StageOverloaded
+from pdf_backends import PAGE_ERROR_PREFIX
+from pdf_text import load_pdf_document
+from pptx_text import extract_pptx_slides
+
+
+def is_read_error(text: str, path: Path) -> bool:
+    """
+    Text có phải thông báo lỗi thay cho nội dung không: lỗi cả file của các hàm extract_* bên dưới
+    ("Error reading <loại> <tên file>: ...") hoặc trang/slide đọc lỗi ("[⚠️ Lỗi đọc ...]").
+    """
+    if text.startswith(PAGE_ERROR_PREFIX):
+        return True
+    return text.startswith("Error reading ") and text.split(": ", 1)[0].endswith(f" {path.name}")
+
 
 # PDF ------------------------------------------------------------------
-def extract_text_from_pdf(path: Path) -> str:
-    """Trích xuất toàn bộ text từ một file PDF, bỏ qua lỗi trang."""
-    texts = []
+def extract_text_from_pdf(path: Path, workers: Optional[int] = None, backend: str = "") -> str:
+    """
+    Trích xuất toàn bộ text từ một file PDF, bỏ qua lỗi trang.
+    File lớn được chia dải trang cho `workers` process (mặc định PDF_EXTRACT_WORKERS).
+    backend: pypdf2 / pypdf / pymupdf / pdfminer / pdftotext (mặc định PDF_BACKEND, xem pdf_backends.py).
+    """
     try:
-        reader = PdfReader(path)
-        for i, page in enumerate(reader.pages, start=1):
-            try:
-                page_text = page.extract_text()
-                if page_text:
-                    texts.append(page_text.strip())
-            except Exception as e:
-                texts.append(f"[⚠️ Lỗi đọc trang {i}: {e}]")
+        return load_pdf_document(path, workers=workers, backend=backend).text
     except Exception as e:
         return f"Error reading PDF {path.name}: {e}"
-    return "\n\n".join(texts)
 
 
 # DOCX -----------------------------------------------------------------
-def extract_text_from_word(path: Path) -> str:
-    """Trích xuất toàn bộ text từ một file .docx."""
+DOCX_ENGINES = ("stream", "python-docx")
+
+
+def extract_text_from_word(path: Path, engine: str = "stream", include_headers: bool = False) -> str:
+    """
+    Trích xuất toàn bộ text từ một file .docx.
+    - engine="stream": đọc XML dạng stream, gồm đoạn văn và bảng theo thứ tự trong tài liệu,
+      include_headers=True thêm header/footer.
+    - engine="python-docx": cách cũ, dựng toàn bộ Document, chỉ lấy đoạn văn ngoài bảng.
+    """
+    if engine == "stream":
+        try:
+            return "\n\n".join(extract_docx_blocks(path, include_headers=include_headers))
+        except Exception as e:
+            return f"Error reading DOCX {path.name}: {e}"
+
     texts = []
     try:
         doc = docx.Document(path)
@@ -40,95 +66,263 @@ def extract_text_from_word(path: Path) -> str:
 
 
 # PPTX -----------------------------------------------------------------
-def extract_text_from_pptx(path: Path) -> str:
-    """Trích xuất text từ file .pptx, bỏ qua media/audio."""
-    text_chunks = []
+def extract_pptx_pages(path: Path, include_notes: bool = False, include_tables: bool = True,
+                       workers: Optional[int] = None, block: bool = False) -> List[str]:
+    """
+    Text của từng slide theo thứ tự (slide rỗng là chuỗi rỗng để giữ đúng số slide).
+    File lỗi trả về một phần tử là thông báo lỗi.
+    """
     try:
-        with zipfile.ZipFile(path, 'r') as z:
-            # lọc tất cả slide XML
-            slide_files = [f for f in z.namelist() if f.startswith("ppt/slides/slide") and f.endswith(".xml")]
-            for slide_file in sorted(slide_files):  # sort để giữ thứ tự slide
-                try:
-                    xml_content = z.read(slide_file)
-                    tree = ET.fromstring(xml_content)
-                    # namespace pptx
-                    ns = {"a": "http://schemas.openxmlformats.org/drawingml/2006/main"}
-                    # lấy text trong <a:t>
-                    texts = [node.text for node in tree.findall(".//a:t", ns) if node.text]
-                    if texts:
-                        text_chunks.append("\n".join(texts))
-                except Exception as inner_e:
-                    text_chunks.append(f"[⚠️ Lỗi đọc {slide_file}: {inner_e}]")
+        return extract_pptx_slides(path, include_notes, include_tables, workers, block)
+    except StageOverloaded:
+        raise
     except Exception as e:
-        return f"Error reading PPTX {path.name}: {e}"
+        return [f"Error reading PPTX {path.name}: {e}"]
+
 
-    return "\n\n".join(text_chunks)
+def extract_text_from_pptx(path: Path, include_notes: bool = False, include_tables: bool = True,
+                           workers: Optional[int] = None, block: bool = False) -> str:
+    """
+    Trích xuất text từ file .pptx theo thứ tự slide, bỏ qua media/audio.
+    include_notes: thêm ghi chú của người trình bày; include_tables: thêm các hàng của bảng.
+    Deck lớn được chia dải slide cho `workers` process (mặc định PPTX_EXTRACT_WORKERS).
+    """
+    slides = extract_pptx_pages(path, include_notes, include_tables, workers, block)
+    return "\n\n".join(text for text in slides if text)
 
 
 # XLSX -----------------------------------------------------------------
-def extract_data_from_excel_as_markdown(path: Path, row_limit: int = 50) -> List[str]:
+# Chế độ ngân sách: số dòng đầu sheet dùng để ước lượng độ rộng cột,
+# và số dòng tối thiểu mỗi chunk phải chứa được trước khi phải chia nhóm cột
+EXCEL_SAMPLE_ROWS = 20
+EXCEL_MIN_ROWS_PER_CHUNK = 4
+
+
+def _row_to_cells(row) -> List[str]:
+    return [str(cell) if cell is not None else "" for cell in row]
+
+
+def _last_filled(cells: List[str]) -> int:
+    """Số cột tính tới ô cuối cùng có dữ liệu (bỏ các cột rỗng ở cuối)."""
+    for i in range(len(cells) - 1, -1, -1):
+        if cells[i]:
+            return i + 1
+    return 0
+
+
+def _markdown_row(cells: List[str]) -> str:
+    return f"| {' | '.join(cells)} |"
+
+
+def _iter_sheet_rows(rows) -> Iterator[List[str]]:
+    """Các dòng dữ liệu dạng chuỗi; dòng rỗng chỉ được giữ khi phía sau còn dòng có dữ liệu."""
+    pending_empty = 0
+    for row in rows:
+        cells = _row_to_cells(row)
+        if not any(cells):
+            pending_empty += 1
+            continue
+        for _ in range(pending_empty):
+            yield []
+        pending_empty = 0
+        yield cells
+
+
+def _excel_chunk_to_markdown(sheet_name: str, header: List[str], rows: List[List[str]]) -> str:
+    # Cắt các cột rỗng ở cuối, độ rộng tính theo header và các dòng trong chunk
+    width = max([_last_filled(header)] + [_last_filled(row) for row in rows]) or 1
+
+    def fit(cells: List[str]) -> List[str]:
+        return (cells + [""] * width)[:width]
+
+    chunk_md_lines = [f"## Sheet: {sheet_name}\n"]
+    chunk_md_lines.append(_markdown_row(fit(header)))
+    chunk_md_lines.append(_markdown_row(["---"] * width))
+    for row in rows:
+        chunk_md_lines.append(_markdown_row(fit(row)))
+    return "\n".join(chunk_md_lines)
+
+
+class ChunkBudget:
     """
-    Trích xuất dữ liệu từ các sheet trong Excel và chuyển thành Markdown.
-    Mỗi chunk <= row_limit, header được lặp lại để giữ ngữ cảnh.
+    Ngân sách mỗi chunk theo token (tokenizer dùng chung với chunk_text) hoặc theo ký tự.
+    Chi phí một dòng Markdown được cộng dồn theo từng ô nên tính được cho một nhóm cột bất kỳ.
     """
-    if row_limit <= 0:
-        row_limit = 50
 
-    all_markdown_chunks = []
-    try:
-        workbook = openpyxl.load_workbook(path, data_only=True)
-        for sheet_name in workbook.sheetnames:
-            sheet = workbook[sheet_name]
-            data = list(sheet.values)
+    def __init__(self, max_tokens: int = 0, max_chars: int = 0):
+        self.by_tokens = max_tokens > 0
+        self.limit = max_tokens if self.by_tokens else max_chars
+        self._tokenizer = get_tokenizer() if self.by_tokens else None
 
-            if not data:
-                continue
+    def cost(self, line: str) -> int:
+        """Chi phí một dòng, kể cả ký tự xuống dòng nối với dòng sau."""
+        return self._tokenizer.count(line) if self.by_tokens else len(line) + 1
 
-            header = [str(cell) if cell is not None else "" for cell in data[0]]
-            rows = [[str(cell) if cell is not None else "" for cell in row] for row in data[1:]]
+    def cell_cost(self, cell: str) -> int:
+        # Mỗi ô thêm một dấu "|" (tính 1 token) hoặc " | " (3 ký tự)
+        return self._tokenizer.count(cell) + 1 if self.by_tokens else len(cell) + 3
 
-            if not rows:
-                continue
+    @property
+    def row_base_cost(self) -> int:
+        # Token: dấu "|" mở đầu. Ký tự: "|" mở đầu + xuống dòng
+        return 1 if self.by_tokens else 2
 
-            # Header Markdown
-            md_header = f"| {' | '.join(header)} |"
-            md_separator = f"| {' | '.join(['---'] * len(header))} |"
 
-            # Chunk rows
-            for i in range(0, len(rows), row_limit):
-                chunk_rows = rows[i:i + row_limit]
+def _column_groups(header: List[str], sample: List[List[str]], width: int, budget: ChunkBudget,
+                   key_columns: int, title_cost: int) -> List[List[int]]:
+    """
+    Chia cột [0, width) thành các nhóm sao cho một chunk chứa được ít nhất EXCEL_MIN_ROWS_PER_CHUNK dòng
+    (ước lượng theo dòng dài nhất trong sample). `key_columns` cột đầu có mặt trong mọi nhóm.
+    """
+    keys = list(range(min(key_columns, width)))
+    head_costs = [budget.cell_cost(header[c] if c < len(header) else "") + budget.cell_cost("---")
+                  for c in range(width)]
+    sample_costs = [[budget.cell_cost(row[c] if c < len(row) else "") for c in range(width)] for row in sample]
 
-                chunk_md_lines = [f"## Sheet: {sheet_name}\n"]
-                chunk_md_lines.append(md_header)
-                chunk_md_lines.append(md_separator)
+    def group_cost(head: int, rows: List[int]) -> int:
+        row = budget.row_base_cost + max(rows or [0])
+        return title_cost + 2 * budget.row_base_cost + head + EXCEL_MIN_ROWS_PER_CHUNK * row
 
-                for row in chunk_rows:
-                    chunk_md_lines.append(f"| {' | '.join(row)} |")
+    key_head = sum(head_costs[c] for c in keys)
+    key_rows = [sum(costs[c] for c in keys) for costs in sample_costs]
 
-                all_markdown_chunks.append("\n".join(chunk_md_lines))
+    groups: List[List[int]] = []
+    current: List[int] = []
+    head, rows = key_head, list(key_rows)
+    for c in range(len(keys), width):
+        next_head = head + head_costs[c]
+        next_rows = [r + costs[c] for r, costs in zip(rows, sample_costs)]
+        if current and group_cost(next_head, next_rows) > budget.limit:
+            groups.append(keys + current)
+            current = []
+            next_head = key_head + head_costs[c]
+            next_rows = [r + costs[c] for r, costs in zip(key_rows, sample_costs)]
+        current.append(c)
+        head, rows = next_head, next_rows
+    groups.append(keys + current)
+    return groups
 
-    except Exception as e:
-        all_markdown_chunks.append(f"Error reading XLSX {path.name}: {e}")
 
-    return all_markdown_chunks
+def _iter_budget_chunks(sheet_name: str, header: List[str], data_rows: Iterator[List[str]],
+                        budget: ChunkBudget, key_columns: int) -> Iterator[str]:
+    """
+    Gom dòng vào chunk cho tới khi chạm ngân sách (đã tính cả tiêu đề sheet, header và dòng phân cách).
+    Sheet quá rộng được chia thành nhóm cột, mỗi nhóm là một chuỗi chunk riêng có lặp lại cột khóa.
+    Nhóm cột được ước lượng từ EXCEL_SAMPLE_ROWS dòng đầu; dòng sau rộng hơn thì nhóm cuối được mở rộng
+    (chunk đang gom của nhóm đó được xuất trước), nên mọi dòng luôn có đúng số ô như header của chunk.
+    """
+    sample = list(islice(data_rows, EXCEL_SAMPLE_ROWS))
+    width = max([_last_filled(header)] + [_last_filled(row) for row in sample]) or 1
+    title = f"## Sheet: {sheet_name}\n"
+    groups = _column_groups(header, sample, width, budget, key_columns, budget.cost(title))
+
+    def project(cells: List[str], columns: List[int]) -> List[str]:
+        return [cells[c] if c < len(cells) else "" for c in columns]
 
+    def make_head(columns: List[int]) -> List[str]:
+        group_title = title
+        if len(groups) > 1:
+            first, last = columns[min(key_columns, len(columns) - 1)], columns[-1]
+            group_title = (f"## Sheet: {sheet_name} (columns {get_column_letter(first + 1)}-"
+                           f"{get_column_letter(last + 1)})\n")
+        return [group_title, _markdown_row(project(header, columns)), _markdown_row(["---"] * len(columns))]
 
-# Chunk helper ---------------------------------------------------------
-def chunk_text(text: str, chunk_size: int = 0, max_tokens: int = 0) -> List[str]:
+    heads = [make_head(columns) for columns in groups]
+    fixed_costs = [sum(budget.cost(line) for line in head) for head in heads]
+    buffers: List[List[str]] = [[] for _ in groups]
+    costs = list(fixed_costs)
+    for cells in chain(sample, data_rows):
+        row_width = _last_filled(cells)
+        if row_width > width:
+            g = len(groups) - 1
+            if buffers[g]:
+                yield "\n".join(heads[g] + buffers[g])
+                buffers[g] = []
+            groups[g] = groups[g] + list(range(width, row_width))
+            width = row_width
+            heads[g] = make_head(groups[g])
+            fixed_costs[g] = costs[g] = sum(budget.cost(line) for line in heads[g])
+        for g, columns in enumerate(groups):
+            line = _markdown_row(project(cells, columns))
+            line_cost = budget.cost(line)
+            # Một dòng vượt ngân sách vẫn được giữ nguyên trong chunk riêng
+            if buffers[g] and costs[g] + line_cost > budget.limit:
+                yield "\n".join(heads[g] + buffers[g])
+                buffers[g] = []
+                costs[g] = fixed_costs[g]
+            buffers[g].append(line)
+            costs[g] += line_cost
+
+    for g, lines in enumerate(buffers):
+        if lines:
+            yield "\n".join(heads[g] + lines)
+
+
+def iter_excel_markdown_chunks(path: Path, row_limit: int = 50, max_tokens: int = 0, max_chars: int = 0,
+                               key_columns: int = 1) -> Iterator[str]:
     """
-    Chia nhỏ văn bản dựa trên số ký tự (chunk_size) hoặc số từ (max_tokens).
-    max_tokens được ưu tiên nếu cả hai được cung cấp.
+    Đọc Excel ở chế độ read-only (duyệt từng dòng, không dựng toàn bộ workbook trong RAM)
+    và yield từng chunk Markdown ngay khi đủ. Bộ nhớ chỉ giữ các chunk đang gom.
+    Dòng rỗng và cột rỗng ở cuối sheet bị bỏ qua.
+    - Mặc định: mỗi chunk <= row_limit dòng.
+    - max_tokens / max_chars > 0: mỗi chunk gần bằng ngân sách (max_tokens được ưu tiên), sheet quá rộng
+      được chia nhóm cột, `key_columns` cột đầu được lặp lại trong mọi nhóm.
     """
-    if not text:
-        return []
+    if row_limit <= 0:
+        row_limit = 50
+    budget = ChunkBudget(max_tokens, max_chars) if max_tokens > 0 or max_chars > 0 else None
+
+    try:
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    except Exception as e:
+        yield f"Error reading XLSX {path.name}: {e}"
+        return
+
+    try:
+        for sheet_name in workbook.sheetnames:
+            rows = workbook[sheet_name].iter_rows(values_only=True)
+            first_row = next(rows, None)
+            if first_row is None:
+                continue
+            header = _row_to_cells(first_row)
+
+            if budget is not None:
+                yield from _iter_budget_chunks(sheet_name, header, _iter_sheet_rows(rows), budget, key_columns)
+                continue
+
+            chunk_rows: List[List[str]] = []
+            for cells in _iter_sheet_rows(rows):
+                chunk_rows.append(cells)
+                if len(chunk_rows) == row_limit:
+                    yield _excel_chunk_to_markdown(sheet_name, header, chunk_rows)
+                    chunk_rows = []
+
+            if chunk_rows:
+                yield _excel_chunk_to_markdown(sheet_name, header, chunk_rows)
+    except Exception as e:
+        yield f"Error reading XLSX {path.name}: {e}"
+    finally:
+        workbook.close()
 
-    # Ưu tiên chunk theo token (giả lập = đếm từ)
-    if max_tokens > 0:
-        words = text.split()
-        return [" ".join(words[i:i + max_tokens]) for i in range(0, len(words), max_tokens)]
 
-    # Chunk theo ký tự
-    if chunk_size > 0:
-        return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+def extract_data_from_excel_as_markdown(path: Path, row_limit: int = 50, max_tokens: int = 0, max_chars: int = 0,
+                                        key_columns: int = 1) -> List[str]:
+    """
+    Trích xuất dữ liệu từ các sheet trong Excel và chuyển thành Markdown.
+    Mỗi chunk <= row_limit dòng, hoặc theo ngân sách token/ký tự nếu max_tokens/max_chars > 0.
+    Header được lặp lại để giữ ngữ cảnh.
+    Chỉ phía đọc có bộ nhớ giới hạn (workbook read-only, duyệt từng dòng): danh sách chunk trả về vẫn
+    nằm hết trong RAM, vì kết quả phải gửi về từ process của stage excel và bản ghi của file được gom đủ
+    trước khi trả lời (extract_file_records). Cần stream thì dùng trực tiếp iter_excel_markdown_chunks.
+    """
+    return list(iter_excel_markdown_chunks(path, row_limit, max_tokens, max_chars, key_columns))
 
-    return [text]
+
+# Chunk helper ---------------------------------------------------------
+def chunk_text(text: str, chunk_size: int = 0, max_tokens: int = 0, overlap: int = 0) -> List[str]:
+    """
+    Chia nhỏ văn bản theo số token (max_tokens, đếm bằng tokenizer cấu hình trong chunking.py)
+    hoặc số ký tự (chunk_size), gom theo câu/đoạn. max_tokens được ưu tiên nếu cả hai được cung cấp.
+    overlap: số token (hoặc ký tự) cuối chunk trước được lặp lại ở đầu chunk sau.
+    """
+    return [chunk.text for chunk in chunk_text_spans(text, chunk_size, max_tokens, overlap)]
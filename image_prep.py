@@ -0,0 +1,199 @@
+# image_prep.py
+"""
+Chuẩn bị ảnh upload cho OCR: decode một lần ở độ phân giải vừa đủ, rồi dùng chung một buffer cho cả
+PaddleOCR và Tesseract.
+
+- Tỉ lệ thu nhỏ được tính từ metadata trước khi decode: DPI của ảnh so với OCR_TARGET_DPI, cạnh dài so với
+  OCR_MAX_SIDE. JPEG được decode thẳng ở 1/2, 1/4, 1/8 (draft mode), các định dạng khác thu nhỏ bằng
+  reduce + resize. Ảnh chỉ được thu nhỏ, không phóng to.
+- OCR_TARGET_TEXT_HEIGHT > 0: ước lượng chiều cao dòng chữ (profile theo hàng) và thu nhỏ tiếp tới
+  chiều cao đó. Chỉ hợp với trang văn bản một cột nên mặc định tắt.
+- Box trả về cho client được đổi lại theo toạ độ ảnh gốc (PreparedImage.to_original).
+- Ảnh đã decode được đặt trong shared memory (SharedImage): gửi sang worker OCR chỉ tốn tên + shape,
+  các worker đọc thẳng vùng nhớ đó, không copy/pickle ảnh cho từng job. Thiếu chỗ trong /dev/shm
+  (Docker mặc định 64MB, nên chạy với --shm-size=1g) thì gửi ảnh theo cách thường.
+
+OCR_TARGET_DPI=300         0 = không dùng DPI
+OCR_MAX_SIDE=4000          cạnh dài tối đa (px), 0 = không giới hạn
+OCR_TARGET_TEXT_HEIGHT=0   chiều cao dòng chữ mong muốn (px), 0 = tắt
+OCR_MIN_SCALE=0.25         tỉ lệ thu nhỏ nhỏ nhất
+OCR_SHARED_IMAGES=1        0 = không dùng shared memory
+"""
+import io
+import math
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Any, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+OCR_TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", "300"))
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "4000"))
+OCR_TARGET_TEXT_HEIGHT = int(os.getenv("OCR_TARGET_TEXT_HEIGHT", "0"))
+OCR_MIN_SCALE = float(os.getenv("OCR_MIN_SCALE", "0.25"))
+OCR_SHARED_IMAGES = os.getenv("OCR_SHARED_IMAGES", "1") != "0"
+
+_SHM_DIR = "/dev/shm"
+
+
+@dataclass
+class PreparedImage:
+    array: np.ndarray  # RGB uint8, đã thu nhỏ
+    scale: float  # kích thước array / kích thước ảnh gốc
+    original_size: Tuple[int, int]  # (width, height) của ảnh gốc
+
+    def to_original(self, box: Sequence[Sequence[float]]) -> List[List[float]]:
+        """Box 4 điểm trên array -> toạ độ trên ảnh gốc."""
+        if self.scale == 1.0:
+            return [list(pt) for pt in box]
+        return [[round(float(pt[0]) / self.scale, 1), round(float(pt[1]) / self.scale, 1)] for pt in box]
+
+
+def _metadata_scale(image: Image.Image) -> float:
+    scale = 1.0
+    dpi = image.info.get("dpi")
+    if OCR_TARGET_DPI > 0 and dpi:
+        try:
+            source_dpi = float(max(dpi))
+        except (TypeError, ValueError):
+            source_dpi = 0.0
+        if source_dpi > OCR_TARGET_DPI:
+            scale = OCR_TARGET_DPI / source_dpi
+    if OCR_MAX_SIDE > 0 and max(image.size) > OCR_MAX_SIDE:
+        scale = min(scale, OCR_MAX_SIDE / max(image.size))
+    return scale
+
+
+def estimate_text_height(gray: np.ndarray) -> Optional[float]:
+    """Chiều cao điển hình (px) của các dải hàng có chữ; None nếu ảnh không giống trang văn bản."""
+    threshold = gray.mean() - gray.std()
+    rows = (gray < threshold).mean(axis=1) > 0.01
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], rows.view(np.int8), [0]))))
+    heights = edges[1::2] - edges[0::2]
+    heights = heights[heights >= 3]
+    if len(heights) < 5:
+        return None
+    height = float(np.median(heights))
+    return height if height < gray.shape[0] / 10 else None
+
+
+def _resize(image: Image.Image, scale: float, original: Tuple[int, int]) -> Image.Image:
+    size = (max(1, round(original[0] * scale)), max(1, round(original[1] * scale)))
+    if image.size == size:
+        return image
+    return image.resize(size, Image.BILINEAR, reducing_gap=3.0)
+
+
+def prepare_image(contents: bytes) -> PreparedImage:
+    """Decode ảnh upload thành RGB numpy, thu nhỏ theo DPI / cạnh dài / chiều cao chữ. Lỗi ảnh thì raise."""
+    image = Image.open(io.BytesIO(contents))
+    original = image.size
+    scale = max(OCR_MIN_SCALE, _metadata_scale(image))
+    if scale < 1.0:
+        # JPEG: decode thẳng ở kích thước nhỏ hơn gần nhất (không nhỏ hơn kích thước cần)
+        image.draft("RGB", (math.ceil(original[0] * scale), math.ceil(original[1] * scale)))
+    image = _resize(image.convert("RGB"), scale, original)
+
+    if OCR_TARGET_TEXT_HEIGHT > 0:
+        text_height = estimate_text_height(np.asarray(image.convert("L")))
+        if text_height and text_height > OCR_TARGET_TEXT_HEIGHT:
+            scale = max(OCR_MIN_SCALE, scale * OCR_TARGET_TEXT_HEIGHT / text_height)
+            image = _resize(image, scale, original)
+
+    # Tỉ lệ thật sau khi làm tròn kích thước, để đổi toạ độ box về ảnh gốc cho đúng
+    scale = 1.0 if image.size == original else image.size[0] / original[0]
+    return PreparedImage(np.asarray(image), scale, original)
+
+
+def _shm_has_room(nbytes: int) -> bool:
+    # Ghi vượt dung lượng tmpfs làm process bị SIGBUS, nên kiểm tra trước (để dư gấp đôi)
+    try:
+        stat = os.statvfs(_SHM_DIR)
+    except OSError:
+        return False
+    return stat.f_bavail * stat.f_frsize >= 2 * nbytes
+
+
+class SharedImage:
+    """
+    Ảnh numpy trong shared memory. Process tạo ra nó gọi release() khi xong request; worker nhận được bản
+    pickle chỉ gồm tên + shape và gắn vào vùng nhớ khi gọi array().
+    """
+
+    def __init__(self, array: np.ndarray):
+        self._shm: Optional[shared_memory.SharedMemory] = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        self.name = self._shm.name
+        self.shape = array.shape
+        self.dtype = array.dtype.str
+        self._owner = True
+        np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)[...] = array
+
+    def __getstate__(self):
+        return {"name": self.name, "shape": self.shape, "dtype": self.dtype}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._shm = None
+        self._owner = False
+
+    def array(self) -> np.ndarray:
+        """View trên shared memory, không copy. FileNotFoundError nếu ảnh đã được giải phóng."""
+        if self._shm is None:
+            self._shm = shared_memory.SharedMemory(name=self.name)
+        array = np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+        array.flags.writeable = False  # dùng chung giữa các engine, không ai được sửa tại chỗ
+        return array
+
+    def release(self):
+        if self._shm is None:
+            return
+        shm, self._shm = self._shm, None
+        try:
+            shm.close()
+        except BufferError:
+            pass  # còn view đang dùng: vùng nhớ được trả khi view được giải phóng
+        if self._owner:
+            shm.unlink()
+
+
+OcrImage = Union[np.ndarray, SharedImage]
+
+
+def as_array(image: OcrImage) -> np.ndarray:
+    return image.array() if isinstance(image, SharedImage) else image
+
+
+@contextmanager
+def shared_image(array: np.ndarray) -> Iterator[OcrImage]:
+    """Ảnh để gửi sang worker OCR: SharedImage nếu được, không thì chính array."""
+    image: OcrImage = array
+    if OCR_SHARED_IMAGES and _shm_has_room(array.nbytes):
+        try:
+            image = SharedImage(array)
+        except OSError as e:
+            print(f"⚠️ Shared memory unavailable, sending OCR images by copy: {e}")
+    try:
+        yield image
+    finally:
+        if isinstance(image, SharedImage):
+            image.release()
+
+
+def images_as_arrays(images: List[OcrImage]) -> Tuple[List[np.ndarray], List[int]]:
+    """Array của các ảnh còn đọc được + vị trí các ảnh đã bị giải phóng (request bị huỷ giữa chừng)."""
+    arrays, missing = [], []
+    for i, image in enumerate(images):
+        try:
+            arrays.append(as_array(image))
+        except FileNotFoundError:
+            missing.append(i)
+    return arrays, missing
+
+
+def release_all(images: List[Any]):
+    for image in images:
+        if isinstance(image, SharedImage):
+            image.release()
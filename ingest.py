@@ -0,0 +1,145 @@
+# ingest.py
+"""
+Nhận file upload: ghi xuống đĩa theo từng khối lớn, tính SHA-256 trong lúc ghi
+(cache/dedup dùng lại hash, không cần đọc file lần hai) và chặn upload quá lớn / zip bomb.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Dict, Iterator, List, Tuple
+
+from fastapi import UploadFile
+
+from executors import run_stage_async
+
+INGEST_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(2 * 1024 ** 3)))
+MAX_MEMBER_BYTES = int(os.getenv("MAX_MEMBER_BYTES", str(512 * 1024 ** 2)))
+MAX_COMPRESSION_RATIO = float(os.getenv("MAX_COMPRESSION_RATIO", "200"))
+MAX_ZIP_MEMBERS = int(os.getenv("MAX_ZIP_MEMBERS", "10000"))
+
+
+class UploadRejected(Exception):
+    """Upload vượt giới hạn dung lượng hoặc là file zip đáng ngờ (API trả về 413)."""
+
+
+@dataclass
+class IngestedFile:
+    path: Path
+    sha256: str
+    size: int
+
+
+class _ByteBudget:
+    """Tổng số byte được phép ghi xuống đĩa cho một request (upload + file giải nén)."""
+
+    def __init__(self, limit: int):
+        self.remaining = limit
+        self._lock = threading.Lock()
+
+    def take(self, n: int):
+        with self._lock:
+            self.remaining -= n
+            if self.remaining < 0:
+                raise UploadRejected(f"Upload exceeds the limit of {MAX_UPLOAD_BYTES} bytes.")
+
+
+def _copy_hashed(src: BinaryIO, dest: Path, budget: _ByteBudget, max_bytes: int = 0,
+                 compressed_size: int = 0) -> IngestedFile:
+    h = hashlib.sha256()
+    size = 0
+    with open(dest, "wb") as f:
+        for block in iter(lambda: src.read(INGEST_CHUNK_SIZE), b""):
+            size += len(block)
+            budget.take(len(block))
+            if max_bytes and size > max_bytes:
+                raise UploadRejected(f"'{dest.name}' exceeds the per-file limit of {max_bytes} bytes.")
+            # Kiểm tra theo số byte giải nén thực tế, không tin vào header của zip.
+            # Bỏ qua file nhỏ: file text nhỏ lặp lại nhiều có thể nén rất tốt mà vẫn hợp lệ.
+            if compressed_size and size > INGEST_CHUNK_SIZE and size / compressed_size > MAX_COMPRESSION_RATIO:
+                raise UploadRejected(f"'{dest.name}' has a suspicious compression ratio.")
+            h.update(block)
+            f.write(block)
+    return IngestedFile(dest, h.hexdigest(), size)
+
+
+def _extract_zip(zip_path: Path, dest_dir: Path, budget: _ByteBudget) -> Iterator[IngestedFile]:
+    """Giải nén từng file trong zip và yield ngay khi ghi xong; giới hạn dung lượng/tỉ lệ nén kiểm tra theo từng file."""
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        members = [m for m in zip_ref.infolist() if not m.is_dir()]
+        if len(members) > MAX_ZIP_MEMBERS:
+            raise UploadRejected(f"ZIP contains more than {MAX_ZIP_MEMBERS} files.")
+        for member in members:
+            if member.file_size > MAX_MEMBER_BYTES:
+                raise UploadRejected(f"'{member.filename}' exceeds the per-file limit of {MAX_MEMBER_BYTES} bytes.")
+            # Giống extractall: bỏ '..', '.', đường dẫn tuyệt đối để không ghi ra ngoài thư mục tạm
+            parts = [p for p in member.filename.replace("\\", "/").split("/") if p not in ("", ".", "..")]
+            if not parts:
+                continue
+            target = dest_dir.joinpath(*parts)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with zip_ref.open(member) as src:
+                yield _copy_hashed(src, target, budget, MAX_MEMBER_BYTES, max(member.compress_size, 1))
+
+
+def ingest_upload(file: UploadFile, dest_dir: Path, budget: _ByteBudget) -> Iterator[IngestedFile]:
+    """
+    Lưu một file upload vào dest_dir, giải nén nếu là zip (file zip gốc bị xóa khi giải nén xong).
+    Yield từng file đã ghi kèm SHA-256; với zip, mỗi file được yield ngay khi giải nén xong.
+    """
+    # Đảm bảo tên file an toàn
+    filename = Path(file.filename).name
+    file_path = dest_dir / filename
+    file.file.seek(0)
+    saved = _copy_hashed(file.file, file_path, budget)
+
+    # Nếu là file zip thì giải nén và xóa file zip gốc
+    if filename.lower().endswith(".zip"):
+        try:
+            yield from _extract_zip(file_path, dest_dir, budget)
+        finally:
+            file_path.unlink()
+    else:
+        yield saved
+
+
+async def iter_ingested_files(files: List[UploadFile], dest_dir: Path) -> AsyncIterator[IngestedFile]:
+    """
+    Ghi lần lượt từng upload (trong stage io) và yield ngay khi xong để caller xử lý sớm.
+    File zip được giải nén từng file một: mỗi bước chỉ ghi một file trong stage io rồi trả về.
+    """
+    budget = _ByteBudget(MAX_UPLOAD_BYTES)
+    for file in files:
+        written = ingest_upload(file, dest_dir, budget)
+        try:
+            while True:
+                ingested = await run_stage_async("io", next, written, None)
+                if ingested is None:
+                    break
+                yield ingested
+        finally:
+            try:
+                written.close()  # đóng zip và xóa file zip gốc nếu caller dừng giữa chừng
+            except ValueError:
+                pass  # bước đang chạy trong stage io (request bị hủy): thư mục tạm sẽ bị xóa cùng request
+
+
+async def ingest_files(files: List[UploadFile]) -> Tuple[Path, Dict[str, str]]:
+    """
+    Lưu tất cả file upload vào 1 thư mục tạm và giải nén nếu là file zip.
+    Trả về (thư mục tạm, {đường dẫn tương đối: sha256}). Thư mục tạm bị xóa nếu upload bị từ chối.
+    """
+    temp_dir = Path(tempfile.mkdtemp(prefix="api_upload_"))
+    digests: Dict[str, str] = {}
+    try:
+        async for ingested in iter_ingested_files(files, temp_dir):
+            digests[ingested.path.relative_to(temp_dir).as_posix()] = ingested.sha256
+    except BaseException:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    return temp_dir, digests
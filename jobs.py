@@ -0,0 +1,219 @@
+# jobs.py
+"""
+Hệ thống job bất đồng bộ cho các quy trình chạy lâu.
+
+POST tạo job trả về job_id ngay lập tức, job chạy trong thread pool,
+trạng thái + tiến độ từng bước được lưu trong SQLite, file kết quả được giữ
+trong JOB_DIR và tự xóa sau JOB_RESULT_TTL giây (kiểm tra khi tạo job và khi đọc trạng thái/kết quả,
+tối đa mỗi JOB_PURGE_INTERVAL giây một lần).
+Job queued/running của process đã chết (server restart giữa chừng) được đánh dấu failed khi khởi động.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+JOB_DIR = Path(os.getenv("JOB_DIR", str(Path(tempfile.gettempdir()) / "api_jobs")))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))
+JOB_PURGE_INTERVAL = int(os.getenv("JOB_PURGE_INTERVAL", "60"))
+
+# progress(stage, done, total)
+ProgressCallback = Callable[[str, int, int], None]
+# job_fn(work_dir, progress) -> (đường dẫn kết quả, media_type, tên file tải về)
+JobFunction = Callable[[Path, ProgressCallback], Tuple[Path, str, str]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    stages TEXT NOT NULL DEFAULT '{}',
+    error TEXT,
+    result_path TEXT,
+    media_type TEXT,
+    filename TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    owner_pid INTEGER
+)
+"""
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return True  # process vẫn còn, chỉ là của user khác
+    except OSError:
+        return False
+    return True
+
+
+class JobStore:
+    """Lưu trạng thái job trong SQLite, dùng chung được giữa nhiều worker uvicorn."""
+
+    def __init__(self, job_dir: Path = JOB_DIR, ttl: int = JOB_RESULT_TTL):
+        self.job_dir = job_dir
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.job_dir / "jobs.sqlite3"
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+            columns = {r["name"] for r in conn.execute("PRAGMA table_info(jobs)")}
+            if "owner_pid" not in columns:
+                try:
+                    conn.execute("ALTER TABLE jobs ADD COLUMN owner_pid INTEGER")
+                except sqlite3.OperationalError:
+                    pass  # worker khác vừa thêm cột
+        self.fail_abandoned()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, kind: str) -> str:
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, created_at, owner_pid) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, kind, time.time(), os.getpid()),
+            )
+        return job_id
+
+    def work_dir(self, job_id: str) -> Path:
+        return self.job_dir / job_id
+
+    def update_progress(self, job_id: str, stage: str, done: int, total: int):
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT stages FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            stages = json.loads(row["stages"])
+            stages[stage] = {"done": done, "total": total}
+            conn.execute(
+                "UPDATE jobs SET status = 'running', stage = ?, stages = ? WHERE id = ?",
+                (stage, json.dumps(stages), job_id),
+            )
+
+    def finish(self, job_id: str, result_path: Path, media_type: str, filename: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', result_path = ?, media_type = ?, filename = ?, finished_at = ? "
+                "WHERE id = ?",
+                (str(result_path), media_type, filename, time.time(), job_id),
+            )
+
+    def fail(self, job_id: str, error: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                (error, time.time(), job_id),
+            )
+
+    def fail_abandoned(self):
+        """
+        Đánh dấu failed các job queued/running mà process chạy nó không còn (ví dụ server restart giữa chừng),
+        để client không poll mãi; thư mục của chúng được xóa sau TTL như job đã kết thúc.
+        Job của các worker uvicorn khác đang chạy không bị ảnh hưởng.
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id, owner_pid FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+            # pid trùng với process này là của lần chạy trước (pid được cấp lại sau restart)
+            abandoned = [r["id"] for r in rows if r["owner_pid"] == os.getpid() or not _pid_alive(r["owner_pid"])]
+            now = time.time()
+            conn.executemany(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ? "
+                "AND status IN ('queued', 'running')",
+                [("Job was interrupted by a server restart.", now, job_id) for job_id in abandoned],
+            )
+        if abandoned:
+            print(f"⚠️ Marked {len(abandoned)} interrupted job(s) as failed.")
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        self.purge_if_due()
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["stages"] = json.loads(job["stages"])
+        job["expires_at"] = job["finished_at"] + self.ttl if job["finished_at"] else None
+        return job
+
+    def purge_expired(self):
+        """Xóa job đã kết thúc quá TTL cùng thư mục kết quả của nó."""
+        cutoff = time.time() - self.ttl
+        with self._connect() as conn:
+            expired = [r["id"] for r in conn.execute(
+                "SELECT id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,)
+            )]
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in expired])
+        for job_id in expired:
+            shutil.rmtree(self.work_dir(job_id), ignore_errors=True)
+
+    def purge_if_due(self):
+        """purge_expired tối đa mỗi JOB_PURGE_INTERVAL giây một lần (gọi được ở mọi lần đọc trạng thái)."""
+        now = time.time()
+        with self._lock:
+            if now - self._last_purge < JOB_PURGE_INTERVAL:
+                return
+            self._last_purge = now
+        self.purge_expired()
+
+
+class JobRunner:
+    """Chạy job trong thread pool giới hạn, cập nhật trạng thái vào JobStore."""
+
+    def __init__(self, store: JobStore, max_workers: int = JOB_WORKERS):
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def submit(self, kind: str, input_dir: Path, job_fn: JobFunction) -> str:
+        """
+        Tạo job mới. `input_dir` (thư mục upload tạm) được chuyển vào thư mục của job
+        nên caller không cần tự dọn dẹp.
+        """
+        self.store.purge_expired()
+        job_id = self.store.create(kind)
+        work_dir = self.store.work_dir(job_id)
+        shutil.move(str(input_dir), str(work_dir))
+        self.executor.submit(self._run, job_id, work_dir, job_fn)
+        return job_id
+
+    def _run(self, job_id: str, work_dir: Path, job_fn: JobFunction):
+        def progress(stage: str, done: int, total: int):
+            self.store.update_progress(job_id, stage, done, total)
+
+        try:
+            result_path, media_type, filename = job_fn(work_dir, progress)
+            self.store.finish(job_id, result_path, media_type, filename)
+        except Exception as e:
+            traceback.print_exc()
+            self.store.fail(job_id, str(e))
+
+
+_runner: Optional[JobRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner(JobStore())
+    return _runner
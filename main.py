@@ -1,26 +1,53 @@
 # main.py
+import asyncio
+import itertools
+import json
+import os
 import shutil
 import tempfile
 import uuid
-import zipfile
+from dataclasses import dataclass
+from operator import attrgetter
 from pathlib import Path
-from typing import List
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
 
-from fastapi import FastAPI, File, Query, UploadFile
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, File, Query, Request, UploadFile
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
+from chunk_output import (
+    OUTPUT_FORMATS,
+    ChunkRecord,
+    ParquetRecordWriter,
+    chunk_records,
+    parquet_available,
+    record_line,
+    text_record,
+)
+from chunk_store import ChunkStore, ManifestDiff, chunk_params_key, get_chunk_store, parse_manifest
+from chunking import chunk_text_spans, get_tokenizer
+from conversion_cache import get_conversion_cache
+from dedup import DEDUP_THRESHOLD, ChunkDeduplicator
+from executors import StageOverloaded, run_stage, run_stage_async
+from ingest import UploadRejected, ingest_files, iter_ingested_files
+from jobs import ProgressCallback, get_job_runner
+from pdf_backends import PDF_BACKEND, get_pdf_backend
+from pdf_ocr import PDF_OCR_FALLBACK, ocr_available
+from pdf_text import DocumentStore, PdfDocument
+from zipstream import stream_zip
 
 # Các hàm từ convert.py vẫn được import và sử dụng như cũ
 from convert import (
     convert_office_folder_to_pdf,
-    extract_text_from_pdf,
     merge_pdfs,
     save_texts_to_pdf,
 )
 
 
+T = TypeVar("T")
+
 app = FastAPI(title="File Conversion and Extraction API")
 
 app.add_middleware(
@@ -29,8 +56,43 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Cho phép GET, POST, PUT, DELETE, ...
     allow_headers=["*"],  # Cho phép tất cả headers
+    # Cho phép client trên trình duyệt đọc số chunk bị loại khi dedup=true
+    # và các file Office convert lỗi (X-Failed-Files)
+    expose_headers=["X-Dedup-Removed", "X-Dedup-Exact-Removed", "X-Dedup-Near-Removed", "X-Dedup-Kept",
+                    "X-Failed-Files"],
 )
 
+
+def overloaded_response(e: StageOverloaded) -> JSONResponse:
+    """503 + Retry-After khi hàng đợi của một stage đã đầy."""
+    return JSONResponse(status_code=503, content={"error": str(e)}, headers={"Retry-After": str(e.retry_after)})
+
+
+@app.exception_handler(StageOverloaded)
+async def stage_overloaded_handler(request: Request, exc: StageOverloaded):
+    return overloaded_response(exc)
+
+
+@app.exception_handler(UploadRejected)
+async def upload_rejected_handler(request: Request, exc: UploadRejected):
+    return JSONResponse(status_code=413, content={"error": str(exc)})
+
+
+@app.on_event("startup")
+def recover_interrupted_jobs():
+    # Tạo JobStore ngay khi khởi động: job bị bỏ dở từ lần chạy trước được đánh dấu failed (JobStore.fail_abandoned)
+    get_job_runner()
+
+
+@app.on_event("startup")
+def check_pdf_ocr():
+    # Cảnh báo một lần ngay khi khởi động nếu OCR bổ sung cho PDF đang bật mà thiếu pdftoppm / engine OCR
+    if PDF_OCR_FALLBACK:
+        ocr_available()
+
+# Số file của một request được xử lý song song (ví dụ /super-extract)
+REQUEST_FILE_CONCURRENCY = int(os.getenv("REQUEST_FILE_CONCURRENCY", "4"))
+
 # --- HELPER FUNCTIONS ---
 # Các hàm này đã tốt, giữ nguyên để sử dụng cho các endpoint mới
 def remove_temp_dir(path: Path):
@@ -40,28 +102,71 @@ def remove_temp_dir(path: Path):
     except Exception as e:
         print(f"Error removing temp dir {path}: {e}")
 
-def save_and_extract_files(files: List[UploadFile]) -> Path:
+def write_zip(zip_path: Path, entries: Iterable[Tuple[Path, str]]) -> Path:
+    """Ghi các file (path, arcname) vào một file ZIP trên đĩa (dùng cho job nền)."""
+    with open(zip_path, "wb") as f:
+        for data in stream_zip(entries):
+            f.write(data)
+    return zip_path
+
+def iter_text_only_pdfs(pdf_files: List[Path], text_pdf_dir: Path, documents: DocumentStore,
+                        progress: Optional[ProgressCallback] = None, block: bool = False) -> Iterator[Path]:
+    """Trích xuất text và tạo text-only PDF cho từng file, yield ngay khi mỗi file xong."""
+    progress = progress or (lambda stage, done, total: None)
+    text_pdf_dir.mkdir(parents=True, exist_ok=True)
+    # File sau được trích xuất trong lúc file trước đang được render.
+    # block=False chỉ áp dụng cho lần render đầu tiên (như iter_pdfs_pages), các file sau chờ tới lượt.
+    admitted = block
+    for i, (pdf_file, doc) in enumerate(zip(pdf_files, documents.iter_documents(pdf_files, block))):
+        progress("extract", i, len(pdf_files))
+        text_pdf = run_stage("render", save_texts_to_pdf, doc.pages, text_pdf_dir, pdf_file.stem, block=admitted)
+        admitted = True
+        yield text_pdf
+    progress("extract", len(pdf_files), len(pdf_files))
+
+async def prefetch_first(entries: Iterator[T]) -> Iterator[T]:
     """
-    Lưu tất cả file upload vào 1 thư mục tạm và giải nén nếu là file zip.
-    Trả về đường dẫn đến thư mục tạm.
+    Lấy trước phần tử đầu tiên (trong threadpool) trước khi trả về StreamingResponse: StageOverloaded
+    hoặc lỗi của file đầu tiên vẫn thành 503 / 500 thay vì một ZIP hỏng với status 200.
     """
-    temp_dir = Path(tempfile.mkdtemp(prefix="api_upload_"))
-    for file in files:
-        # Đảm bảo tên file an toàn
-        filename = Path(file.filename).name
-        file_path = temp_dir / filename
-        with open(file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-        
-        # Nếu là file zip thì giải nén và xóa file zip gốc
-        if filename.lower().endswith(".zip"):
-            with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
-            file_path.unlink()
-    return temp_dir
+    first = await run_in_threadpool(next, entries, None)
+    return entries if first is None else itertools.chain([first], entries)
+
+def zip_streaming_response(entries: Iterable[Tuple[Path, str]], filename: str, temp_dir: Path,
+                           headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+    """Trả về ZIP dạng stream, mỗi entry được gửi ngay khi sẵn sàng; xóa thư mục tạm khi gửi xong."""
+    return StreamingResponse(
+        stream_zip(entries),
+        media_type='application/zip',
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', **(headers or {})},
+        background=BackgroundTask(remove_temp_dir, temp_dir)
+    )
+
+
+# Độ dài tối đa của thông báo lỗi mỗi file trong header X-Failed-Files
+FAILED_ERROR_MAX_CHARS = 300
+
+
+def failed_files_headers(failed: List[Tuple[str, str]]) -> Dict[str, str]:
+    """
+    Header X-Failed-Files: JSON (chỉ ký tự ASCII) [{"file", "error"}, ...] của các file convert lỗi,
+    để client biết file nào bị thiếu trong kết quả. Không có file lỗi thì không có header.
+    """
+    if not failed:
+        return {}
+    items = [{"file": name, "error": error[:FAILED_ERROR_MAX_CHARS]} for name, error in failed]
+    return {"X-Failed-Files": json.dumps(items)}
 
 # --- REFACTORED API ENDPOINTS ---
 
+@app.get("/cache/stats", summary="Office to PDF conversion cache statistics")
+async def cache_stats_api():
+    """Số lần hit/miss, số entry và dung lượng của cache convert Office -> PDF."""
+    cache = get_conversion_cache()
+    if cache is None:
+        return JSONResponse(content={"enabled": False})
+    return JSONResponse(content={"enabled": True, **cache.stats()})
+
 @app.post("/convert-files", summary="Convert Office files to PDF")
 async def convert_files_api(files: List[UploadFile] = File(..., description="Upload Office files (doc, docx, pptx) or a single ZIP")):
     """
@@ -69,38 +174,35 @@ async def convert_files_api(files: List[UploadFile] = File(..., description="Upl
     - Nếu kết quả là 1 file PDF, trả về file đó.
     - Nếu kết quả là nhiều file PDF, trả về một file ZIP chứa tất cả chúng.
     """
-    temp_dir = save_and_extract_files(files)
+    temp_dir, digests = await ingest_files(files)
     
     try:
         output_dir = temp_dir / "converted_pdfs"
-        pdf_files = convert_office_folder_to_pdf(str(temp_dir), str(output_dir))
+        pdf_files, failed = await run_stage_async(
+            "convert", convert_office_folder_to_pdf, str(temp_dir), str(output_dir), digests
+        )
 
         if not pdf_files:
             remove_temp_dir(temp_dir)
             return JSONResponse(status_code=400, content={"error": "No valid Office files found to convert."})
 
-        # Logic trả về: 1 file hoặc ZIP
+        # Logic trả về: 1 file hoặc ZIP; file convert lỗi nằm trong header X-Failed-Files
         if len(pdf_files) == 1:
             file_path = pdf_files[0]
             return FileResponse(
                 file_path,
                 filename=file_path.name,
                 media_type='application/pdf',
+                headers=failed_files_headers(failed),
                 background=BackgroundTask(remove_temp_dir, temp_dir)
             )
         else:
-            zip_path = temp_dir / "converted_files.zip"
-            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                for pdf_file in pdf_files:
-                    zipf.write(pdf_file, arcname=pdf_file.name)
-            
-            return FileResponse(
-                zip_path,
-                filename="converted_files.zip",
-                media_type='application/zip',
-                background=BackgroundTask(remove_temp_dir, temp_dir)
-            )
+            return zip_streaming_response([(p, p.name) for p in pdf_files], "converted_files.zip", temp_dir,
+                                          failed_files_headers(failed))
 
+    except StageOverloaded as e:
+        remove_temp_dir(temp_dir)
+        return overloaded_response(e)
     except Exception as e:
         remove_temp_dir(temp_dir)
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -114,7 +216,7 @@ async def merge_files_api(
     """
     Gộp nhiều file PDF được upload thành một file PDF duy nhất.
     """
-    temp_dir = save_and_extract_files(files)
+    temp_dir, _ = await ingest_files(files)
 
     try:
         pdf_list = sorted(temp_dir.glob("*.pdf"))
@@ -123,7 +225,7 @@ async def merge_files_api(
             return JSONResponse(status_code=400, content={"error": "At least two PDF files are required to merge."})
         
         output_path = temp_dir / merged_name
-        merge_pdfs(pdf_list, output_path)
+        await run_stage_async("render", merge_pdfs, pdf_list, output_path)
 
         return FileResponse(
             output_path,
@@ -132,6 +234,9 @@ async def merge_files_api(
             background=BackgroundTask(remove_temp_dir, temp_dir)
         )
 
+    except StageOverloaded as e:
+        remove_temp_dir(temp_dir)
+        return overloaded_response(e)
     except Exception as e:
         remove_temp_dir(temp_dir)
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -145,11 +250,13 @@ async def convert_and_merge_api(
     """
     Chuyển đổi tất cả file Office được upload thành PDF, sau đó gộp chúng lại thành 1 file PDF duy nhất.
     """
-    temp_dir = save_and_extract_files(files)
+    temp_dir, digests = await ingest_files(files)
     
     try:
         output_dir = temp_dir / "converted_pdfs"
-        pdf_files = convert_office_folder_to_pdf(str(temp_dir), str(output_dir))
+        pdf_files, failed = await run_stage_async(
+            "convert", convert_office_folder_to_pdf, str(temp_dir), str(output_dir), digests
+        )
 
         if not pdf_files:
             remove_temp_dir(temp_dir)
@@ -162,19 +269,24 @@ async def convert_and_merge_api(
                 file_path,
                 filename=file_path.name,
                 media_type='application/pdf',
+                headers=failed_files_headers(failed),
                 background=BackgroundTask(remove_temp_dir, temp_dir)
             )
 
         output_path = temp_dir / merged_name
-        merge_pdfs(pdf_files, output_path)
+        await run_stage_async("render", merge_pdfs, pdf_files, output_path)
 
         return FileResponse(
             output_path,
             filename=merged_name,
             media_type='application/pdf',
+            headers=failed_files_headers(failed),
             background=BackgroundTask(remove_temp_dir, temp_dir)
         )
 
+    except StageOverloaded as e:
+        remove_temp_dir(temp_dir)
+        return overloaded_response(e)
     except Exception as e:
         remove_temp_dir(temp_dir)
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -183,15 +295,23 @@ async def convert_and_merge_api(
 @app.post("/extract-text", summary="Extract text from PDF files")
 async def extract_text_api(
     files: List[UploadFile] = File(..., description="Upload PDF files or a single ZIP"),
-    return_format: str = Query("file", enum=["file", "text"], description="Return format: 'file' (text-only PDF) or 'text' (JSON)")
+    return_format: str = Query("file", enum=["file", "text"], description="Return format: 'file' (text-only PDF) or 'text' (JSON)"),
+    ocr: bool = Query(PDF_OCR_FALLBACK, description="OCR các trang không có (hoặc quá ít) text, ví dụ trang scan."),
+    pdf_backend: str = Query(PDF_BACKEND, description="Thư viện đọc PDF: pypdf2, pypdf, pymupdf, pdfminer hoặc pdftotext (cần được cài).")
 ):
     """
     Trích xuất văn bản từ các file PDF.
     - `return_format='text'`: Trả về JSON chứa nội dung text.
     - `return_format='file'`: Trả về file PDF chỉ chứa text (hoặc ZIP nếu nhiều file).
+    - `ocr=true`: chỉ các trang thiếu lớp text mới được render thành ảnh và OCR song song.
     """
-    temp_dir = save_and_extract_files(files)
-    
+    try:
+        get_pdf_backend(pdf_backend)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    temp_dir, digests = await ingest_files(files)
+    documents = DocumentStore(digests, temp_dir, ocr=ocr, backend=pdf_backend)
+
     try:
         all_pdfs = sorted(temp_dir.glob("*.pdf"))
         if not all_pdfs:
@@ -201,10 +321,11 @@ async def extract_text_api(
         # --- Lựa chọn 1: Trả về JSON chứa text ---
         if return_format == "text":
             extracted_data = {}
-            for pdf_file in all_pdfs:
-                texts = extract_text_from_pdf(pdf_file)
+            # Các file và dải trang được trích xuất song song, kết quả giữ đúng thứ tự
+            docs = await run_in_threadpool(lambda: list(documents.iter_documents(all_pdfs)))
+            for pdf_file, doc in zip(all_pdfs, docs):
                 # Ghép text từ các trang lại thành một chuỗi duy nhất
-                extracted_data[pdf_file.name] = "\n".join(texts)
+                extracted_data[pdf_file.name] = "\n".join(doc.pages)
             
             remove_temp_dir(temp_dir) # Dọn dẹp ngay lập tức
             return JSONResponse(content=extracted_data)
@@ -213,15 +334,12 @@ async def extract_text_api(
         elif return_format == "file":
             text_pdf_dir = temp_dir / "text_only_pdfs"
             text_pdf_dir.mkdir()
-            
-            output_files = []
-            for pdf_file in all_pdfs:
-                texts = extract_text_from_pdf(pdf_file)
-                output_path = save_texts_to_pdf(texts, text_pdf_dir, pdf_file.stem)
-                output_files.append(output_path)
-            
-            if len(output_files) == 1:
-                file_path = output_files[0]
+
+            if len(all_pdfs) == 1:
+                doc = await run_in_threadpool(documents.get, all_pdfs[0])
+                file_path = await run_stage_async(
+                    "render", save_texts_to_pdf, doc.pages, text_pdf_dir, all_pdfs[0].stem
+                )
                 return FileResponse(
                     file_path,
                     filename=file_path.name,
@@ -229,18 +347,14 @@ async def extract_text_api(
                     background=BackgroundTask(remove_temp_dir, temp_dir)
                 )
             else:
-                zip_path = temp_dir / "extracted_text_files.zip"
-                with zipfile.ZipFile(zip_path, 'w') as zipf:
-                    for text_pdf in output_files:
-                        zipf.write(text_pdf, arcname=text_pdf.name)
-                
-                return FileResponse(
-                    zip_path,
-                    filename="extracted_text_files.zip",
-                    media_type='application/zip',
-                    background=BackgroundTask(remove_temp_dir, temp_dir)
-                )
+                # Mỗi file text-only được gửi vào ZIP ngay khi tạo xong
+                entries = ((p, p.name) for p in iter_text_only_pdfs(all_pdfs, text_pdf_dir, documents))
+                entries = await prefetch_first(entries)
+                return zip_streaming_response(entries, "extracted_text_files.zip", temp_dir)
 
+    except StageOverloaded as e:
+        remove_temp_dir(temp_dir)
+        return overloaded_response(e)
     except Exception as e:
         remove_temp_dir(temp_dir)
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -259,66 +373,108 @@ async def convert_extract_download_api(
     5. Gộp tất cả các file text-only PDF lại.
     6. Trả về một file ZIP chứa file đã gộp và tất cả các file text-only PDF riêng lẻ.
     """
-    temp_dir = save_and_extract_files(files)
+    temp_dir, digests = await ingest_files(files)
 
     try:
-        # 1. Convert Office -> PDF
-        pdf_dir = temp_dir / "converted_pdfs"
-        converted_pdfs = convert_office_folder_to_pdf(str(temp_dir), str(pdf_dir))
-
-        # 2. Lấy tất cả PDF để trích xuất (cả có sẵn và mới convert)
-        existing_pdfs = list(temp_dir.glob("*.pdf"))
-        all_pdfs_for_extraction = converted_pdfs + existing_pdfs
-
+        all_pdfs_for_extraction, failed = await run_in_threadpool(convert_uploaded_office_files, temp_dir,
+                                                                  digests=digests)
         if not all_pdfs_for_extraction:
             remove_temp_dir(temp_dir)
             return JSONResponse(status_code=400, content={"error": "No valid Office or PDF files found."})
 
-        # 3. Trích xuất và tạo text-only PDF
-        text_pdf_dir = temp_dir / "text_only_pdfs"
-        text_pdf_dir.mkdir(parents=True, exist_ok=True)
-        text_only_pdfs = []
-        for pdf_file in all_pdfs_for_extraction:
-            texts = extract_text_from_pdf(pdf_file)
-            output_text_pdf = save_texts_to_pdf(texts, text_pdf_dir, pdf_file.stem)
-            text_only_pdfs.append(output_text_pdf)
-        
-        if not text_only_pdfs:
-            remove_temp_dir(temp_dir)
-            return JSONResponse(status_code=400, content={"error": "Could not extract any text from the provided files."})
-        
-        # 4. Merge các text-only PDF
-        merged_text_pdf_path = temp_dir / "merged_text_only.pdf"
-        merge_pdfs(text_only_pdfs, merged_text_pdf_path)
-
-        # 5. Tạo file ZIP kết quả
-        zip_path = temp_dir / "result.zip"
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            if merged_text_pdf_path.exists():
-                zipf.write(merged_text_pdf_path, arcname="merged_text_only.pdf")
-            for text_pdf in text_only_pdfs:
-                zipf.write(text_pdf, arcname=f"text_only_pdfs/{text_pdf.name}")
-        
-        # 6. Trả về ZIP và lên lịch xóa thư mục tạm
-        return FileResponse(
-            zip_path,
-            media_type='application/zip',
-            filename="result.zip",
-            background=BackgroundTask(remove_temp_dir, temp_dir)
-        )
+        # Trả về ZIP dạng stream: mỗi text-only PDF được gửi ngay khi tạo xong, file merge ở cuối
+        documents = DocumentStore(digests, temp_dir)
+        entries = await prefetch_first(iter_result_zip_entries(temp_dir, all_pdfs_for_extraction, documents,
+                                                               failed=failed))
+        return zip_streaming_response(entries, "result.zip", temp_dir, failed_files_headers(failed))
 
+    except StageOverloaded as e:
+        remove_temp_dir(temp_dir)
+        return overloaded_response(e)
     except Exception as e:
         remove_temp_dir(temp_dir)
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+
+def convert_uploaded_office_files(temp_dir: Path, progress: Optional[ProgressCallback] = None,
+                                  block: bool = False, digests: Optional[Dict[str, str]] = None
+                                  ) -> Tuple[List[Path], List[Tuple[str, str]]]:
+    """
+    Convert Office -> PDF, trả về (tất cả PDF cần trích xuất (cả có sẵn và mới convert),
+    [(tên file, lỗi), ...] của các file Office convert lỗi).
+    """
+    progress = progress or (lambda stage, done, total: None)
+
+    # 1. Convert Office -> PDF
+    pdf_dir = temp_dir / "converted_pdfs"
+    progress("convert", 0, 1)
+    converted_pdfs, failed = run_stage("convert", convert_office_folder_to_pdf, str(temp_dir), str(pdf_dir), digests,
+                                       block=block)
+    progress("convert", 1, 1)
+
+    # 2. Lấy tất cả PDF để trích xuất (cả có sẵn và mới convert)
+    existing_pdfs = list(temp_dir.glob("*.pdf"))
+    return converted_pdfs + existing_pdfs, failed
+
+
+def iter_result_zip_entries(temp_dir: Path, pdf_files: List[Path], documents: DocumentStore,
+                            progress: Optional[ProgressCallback] = None,
+                            block: bool = False, failed: Optional[List[Tuple[str, str]]] = None
+                            ) -> Iterator[Tuple[Path, str]]:
+    """
+    Các entry của result.zip: từng text-only PDF ngay khi tạo xong, cuối cùng là file đã merge.
+    `failed`: file Office convert lỗi, ghi vào failed_files.json ([{"file", "error"}, ...]) ở cuối ZIP.
+    """
+    progress = progress or (lambda stage, done, total: None)
+
+    # 3. Trích xuất và tạo text-only PDF
+    text_only_pdfs = []
+    for text_pdf in iter_text_only_pdfs(pdf_files, temp_dir / "text_only_pdfs", documents, progress, block):
+        text_only_pdfs.append(text_pdf)
+        yield text_pdf, f"text_only_pdfs/{text_pdf.name}"
+
+    # 4. Merge các text-only PDF
+    progress("merge", 0, 1)
+    merged_text_pdf_path = temp_dir / "merged_text_only.pdf"
+    # Đã có entry được gửi đi thì không từ chối ở bước merge nữa
+    run_stage("render", merge_pdfs, text_only_pdfs, merged_text_pdf_path, block=block or bool(text_only_pdfs))
+    progress("merge", 1, 1)
+    yield merged_text_pdf_path, "merged_text_only.pdf"
+
+    if failed:
+        failed_path = temp_dir / "failed_files.json"
+        failed_path.write_text(json.dumps([{"file": name, "error": error} for name, error in failed],
+                                          ensure_ascii=False), encoding="utf-8")
+        yield failed_path, "failed_files.json"
+
+
+def run_convert_extract_download(temp_dir: Path, progress: Optional[ProgressCallback] = None,
+                                 block: bool = False, digests: Optional[Dict[str, str]] = None) -> Optional[Path]:
+    """
+    Chạy quy trình convert -> trích xuất -> merge -> zip trên thư mục upload, ghi result.zip ra đĩa.
+    Trả về đường dẫn result.zip, hoặc None nếu không có file Office/PDF hợp lệ.
+    block=True: chờ khi stage đầy thay vì raise StageOverloaded (dùng cho job nền).
+    """
+    all_pdfs_for_extraction, failed = convert_uploaded_office_files(temp_dir, progress, block, digests)
+    if not all_pdfs_for_extraction:
+        return None
+
+    # 5. Tạo file ZIP kết quả
+    zip_path = temp_dir / "result.zip"
+    documents = DocumentStore(digests, temp_dir)
+    write_zip(zip_path, iter_result_zip_entries(temp_dir, all_pdfs_for_extraction, documents, progress, block,
+                                                failed))
+    return zip_path
+
 # --- ENDPOINT MỚI (extractor_service) ---
 
+# PDF luôn đi qua DocumentStore (pdf_text): mỗi PDF chỉ parse một lần cho mọi bước của request
 from extractor_service import (
-    extract_text_from_pdf,
     extract_text_from_word,
-    extract_text_from_pptx,
+    extract_pptx_pages,
     extract_data_from_excel_as_markdown,
-    chunk_text,
+    is_read_error,
+    DOCX_ENGINES,
 )
 
 @app.post("/super-extract", summary="Extract and chunk data from various file types for RAG")
@@ -326,60 +482,524 @@ async def super_extract_api(
     files: List[UploadFile] = File(..., description="Upload files (.pdf, .docx, .pptx, .xlsx) or a ZIP"),
     custom_prefix: str = Query("", description="Văn bản tùy biến để thêm vào đầu mỗi chunk dữ liệu"),
     chunk_size: int = Query(0, description="Số ký tự tối đa cho mỗi chunk text. Bỏ qua nếu bằng 0."),
-    max_tokens: int = Query(256, description="Số từ (token) tối đa cho mỗi chunk text. Ưu tiên hơn chunk_size."),
-    xlsx_row_limit: int = Query(50, description="Số dòng tối đa cho mỗi bảng Markdown từ file Excel.")
-) -> JSONResponse:
+    max_tokens: int = Query(256, description="Số token tối đa cho mỗi chunk text (tokenizer cấu hình qua CHUNK_TOKENIZER, mặc định đếm từ). Ưu tiên hơn chunk_size."),
+    chunk_overlap: int = Query(0, description="Số token (hoặc ký tự nếu dùng chunk_size) cuối chunk trước được lặp lại ở đầu chunk sau."),
+    xlsx_row_limit: int = Query(50, description="Số dòng tối đa cho mỗi bảng Markdown từ file Excel."),
+    xlsx_max_tokens: int = Query(0, description="Ngân sách token cho mỗi chunk Excel, kể cả header. Khác 0 thì bỏ qua xlsx_row_limit."),
+    xlsx_max_chars: int = Query(0, description="Ngân sách ký tự cho mỗi chunk Excel nếu xlsx_max_tokens = 0."),
+    xlsx_key_columns: int = Query(1, description="Số cột đầu (khóa) được lặp lại khi sheet quá rộng bị chia nhóm cột."),
+    pptx_notes: bool = Query(False, description="Thêm ghi chú (speaker notes) của từng slide PowerPoint."),
+    pptx_tables: bool = Query(True, description="Thêm các hàng của bảng trong slide PowerPoint."),
+    docx_engine: str = Query("stream", description="Cách đọc Word: stream (nhanh, gồm cả bảng) hoặc python-docx (cách cũ)."),
+    docx_headers: bool = Query(False, description="Thêm header/footer của file Word (chỉ với docx_engine=stream)."),
+    pdf_ocr: bool = Query(PDF_OCR_FALLBACK, description="OCR các trang PDF không có (hoặc quá ít) text, ví dụ trang scan."),
+    pdf_backend: str = Query(PDF_BACKEND, description="Thư viện đọc PDF: pypdf2, pypdf, pymupdf, pdfminer hoặc pdftotext (cần được cài)."),
+    dedup: bool = Query(False, description="Loại chunk trùng hoàn toàn hoặc gần trùng (MinHash) giữa tất cả file của request."),
+    dedup_threshold: float = Query(DEDUP_THRESHOLD, ge=0.0, le=1.0, description="Độ tương đồng (Jaccard) từ đó chunk bị coi là gần trùng."),
+    stream: bool = Query(False, description="Trả về NDJSON: mỗi dòng một chunk {file, chunk_index, text}, gửi ngay khi từng file xong."),
+    output: str = Query("json", description="Định dạng kết quả: json ({file: [chunk]}), jsonl (mỗi dòng một bản ghi có trang/vị trí, luôn stream) hoặc parquet (cần pyarrow)."),
+    incremental: bool = Query(False, description="Trả về manifest + diff (chunk thêm/xóa) để cập nhật vector index từng phần."),
+    manifest: Optional[UploadFile] = File(None, description="Manifest (JSON) nhận từ lần gọi trước; file không đổi sẽ không bị trích xuất lại.")
+):
     """
     API đa năng để trích xuất và chuẩn bị dữ liệu cho RAG:
     - **Hỗ trợ**: PDF, Word, PowerPoint, Excel.
     - **Chunking**: Chia nhỏ văn bản theo số token (từ) hoặc ký tự.
     - **Excel to Markdown**: Chuyển đổi bảng Excel thành Markdown, tự động lặp lại header khi chia nhỏ.
+      Dùng `xlsx_max_tokens`/`xlsx_max_chars` để mỗi chunk có kích thước đều theo ngân sách; sheet quá rộng được chia nhóm cột.
     - **Custom Prefix**: Cho phép thêm metadata/context tùy chỉnh vào đầu mỗi chunk.
+    - **Stream**: `stream=true` trả về NDJSON, file nào xong trước được gửi trước, server không giữ toàn bộ kết quả.
+      Không stream thì kết quả giữ thứ tự file như lúc upload.
+    - **Dedup**: `dedup=true` bỏ chunk trùng giữa các file (chunk của file upload trước được giữ, kể cả khi stream:
+      file được gửi theo thứ tự upload). Số chunk bị loại nằm trong header `X-Dedup-*`, hoặc dòng cuối `{"dedup": {...}}` khi stream.
+    - **Output**: `output=jsonl|parquet` trả về mỗi chunk một bản ghi phẳng
+      {file, chunk_index, page_start, page_end, char_start, char_end, sha256, text} để trích dẫn và nạp hàng loạt.
+      `chunk_index` luôn là vị trí của chunk trong file trước khi dedup (ở mọi định dạng), nên có thể nhảy số khi dedup=true.
+    - **OCR**: `pdf_ocr=true` (mặc định theo PDF_OCR_FALLBACK): trang PDF scan/thiếu text được OCR bổ sung.
+    - **Incremental**: `incremental=true` hoặc gửi kèm `manifest` của lần trước: chỉ file mới/đã đổi được trích xuất,
+      trả về `{added, removed, files, manifest}` (khi stream: các chunk thêm mới, dòng cuối gồm removed/files/manifest).
     """
-    temp_dir = save_and_extract_files(files)
+    if docx_engine not in DOCX_ENGINES:
+        return JSONResponse(status_code=400, content={"error": f"docx_engine must be one of {', '.join(DOCX_ENGINES)}."})
+    try:
+        get_pdf_backend(pdf_backend)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if output not in OUTPUT_FORMATS:
+        return JSONResponse(status_code=400, content={"error": f"output must be one of {', '.join(OUTPUT_FORMATS)}."})
+    if output == "parquet" and not parquet_available():
+        return JSONResponse(status_code=400, content={"error": "output=parquet requires the pyarrow package."})
+    previous_manifest = None
+    if manifest is not None:
+        try:
+            previous_manifest = parse_manifest(await manifest.read())
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+    incremental = incremental or previous_manifest is not None
+    if incremental and dedup:
+        return JSONResponse(status_code=400, content={"error": "dedup cannot be combined with incremental extraction."})
+    if incremental and output != "json":
+        return JSONResponse(status_code=400, content={"error": "incremental extraction only supports output=json."})
+
+    options = dict(
+        custom_prefix=custom_prefix, chunk_size=chunk_size, max_tokens=max_tokens, chunk_overlap=chunk_overlap,
+        xlsx_row_limit=xlsx_row_limit, xlsx_max_tokens=xlsx_max_tokens, xlsx_max_chars=xlsx_max_chars,
+        xlsx_key_columns=xlsx_key_columns, pptx_notes=pptx_notes, pptx_tables=pptx_tables,
+        docx_engine=docx_engine, docx_headers=docx_headers, pdf_ocr=pdf_ocr,
+        pdf_backend=pdf_backend
+    )
+    params_key = chunk_params_key(options)
+    diff = ManifestDiff(params_key, previous_manifest) if incremental else None
+    temp_dir = Path(tempfile.mkdtemp(prefix="api_upload_"))
+    extracted = iter_extracted_files(files, temp_dir, params_key, diff.reusable() if diff else None, **options)
+
+    deduplicator = ChunkDeduplicator(dedup_threshold, prefix=custom_prefix) if dedup else None
+
+    if stream or output == "jsonl":
+        async def ndjson_lines():
+            # Có dedup: chunk của file upload trước được giữ, nên gửi file theo thứ tự upload
+            # thay vì file nào xong trước, để kết quả không phụ thuộc tốc độ xử lý
+            source = in_upload_order(extracted) if deduplicator is not None else extracted
+            try:
+                async for item in source:
+                    file_name, records = item.name, item.records
+                    if item.error is not None:
+                        if diff is not None:
+                            diff.failed(file_name)
+                        yield json.dumps({"file": file_name, "error": str(item.error)}, ensure_ascii=False) + "\n"
+                        continue
+                    if records is None:
+                        diff.unchanged(file_name)
+                        continue
+                    if diff is not None:
+                        if not item.complete:
+                            diff.failed(file_name)
+                            continue
+                        for added in diff.update(file_name, item.sha256, records):
+                            yield json.dumps(added, ensure_ascii=False) + "\n"
+                        continue
+                    if deduplicator is not None:
+                        records = await run_in_threadpool(deduplicator.filter, records, attrgetter("text"))
+                    if output == "jsonl":
+                        for record in records:
+                            yield record_line(record)
+                        continue
+                    for record in records:
+                        yield json.dumps({"file": file_name, "chunk_index": record.chunk_index, "text": record.text},
+                                         ensure_ascii=False) + "\n"
+                if deduplicator is not None:
+                    yield json.dumps({"dedup": deduplicator.stats()}) + "\n"
+                if diff is not None:
+                    new_manifest = diff.finish()
+                    yield json.dumps({"removed": diff.removed, "files": diff.files, "manifest": new_manifest},
+                                     ensure_ascii=False) + "\n"
+            except Exception as e:
+                # Response đã bắt đầu gửi, không đổi được status code nữa
+                yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+            finally:
+                await extracted.aclose()
+
+        return StreamingResponse(
+            ndjson_lines(),
+            media_type="application/x-ndjson",
+            background=BackgroundTask(remove_temp_dir, temp_dir)
+        )
+
     results: Dict[str, List[str]] = {}
+    added: List[Dict[str, Any]] = []
+    # File parquet nằm ngoài temp_dir vì temp_dir bị xóa ngay khi trích xuất xong
+    parquet_dir = Path(tempfile.mkdtemp(prefix="api_parquet_")) if output == "parquet" else None
+    writer = ParquetRecordWriter(parquet_dir / "chunks.parquet") if parquet_dir else None
+    try:
+        # Kết quả không stream giữ thứ tự file như lúc upload, không phụ thuộc file nào xong trước
+        async for item in in_upload_order(extracted):
+            file_name, records = item.name, item.records
+            if item.error is not None:
+                raise item.error
+            if records is None:
+                diff.unchanged(file_name)
+                continue
+            if diff is not None:
+                if item.complete:
+                    added.extend(diff.update(file_name, item.sha256, records))
+                else:
+                    diff.failed(file_name)
+                continue
+            if deduplicator is not None:
+                records = await run_in_threadpool(deduplicator.filter, records, attrgetter("text"))
+            if writer is not None:
+                await run_in_threadpool(writer.write, records)
+            else:
+                results[file_name] = [record.text for record in records]
+        if writer is not None:
+            await run_in_threadpool(writer.close)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+            remove_temp_dir(parquet_dir)
+        raise
+    finally:
+        await extracted.aclose()
+        # Luôn đảm bảo thư mục tạm được xóa
+        remove_temp_dir(temp_dir)
 
+    headers = dedup_headers(deduplicator) if deduplicator else None
+    if writer is not None:
+        return FileResponse(
+            parquet_dir / "chunks.parquet",
+            filename="chunks.parquet",
+            media_type="application/vnd.apache.parquet",
+            headers=headers,
+            background=BackgroundTask(remove_temp_dir, parquet_dir)
+        )
+    if diff is not None:
+        new_manifest = diff.finish()
+        return JSONResponse(content={"added": added, "removed": diff.removed, "files": diff.files,
+                                     "manifest": new_manifest})
+    return JSONResponse(content=results, headers=headers)
+
+
+def dedup_headers(deduplicator: ChunkDeduplicator) -> Dict[str, str]:
+    stats = deduplicator.stats()
+    return {
+        "X-Dedup-Removed": str(stats["removed"]),
+        "X-Dedup-Exact-Removed": str(stats["exact_removed"]),
+        "X-Dedup-Near-Removed": str(stats["near_removed"]),
+        "X-Dedup-Kept": str(stats["kept"]),
+    }
+
+
+@dataclass
+class ExtractedFile:
+    """Kết quả trích xuất một file upload của /super-extract."""
+    index: int  # thứ tự của file trong upload
+    name: str
+    sha256: str
+    records: Optional[List[ChunkRecord]] = None  # None: file không đổi so với manifest, không trích xuất
+    error: Optional[Exception] = None
+    complete: bool = True  # False: records chứa thông báo lỗi thay cho (một phần) nội dung
+
+
+async def iter_extracted_files(files: List[UploadFile], temp_dir: Path, params_key: str = "",
+                               skip: Optional[Dict[str, str]] = None, **options) -> AsyncIterator[ExtractedFile]:
+    """
+    Ghi upload vào temp_dir và trích xuất + chunk từng file ngay khi file đó ghi xong.
+    Yield ExtractedFile theo thứ tự file nào xong trước (in_upload_order để sắp lại theo upload);
+    `options` được truyền cho extract_file_records.
+    `params_key`: dùng chunk store cho file đã từng được chunk với cùng tham số.
+    `skip`: {tên file: sha256} của manifest trước; file không đổi được yield với bản ghi = None, không trích xuất.
+    """
+    documents = DocumentStore(ocr=options.get("pdf_ocr", False), backend=options.get("pdf_backend", ""))
+    results: "asyncio.Queue" = asyncio.Queue()
+    # Giới hạn số file xử lý song song của một request để không làm đầy hàng đợi stage
+    in_flight = asyncio.Semaphore(REQUEST_FILE_CONCURRENCY)
+    tasks: List[asyncio.Future] = []
+
+    async def process(index: int, file_path: Path, sha256: str):
+        try:
+            records, complete = await run_in_threadpool(extract_file_records_cached, file_path, sha256, params_key,
+                                                        documents=documents, **options)
+            await results.put(ExtractedFile(index, file_path.name, sha256, records, complete=complete))
+        except Exception as e:
+            await results.put(ExtractedFile(index, file_path.name, sha256, error=e))
+        finally:
+            in_flight.release()
+
+    async def produce():
+        error = None
+        try:
+            # File nào ghi xong thì bắt đầu trích xuất ngay, trong lúc các file sau vẫn đang được ghi
+            index = 0
+            async for ingested in iter_ingested_files(files, temp_dir):
+                if ingested.path.parent != temp_dir:
+                    continue  # giống trước đây: chỉ xử lý file ở thư mục gốc
+                if skip and skip.get(ingested.path.name) == ingested.sha256:
+                    await results.put(ExtractedFile(index, ingested.path.name, ingested.sha256))
+                else:
+                    documents.register(ingested.path, ingested.sha256)
+                    await in_flight.acquire()
+                    tasks.append(asyncio.ensure_future(process(index, ingested.path, ingested.sha256)))
+                index += 1
+            await asyncio.gather(*tasks)
+        except Exception as e:
+            error = e
+        await results.put(error)
+
+    producer = asyncio.ensure_future(produce())
     try:
-        # Lấy danh sách tất cả file sau khi đã giải nén (nếu có)
-        all_files = [p for p in temp_dir.iterdir() if p.is_file()]
+        while True:
+            item = await results.get()
+            if not isinstance(item, ExtractedFile):
+                # Hết file (None) hoặc lỗi khi nhận upload
+                if item is not None:
+                    raise item
+                break
+            yield item
+    finally:
+        producer.cancel()
+        for task in tasks:
+            task.cancel()
+
+
+async def in_upload_order(extracted: AsyncIterator[ExtractedFile]) -> AsyncIterator[ExtractedFile]:
+    """Yield lại kết quả của iter_extracted_files theo thứ tự upload: file xong sớm được giữ lại chờ các file trước nó."""
+    pending: Dict[int, ExtractedFile] = {}
+    next_index = 0
+    async for item in extracted:
+        pending[item.index] = item
+        while next_index in pending:
+            yield pending.pop(next_index)
+            next_index += 1
+
+
+def extract_file_records(file_path: Path, custom_prefix: str = "", chunk_size: int = 0, max_tokens: int = 256,
+                         chunk_overlap: int = 0, xlsx_row_limit: int = 50, xlsx_max_tokens: int = 0, xlsx_max_chars: int = 0,
+                         xlsx_key_columns: int = 1, pptx_notes: bool = False, pptx_tables: bool = True,
+                         docx_engine: str = "stream", docx_headers: bool = False, pdf_ocr: bool = False,
+                         pdf_backend: str = "", block: bool = False, documents: Optional[DocumentStore] = None
+                         ) -> Tuple[List[ChunkRecord], bool]:
+    """
+    Trích xuất + chunk một file, trả về (bản ghi của từng chunk, complete). Bản ghi có text đã thêm prefix
+    nếu có, kèm trang và vị trí ký tự lấy ngay từ lúc trích xuất, không đọc lại file.
+    complete=False: file lỗi, loại file không hỗ trợ, trang/slide đọc lỗi hoặc OCR trang bị lỗi;
+    bản ghi khi đó chứa thông báo lỗi và không được lưu vào chunk store / manifest.
+    `documents`: memo PDF của request/job, PDF trùng nội dung chỉ được parse một lần.
+    pdf_ocr / pdf_backend: cấu hình đọc PDF khi không có `documents` (memo đã có cấu hình riêng).
+    """
+    # Ngân sách chunk Excel đã trừ phần prefix sẽ thêm vào sau
+    if xlsx_max_tokens > 0:
+        xlsx_max_tokens = max(1, xlsx_max_tokens - get_tokenizer().count(custom_prefix))
+    elif xlsx_max_chars > 0:
+        xlsx_max_chars = max(1, xlsx_max_chars - len(custom_prefix) - 1)
+
+    # Thêm dấu cách sau prefix nếu nó chưa có để phân tách với nội dung
+    prefix = custom_prefix if not custom_prefix or custom_prefix.endswith(" ") else f"{custom_prefix} "
+    file_ext = file_path.suffix.lower()
+    name = file_path.name
+
+    if file_ext == ".pdf":
+        # Không chạy qua run_stage: các dải trang đã tự được gửi vào stage extract
+        try:
+            document = (documents or DocumentStore(ocr=pdf_ocr, backend=pdf_backend)).get(file_path, block)
+        except StageOverloaded:
+            raise
+        except Exception as e:
+            text = f"Error reading PDF {name}: {e}"
+            return chunk_records(name, chunk_text_spans(text, chunk_size, max_tokens, chunk_overlap), prefix), False
+        spans = chunk_text_spans(document.text, chunk_size, max_tokens, chunk_overlap)
+        return chunk_records(name, spans, prefix, document.page_at), document.complete
+
+    elif file_ext == ".docx":
+        text = run_stage("extract", extract_text_from_word, file_path, docx_engine, docx_headers, block=block)
+        records = chunk_records(name, chunk_text_spans(text, chunk_size, max_tokens, chunk_overlap), prefix)
+        return records, not is_read_error(text, file_path)
+
+    elif file_ext == ".pptx":
+        # Không chạy qua run_stage: các dải slide đã tự được gửi vào stage extract.
+        # Slide được ghép giống trang PDF nên dùng chung cách tính số trang (số slide) theo vị trí.
+        slides = extract_pptx_pages(file_path, pptx_notes, pptx_tables, block=block)
+        document = PdfDocument.from_pages(name, "", slides)
+        spans = chunk_text_spans(document.text, chunk_size, max_tokens, chunk_overlap)
+        complete = not any(is_read_error(slide, file_path) for slide in slides)
+        return chunk_records(name, spans, prefix, document.page_at), complete
+
+    elif file_ext == ".xlsx":
+        # Hàm excel đã tự xử lý chunking, không cần gọi chunk_text
+        chunks = run_stage("excel", extract_data_from_excel_as_markdown, file_path, xlsx_row_limit,
+                           xlsx_max_tokens, xlsx_max_chars, xlsx_key_columns, block=block)
+        complete = not any(is_read_error(chunk, file_path) for chunk in chunks)
+        return [text_record(name, i, prefix + chunk) for i, chunk in enumerate(chunks)], complete
+
+    return [text_record(name, 0, f"File type '{file_ext}' is not supported.")], False
+
+
+def extract_file_records_cached(file_path: Path, sha256: str = "", params_key: str = "",
+                                **options) -> Tuple[List[ChunkRecord], bool]:
+    """
+    extract_file_records qua chunk store: file cùng nội dung + cùng tham số chunk không bị parse lại.
+    Kết quả không complete (lỗi đọc, OCR trang bị lỗi) không được lưu để lần sau được trích xuất lại.
+    """
+    store = get_chunk_store() if sha256 and params_key else None
+    key = ChunkStore.make_key(sha256, params_key) if store is not None else ""
+    if store is not None:
+        records = store.get(key, file_path.name)
+        if records is not None:
+            return records, True
+    records, complete = extract_file_records(file_path, **options)
+    if store is not None and complete:
+        store.put(key, records)
+    return records, complete
+
+
+def run_super_extract(temp_dir: Path, custom_prefix: str = "", chunk_size: int = 0, max_tokens: int = 256,
+                      xlsx_row_limit: int = 50, progress: Optional[ProgressCallback] = None,
+                      block: bool = False, digests: Optional[Dict[str, str]] = None,
+                      deduplicator: Optional[ChunkDeduplicator] = None, params_key: str = "",
+                      **options) -> Dict[str, List[ChunkRecord]]:
+    """
+    Trích xuất + chunk tất cả file trong thư mục upload, trả về {tên file: [bản ghi chunk, ...]}.
+    `params_key`: dùng chunk store (theo sha256 trong digests) cho file đã từng được chunk với cùng tham số.
+    block=True: chờ khi stage đầy thay vì raise StageOverloaded (dùng cho job nền).
+    `options`: các tùy chọn xlsx_* / pptx_* / docx_* khác của extract_file_records.
+    `deduplicator`: bỏ chunk trùng giữa các file, tiến độ "dedup" = số chunk bị loại / tổng số chunk.
+    """
+    progress = progress or (lambda stage, done, total: None)
+    documents = DocumentStore(digests, temp_dir, ocr=options.get("pdf_ocr", False),
+                              backend=options.get("pdf_backend", ""))
+    results: Dict[str, List[ChunkRecord]] = {}
+
+    # Lấy danh sách tất cả file sau khi đã giải nén (nếu có), theo thứ tự upload (thứ tự của digests)
+    # để kết quả và dedup không phụ thuộc thứ tự liệt kê thư mục
+    order = {name: i for i, name in enumerate(digests or {})}
+    all_files = sorted((p for p in temp_dir.iterdir() if p.is_file()), key=lambda p: (order.get(p.name, len(order)), p.name))
+
+    for i, file_path in enumerate(all_files):
+        progress("extract", i, len(all_files))
+        results[file_path.name], _ = extract_file_records_cached(
+            file_path, (digests or {}).get(file_path.name, ""), params_key,
+            custom_prefix=custom_prefix, chunk_size=chunk_size, max_tokens=max_tokens,
+            xlsx_row_limit=xlsx_row_limit, block=block, documents=documents,
+            **options
+        )
 
-        for file_path in all_files:
-            file_name = file_path.name
-            file_ext = file_path.suffix.lower()
-            
-            extracted_chunks = []
+    progress("extract", len(all_files), len(all_files))
+    if deduplicator is not None:
+        total = sum(len(chunks) for chunks in results.values())
+        for name in results:
+            results[name] = deduplicator.filter(results[name], attrgetter("text"))
+        progress("dedup", deduplicator.stats()["removed"], total)
+    return results
 
-            if file_ext == ".pdf":
-                text = extract_text_from_pdf(file_path)
-                extracted_chunks = chunk_text(text, chunk_size, max_tokens)
-            
-            elif file_ext == ".docx":
-                text = extract_text_from_word(file_path)
-                extracted_chunks = chunk_text(text, chunk_size, max_tokens)
 
-            elif file_ext == ".pptx":
-                text = extract_text_from_pptx(file_path)
-                extracted_chunks = chunk_text(text, chunk_size, max_tokens)
+# --- JOB BẤT ĐỒNG BỘ ---
+# Các quy trình chạy lâu: POST trả về job_id ngay, client poll trạng thái rồi tải kết quả.
 
-            elif file_ext == ".xlsx":
-                # Hàm excel đã tự xử lý chunking, không cần gọi chunk_text
-                extracted_chunks = extract_data_from_excel_as_markdown(file_path, xlsx_row_limit)
-            
-            else:
-                results[file_name] = [f"File type '{file_ext}' is not supported."]
-                continue
+def job_accepted_response(job_id: str) -> JSONResponse:
+    return JSONResponse(status_code=202, content={
+        "job_id": job_id,
+        "status_url": f"/jobs/{job_id}",
+        "result_url": f"/jobs/{job_id}/result",
+    })
 
-            # Thêm prefix vào đầu mỗi chunk nếu có
-            if custom_prefix:
-                # Thêm dấu cách sau prefix nếu nó chưa có để phân tách với nội dung
-                prefix = custom_prefix if custom_prefix.endswith(" ") else f"{custom_prefix} "
-                results[file_name] = [prefix + chunk for chunk in extracted_chunks]
-            else:
-                results[file_name] = extracted_chunks
 
-    finally:
-        # Luôn đảm bảo thư mục tạm được xóa
-        remove_temp_dir(temp_dir)
+@app.post("/jobs/convert-extract-download", summary="Async job: Convert, Extract, Merge, and Download")
+async def convert_extract_download_job_api(
+    files: List[UploadFile] = File(..., description="Upload Office/PDF files or a single ZIP")
+):
+    """Giống /convert-extract-download nhưng chạy nền, trả về job_id ngay lập tức."""
+    temp_dir, digests = await ingest_files(files)
+
+    def job(work_dir: Path, progress: ProgressCallback):
+        zip_path = run_convert_extract_download(work_dir, progress, block=True, digests=digests)
+        if zip_path is None:
+            raise ValueError("No valid Office or PDF files found.")
+        return zip_path, "application/zip", "result.zip"
 
-    return JSONResponse(content=results)
+    return job_accepted_response(get_job_runner().submit("convert-extract-download", temp_dir, job))
 
+
+@app.post("/jobs/super-extract", summary="Async job: Extract and chunk data for RAG")
+async def super_extract_job_api(
+    files: List[UploadFile] = File(..., description="Upload files (.pdf, .docx, .pptx, .xlsx) or a ZIP"),
+    custom_prefix: str = Query("", description="Văn bản tùy biến để thêm vào đầu mỗi chunk dữ liệu"),
+    chunk_size: int = Query(0, description="Số ký tự tối đa cho mỗi chunk text. Bỏ qua nếu bằng 0."),
+    max_tokens: int = Query(256, description="Số token tối đa cho mỗi chunk text (tokenizer cấu hình qua CHUNK_TOKENIZER, mặc định đếm từ). Ưu tiên hơn chunk_size."),
+    chunk_overlap: int = Query(0, description="Số token (hoặc ký tự nếu dùng chunk_size) cuối chunk trước được lặp lại ở đầu chunk sau."),
+    xlsx_row_limit: int = Query(50, description="Số dòng tối đa cho mỗi bảng Markdown từ file Excel."),
+    xlsx_max_tokens: int = Query(0, description="Ngân sách token cho mỗi chunk Excel, kể cả header. Khác 0 thì bỏ qua xlsx_row_limit."),
+    xlsx_max_chars: int = Query(0, description="Ngân sách ký tự cho mỗi chunk Excel nếu xlsx_max_tokens = 0."),
+    xlsx_key_columns: int = Query(1, description="Số cột đầu (khóa) được lặp lại khi sheet quá rộng bị chia nhóm cột."),
+    pptx_notes: bool = Query(False, description="Thêm ghi chú (speaker notes) của từng slide PowerPoint."),
+    pptx_tables: bool = Query(True, description="Thêm các hàng của bảng trong slide PowerPoint."),
+    docx_engine: str = Query("stream", description="Cách đọc Word: stream (nhanh, gồm cả bảng) hoặc python-docx (cách cũ)."),
+    docx_headers: bool = Query(False, description="Thêm header/footer của file Word (chỉ với docx_engine=stream)."),
+    pdf_ocr: bool = Query(PDF_OCR_FALLBACK, description="OCR các trang PDF không có (hoặc quá ít) text, ví dụ trang scan."),
+    pdf_backend: str = Query(PDF_BACKEND, description="Thư viện đọc PDF: pypdf2, pypdf, pymupdf, pdfminer hoặc pdftotext (cần được cài)."),
+    dedup: bool = Query(False, description="Loại chunk trùng hoàn toàn hoặc gần trùng (MinHash) giữa tất cả file của request."),
+    dedup_threshold: float = Query(DEDUP_THRESHOLD, ge=0.0, le=1.0, description="Độ tương đồng (Jaccard) từ đó chunk bị coi là gần trùng."),
+    output: str = Query("json", description="Định dạng kết quả: json, jsonl (mỗi dòng một bản ghi có trang/vị trí) hoặc parquet (cần pyarrow)."),
+):
+    """Giống /super-extract nhưng chạy nền, kết quả (json / jsonl / parquet) được tải về từ result_url."""
+    if docx_engine not in DOCX_ENGINES:
+        return JSONResponse(status_code=400, content={"error": f"docx_engine must be one of {', '.join(DOCX_ENGINES)}."})
+    try:
+        get_pdf_backend(pdf_backend)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if output not in OUTPUT_FORMATS:
+        return JSONResponse(status_code=400, content={"error": f"output must be one of {', '.join(OUTPUT_FORMATS)}."})
+    if output == "parquet" and not parquet_available():
+        return JSONResponse(status_code=400, content={"error": "output=parquet requires the pyarrow package."})
+    options = dict(
+        custom_prefix=custom_prefix, chunk_size=chunk_size, max_tokens=max_tokens, chunk_overlap=chunk_overlap,
+        xlsx_row_limit=xlsx_row_limit, xlsx_max_tokens=xlsx_max_tokens, xlsx_max_chars=xlsx_max_chars,
+        xlsx_key_columns=xlsx_key_columns, pptx_notes=pptx_notes, pptx_tables=pptx_tables,
+        docx_engine=docx_engine, docx_headers=docx_headers, pdf_ocr=pdf_ocr,
+        pdf_backend=pdf_backend
+    )
+    params_key = chunk_params_key(options)
+    temp_dir, digests = await ingest_files(files)
+
+    def job(work_dir: Path, progress: ProgressCallback):
+        input_dir = work_dir / "input"
+        input_dir.mkdir()
+        for p in list(work_dir.iterdir()):
+            if p.is_file():
+                p.rename(input_dir / p.name)
+        results = run_super_extract(input_dir, progress=progress, block=True, digests=digests,
+                                    deduplicator=ChunkDeduplicator(dedup_threshold, prefix=custom_prefix) if dedup else None,
+                                    params_key=params_key, **options)
+        remove_temp_dir(input_dir)
+        return write_extract_result(results, work_dir, output)
+
+    return job_accepted_response(get_job_runner().submit("super-extract", temp_dir, job))
+
+
+def write_extract_result(results: Dict[str, List[ChunkRecord]], work_dir: Path, output: str) -> Tuple[Path, str, str]:
+    """Ghi kết quả job super-extract theo định dạng `output`, trả về (đường dẫn, media type, tên file tải về)."""
+    if output == "parquet":
+        result_path = work_dir / "result.parquet"
+        with ParquetRecordWriter(result_path) as writer:
+            for records in results.values():
+                writer.write(records)
+        return result_path, "application/vnd.apache.parquet", result_path.name
+    if output == "jsonl":
+        result_path = work_dir / "result.jsonl"
+        with open(result_path, "w", encoding="utf-8") as f:
+            for records in results.values():
+                f.writelines(record_line(record) for record in records)
+        return result_path, "application/x-ndjson", result_path.name
+    result_path = work_dir / "result.json"
+    texts = {name: [record.text for record in records] for name, records in results.items()}
+    result_path.write_text(json.dumps(texts, ensure_ascii=False), encoding="utf-8")
+    return result_path, "application/json", result_path.name
+
+
+@app.get("/jobs/{job_id}", summary="Job status and per-stage progress")
+async def job_status_api(job_id: str):
+    job = get_job_runner().store.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found or expired."})
+    return JSONResponse(content={
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "stages": job["stages"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "finished_at": job["finished_at"],
+        "expires_at": job["expires_at"],
+    })
+
+
+@app.get("/jobs/{job_id}/result", summary="Download the result of a finished job")
+async def job_result_api(job_id: str):
+    job = get_job_runner().store.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found or expired."})
+    if job["status"] == "failed":
+        return JSONResponse(status_code=500, content={"error": job["error"]})
+    if job["status"] != "done":
+        return JSONResponse(status_code=409, content={"error": "Job is not finished yet.", "status": job["status"]})
+    return FileResponse(job["result_path"], filename=job["filename"], media_type=job["media_type"])
@@ -0,0 +1,262 @@
+# ocr_batching.py
+"""
+Gom request OCR thành batch (dynamic micro-batching) cho từng cặp (model, lang).
+
+Request đầu tiên mở một cửa sổ OCR_BATCH_WINDOW_MS; các request tới trong cửa sổ đó (tối đa
+OCR_BATCH_MAX_SIZE ảnh) được chạy chung một lần, rồi kết quả được trả về đúng người gọi.
+Mỗi batch chạy trong một worker của stage ocr (ocr_worker.py). Với PaddleOCR: detect từng ảnh, sau đó
+các vùng text của cả batch đi qua bộ phân loại góc và bộ nhận dạng trong một lần gọi (rec_batch_num vùng
+mỗi lượt), thay vì mỗi request một lượt nhỏ.
+Khi tải thấp, request chỉ chờ tối đa một cửa sổ. Hàng đợi đầy thì raise StageOverloaded (503).
+
+OCR_BATCH_WINDOW_MS=5      thời gian gom batch (0 = không chờ, chỉ gom những request đang xếp hàng)
+OCR_BATCH_MAX_SIZE=8       số ảnh tối đa mỗi batch (1 = tắt batching)
+OCR_BATCH_QUEUE=64         số ảnh chờ tối đa mỗi (model, lang)
+"""
+import asyncio
+import bisect
+import copy
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from executors import StageOverloaded, get_stage
+from image_prep import OcrImage, images_as_arrays, release_all
+from ocr_registry import get_ocr_registry
+
+OCR_BATCH_WINDOW_MS = float(os.getenv("OCR_BATCH_WINDOW_MS", "5"))
+OCR_BATCH_MAX_SIZE = int(os.getenv("OCR_BATCH_MAX_SIZE", "8"))
+OCR_BATCH_QUEUE = int(os.getenv("OCR_BATCH_QUEUE", "64"))
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+QUEUE_WAIT_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+
+class Histogram:
+    """Histogram đơn giản với các cận trên cố định (giá trị lớn hơn cận cuối rơi vào "+Inf")."""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            labels = [f"<={b:g}" for b in self.bounds] + ["+Inf"]
+            return {
+                "buckets": dict(zip(labels, self.counts)),
+                "count": self.count,
+                "mean": round(self.sum / self.count, 3) if self.count else None,
+            }
+
+
+class OcrBatcher:
+    """
+    Một thread gom ảnh từ hàng đợi thành batch và gửi đi bằng submit_batch(images) -> Future của danh sách
+    kết quả theo thứ tự. Tối đa max_in_flight batch chạy cùng lúc; khi tất cả đang bận, request mới dồn lại
+    trong hàng đợi và batch kế tiếp sẽ lớn hơn.
+    """
+
+    def __init__(self, name: str, submit_batch: Callable[[List[Any]], Future],
+                 window_ms: float = OCR_BATCH_WINDOW_MS, max_batch: int = OCR_BATCH_MAX_SIZE,
+                 queue_size: int = OCR_BATCH_QUEUE, max_in_flight: int = 1):
+        self.name = name
+        self.submit_batch = submit_batch
+        self.window = max(0.0, window_ms) / 1000
+        self.max_batch = max(1, max_batch)
+        self._in_flight = threading.BoundedSemaphore(max(1, max_in_flight))
+        self._queue: "queue.Queue[Tuple[Any, Future, float]]" = queue.Queue(maxsize=max(1, queue_size))
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_BUCKETS_MS)
+        self.batches = 0
+        self.failures = 0
+        self._thread = threading.Thread(target=self._loop, name=f"ocr-batch-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, image: OcrImage) -> Future:
+        future: Future = Future()
+        try:
+            self._queue.put_nowait((image, future, time.monotonic()))
+        except queue.Full:
+            raise StageOverloaded(f"ocr-batch {self.name}")
+        return future
+
+    async def run(self, image: OcrImage) -> Any:
+        """Kết quả OCR của một ảnh, chờ mà không chặn event loop."""
+        return await asyncio.wrap_future(self.submit(image))
+
+    def _collect(self) -> List[Tuple[Any, Future, float]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            self._in_flight.acquire()
+            batch = self._collect()
+            started = time.monotonic()
+            self.batch_sizes.observe(len(batch))
+            for _, _, queued_at in batch:
+                self.queue_wait_ms.observe((started - queued_at) * 1000)
+            # Người gọi đã huỷ (ví dụ client ngắt kết nối) thì không OCR ảnh đó nữa
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                self._in_flight.release()
+                continue
+            self.batches += 1
+            try:
+                done = self.submit_batch([image for image, _, _ in batch])
+            except Exception as e:
+                self._deliver(batch, None, e)
+                continue
+            done.add_done_callback(lambda f, batch=batch: self._deliver(batch, f))
+
+    def _deliver(self, batch, done: Optional[Future], error: Optional[BaseException] = None):
+        self._in_flight.release()
+        if done is not None:
+            error = done.exception()
+        if error is not None:
+            self.failures += 1
+            for _, future, _ in batch:
+                future.set_exception(error)
+            return
+        for (_, future, _), result in zip(batch, done.result()):
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "failures": self.failures,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+        }
+
+
+_pipeline_warned = False
+
+
+def _paddle_pipeline(paddle) -> Optional[Any]:
+    """
+    Module predict_system của PaddleOCR 2.x (sorted_boxes, get_rotate_crop_image, ...) nếu model có đủ
+    text_detector / text_classifier / text_recognizer; None với phiên bản khác (khi đó OCR từng ảnh).
+    """
+    if not all(hasattr(paddle, attr) for attr in ("text_detector", "text_recognizer", "drop_score")):
+        return None
+    for cls in type(paddle).__mro__:
+        module = sys.modules.get(cls.__module__)
+        if hasattr(module, "sorted_boxes") and hasattr(module, "get_rotate_crop_image"):
+            return module
+    return None
+
+
+def _paddle_batch(paddle, images: List[Any]) -> List[Any]:
+    """Cùng định dạng với paddle.ocr(image, cls=True) cho từng ảnh, nhưng nhận dạng cả batch một lần."""
+    pipeline = _paddle_pipeline(paddle) if len(images) > 1 else None
+    if pipeline is None:
+        return [paddle.ocr(image, cls=True) for image in images]
+
+    quad = getattr(getattr(paddle, "args", None), "det_box_type", "quad") == "quad"
+    crop = pipeline.get_rotate_crop_image if quad or not hasattr(pipeline, "get_minarea_rect_crop") \
+        else pipeline.get_minarea_rect_crop
+    boxes_per_image, crops = [], []
+    for image in images:
+        dt_boxes, _ = paddle.text_detector(image)
+        boxes = pipeline.sorted_boxes(dt_boxes) if dt_boxes is not None and len(dt_boxes) else []
+        boxes_per_image.append(boxes)
+        crops.extend(crop(image, copy.deepcopy(box)) for box in boxes)
+
+    rec_res = []
+    if crops:
+        if getattr(paddle, "use_angle_cls", False) and getattr(paddle, "text_classifier", None) is not None:
+            crops, _, _ = paddle.text_classifier(crops)
+        rec_res, _ = paddle.text_recognizer(crops)
+
+    results, k = [], 0
+    for boxes in boxes_per_image:
+        lines = []
+        for box in boxes:
+            text, score = rec_res[k][0], rec_res[k][1]
+            k += 1
+            if score >= paddle.drop_score:
+                lines.append([box.tolist(), (text, score)])
+        # Giống paddle.ocr: [None] khi không detect được vùng text nào
+        results.append([lines] if boxes else [None])
+    return results
+
+
+def _paddle_arrays(lang: str, images: List[Any]) -> List[Any]:
+    global _pipeline_warned
+    with get_ocr_registry().use(lang) as paddle:
+        try:
+            return _paddle_batch(paddle, images)
+        except Exception as e:
+            if len(images) == 1:
+                raise
+            if not _pipeline_warned:
+                _pipeline_warned = True
+                print(f"⚠️ Batched PaddleOCR failed ({e}), falling back to one image per call.")
+            return [paddle.ocr(image, cls=True) for image in images]
+
+
+def paddle_ocr_batch(lang: str, images: List[OcrImage]) -> List[Any]:
+    """Chạy trong worker: ảnh là array hoặc SharedImage (image_prep.py); ảnh đã bị giải phóng cho ra [None]."""
+    arrays, missing = images_as_arrays(images)
+    try:
+        results = iter(_paddle_arrays(lang, arrays) if arrays else [])
+    finally:
+        del arrays
+        release_all(images)
+    return [[None] if i in missing else next(results) for i in range(len(images))]
+
+
+BATCH_RUNNERS: Dict[str, Callable[[str, List[Any]], List[Any]]] = {
+    "paddle": paddle_ocr_batch,
+}
+
+_batchers: Dict[Tuple[str, str], OcrBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_ocr_batcher(model: str, lang: str) -> OcrBatcher:
+    """
+    Batcher dùng chung của (model, lang), tạo khi dùng lần đầu. Mỗi batch chạy trong một worker của stage
+    ocr (ocr_worker.py); stage đầy thì batcher chờ, hàng đợi của batcher đầy thì request nhận 503.
+    """
+    with _batchers_lock:
+        key = (model, lang)
+        if key not in _batchers:
+            runner = BATCH_RUNNERS[model]
+            stage = get_stage("ocr")
+            _batchers[key] = OcrBatcher(
+                f"{model}:{lang}",
+                lambda images: stage.submit(runner, lang, images, block=True),
+                max_in_flight=stage.workers,
+            )
+    return _batchers[key]
+
+
+def batch_stats() -> Dict[str, Any]:
+    with _batchers_lock:
+        batchers = dict(_batchers)
+    return {batcher.name: batcher.stats() for batcher in batchers.values()}
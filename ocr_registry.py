@@ -0,0 +1,168 @@
+# ocr_registry.py
+"""
+Registry model PaddleOCR theo ngôn ngữ: model chỉ được nạp khi dùng lần đầu (không nạp lúc import),
+có thể nạp trước (prewarm) một số ngôn ngữ lúc khởi động, và được giải phóng khi không dùng quá
+OCR_MODEL_IDLE_TTL giây. Mỗi model ghi lại thời gian nạp và RAM tăng thêm khi nạp (RSS của process).
+
+OCR_PRELOAD=eng,vie          nạp trước khi app khởi động (mặc định không nạp gì)
+OCR_MODEL_IDLE_TTL=0         giây không dùng trước khi giải phóng model (0 = giữ mãi)
+OCR_USE_ANGLE_CLS=1          bật bộ phân loại góc xoay của PaddleOCR
+"""
+import gc
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+OCR_PRELOAD = [lang.strip() for lang in os.getenv("OCR_PRELOAD", "").split(",") if lang.strip()]
+OCR_MODEL_IDLE_TTL = float(os.getenv("OCR_MODEL_IDLE_TTL", "0"))
+OCR_USE_ANGLE_CLS = os.getenv("OCR_USE_ANGLE_CLS", "1") != "0"
+
+# Tên ngôn ngữ của API -> mã ngôn ngữ của PaddleOCR
+PADDLE_LANGS = {"eng": "en", "vie": "vi"}
+
+
+def current_rss_bytes() -> Optional[int]:
+    """RSS hiện tại của process (Linux /proc), None nếu không đọc được."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _ModelSlot:
+    def __init__(self, lang: str):
+        self.lang = lang
+        self.model: Any = None
+        self.lock = threading.Lock()  # chỉ một thread nạp model, các thread khác chờ
+        self.in_use = 0
+        self.last_used = 0.0
+        self.loads = 0
+        self.uses = 0
+        self.load_seconds: Optional[float] = None
+        self.rss_bytes: Optional[int] = None
+
+
+class OcrModelRegistry:
+    """Model PaddleOCR của từng ngôn ngữ trong process hiện tại, nạp khi cần."""
+
+    def __init__(self, idle_ttl: float = OCR_MODEL_IDLE_TTL, use_angle_cls: bool = OCR_USE_ANGLE_CLS):
+        self.idle_ttl = idle_ttl
+        self.use_angle_cls = use_angle_cls
+        self.cpu_threads: Optional[int] = None  # thread suy luận của Paddle (None = mặc định của PaddleOCR)
+        self._slots: Dict[str, _ModelSlot] = {lang: _ModelSlot(lang) for lang in PADDLE_LANGS}
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+
+    def _slot(self, lang: str) -> _ModelSlot:
+        slot = self._slots.get(lang)
+        if slot is None:
+            raise ValueError(f"Lang must be one of {', '.join(PADDLE_LANGS)}")
+        return slot
+
+    def _load(self, slot: _ModelSlot):
+        from paddleocr import PaddleOCR  # nặng: chỉ import khi thật sự cần model
+
+        rss_before = current_rss_bytes()
+        start = time.perf_counter()
+        options = {"cpu_threads": self.cpu_threads} if self.cpu_threads else {}
+        slot.model = PaddleOCR(use_angle_cls=self.use_angle_cls, lang=PADDLE_LANGS[slot.lang], **options)
+        slot.load_seconds = time.perf_counter() - start
+        rss_after = current_rss_bytes()
+        slot.rss_bytes = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+        slot.loads += 1
+        print(f"OCR model '{slot.lang}' loaded in {slot.load_seconds:.1f}s")
+        self._start_sweeper()
+
+    @contextmanager
+    def use(self, lang: str) -> Iterator[Any]:
+        """Model của `lang` (nạp nếu chưa có); model đang được dùng không bị giải phóng."""
+        slot = self._slot(lang)
+        with slot.lock:
+            if slot.model is None:
+                self._load(slot)
+            slot.in_use += 1
+            slot.uses += 1
+            model = slot.model
+        try:
+            yield model
+        finally:
+            with slot.lock:
+                slot.in_use -= 1
+                slot.last_used = time.monotonic()
+
+    def prewarm(self, langs: Optional[List[str]] = None):
+        """Nạp trước các model (mặc định OCR_PRELOAD), lỗi chỉ được in ra để app vẫn khởi động."""
+        for lang in OCR_PRELOAD if langs is None else langs:
+            try:
+                with self.use(lang):
+                    pass
+            except Exception as e:
+                print(f"⚠️ Could not preload OCR model '{lang}': {e}")
+
+    def unload_idle(self, now: Optional[float] = None) -> List[str]:
+        """Giải phóng các model không dùng quá idle_ttl giây, trả về danh sách ngôn ngữ đã giải phóng."""
+        if self.idle_ttl <= 0:
+            return []
+        now = time.monotonic() if now is None else now
+        unloaded = []
+        for slot in self._slots.values():
+            with slot.lock:
+                if slot.model is not None and slot.in_use == 0 and now - slot.last_used >= self.idle_ttl:
+                    slot.model = None
+                    unloaded.append(slot.lang)
+        if unloaded:
+            gc.collect()
+            print(f"OCR models unloaded after {self.idle_ttl:.0f}s idle: {', '.join(unloaded)}")
+        return unloaded
+
+    def _start_sweeper(self):
+        if self.idle_ttl <= 0:
+            return
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="ocr-model-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self):
+        interval = max(1.0, min(self.idle_ttl / 2, 60.0))
+        while True:
+            time.sleep(interval)
+            self.unload_idle()
+
+    def stats(self) -> Dict[str, Any]:
+        models = {}
+        now = time.monotonic()
+        for slot in self._slots.values():
+            with slot.lock:
+                models[slot.lang] = {
+                    "loaded": slot.model is not None,
+                    "in_use": slot.in_use,
+                    "loads": slot.loads,
+                    "uses": slot.uses,
+                    "load_seconds": round(slot.load_seconds, 3) if slot.load_seconds is not None else None,
+                    "rss_mib": round(slot.rss_bytes / 1024 ** 2, 1) if slot.rss_bytes is not None else None,
+                    "idle_seconds": round(now - slot.last_used, 1) if slot.model is not None and slot.last_used else None,
+                }
+        rss = current_rss_bytes()
+        return {
+            "idle_ttl": self.idle_ttl,
+            "process_rss_mib": round(rss / 1024 ** 2, 1) if rss is not None else None,
+            "models": models,
+        }
+
+
+_registry: Optional[OcrModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_ocr_registry() -> OcrModelRegistry:
+    """Registry dùng chung của process (mỗi process của stage ocr có registry riêng)."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = OcrModelRegistry()
+    return _registry
@@ -1,21 +1,38 @@
 from fastapi import UploadFile, HTTPException
 from fastapi.responses import JSONResponse
-from paddleocr import PaddleOCR
-from PIL import Image
-import pytesseract
-import numpy as np
-import io
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import time
 
-# Khởi tạo sẵn model PaddleOCR cho tiếng Anh và tiếng Việt
-ocr_models = {
-    "eng": PaddleOCR(use_angle_cls=True, lang="en"),
-    "vie": PaddleOCR(use_angle_cls=True, lang="vi")
-}
+from chunking import split_into_chunks
+from executors import StageOverloaded, get_stage, run_stage_async
+from image_prep import prepare_image, shared_image
+from ocr_batching import batch_stats, get_ocr_batcher
+from ocr_worker import worker_stats
+from tesseract_engine import page_text, recognize_detected
 
-def read_image(contents: bytes):
-    """Đọc bytes thành ảnh numpy array RGB"""
-    return np.array(Image.open(io.BytesIO(contents)).convert("RGB"))
+# Paddle và Tesseract chạy trong các worker của stage "ocr" (ocr_worker.py), không chạy trong event loop;
+# model được nạp trong từng worker (ocr_registry.py), không nạp lúc import.
+# Ảnh được decode/thu nhỏ một lần (image_prep.py) và hai engine đọc chung một buffer trong shared memory.
+
+
+def prewarm_ocr_models():
+    """Gọi lúc app khởi động: tạo các worker OCR, mỗi worker nạp trước các model trong OCR_PRELOAD."""
+    stage = get_stage("ocr")
+    for future in [stage.submit(worker_stats, block=True) for _ in range(stage.workers)]:
+        future.result()
+
+
+async def ocr_model_stats():
+    """Core, số thread, thời gian nạp, RAM và trạng thái model của các worker OCR trả lời được."""
+    stats = await asyncio.gather(*(run_stage_async("ocr", worker_stats) for _ in range(get_stage("ocr").workers)))
+    workers = {s["pid"]: s for s in stats}
+    return JSONResponse(content={"workers": sorted(workers.values(), key=lambda s: s.get("index", 0))})
+
+
+async def ocr_batch_stats():
+    """Histogram kích thước batch và thời gian chờ trong hàng đợi của từng (model, lang)."""
+    return JSONResponse(content=batch_stats())
 
 
 async def ocr_full(file: UploadFile, model: str, lang: str):
@@ -28,46 +45,29 @@ async def ocr_full(file: UploadFile, model: str, lang: str):
     try:
         start_time = time.time()
         contents = await file.read()
-        image_np = read_image(contents)
+        prepared = await run_in_threadpool(prepare_image, contents)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid image file")
 
     result = []
 
-    if model == "paddle":
-        paddle = ocr_models[lang]
-        raw = paddle.ocr(image_np, cls=True)
-        for block in raw:
-            for line in block:
-                result.append({
-                    "box": line[0],
-                    "text": line[1][0],
-                    "confidence": line[1][1]
-                })
-
-    elif model == "tesseract":
-        paddle = ocr_models[lang]
-        raw = paddle.ocr(image_np, cls=True)
-        for block in raw:
-            for line in block:
-                box = line[0]
-                try:
-                    x_coords = [int(pt[0]) for pt in box]
-                    y_coords = [int(pt[1]) for pt in box]
-                    x_min, x_max = max(0, min(x_coords)), max(x_coords)
-                    y_min, y_max = max(0, min(y_coords)), max(y_coords)
-                    cropped = image_np[y_min:y_max, x_min:x_max]
-                except:
-                    continue
-
-                try:
-                    text = pytesseract.image_to_string(cropped, lang=lang)
-                except Exception as e:
-                    text = f"[ERROR: {str(e)}]"
-
+    with shared_image(prepared.array) as image:
+        if model == "paddle":
+            raw = await get_ocr_batcher("paddle", lang).run(image)
+            for block in raw:
+                for line in block:
+                    result.append({
+                        "box": prepared.to_original(line[0]),
+                        "text": line[1][0],
+                        "confidence": line[1][1]
+                    })
+
+        elif model == "tesseract":
+            raw = await get_ocr_batcher("paddle", lang).run(image)
+            for box, text in await run_stage_async("ocr", recognize_detected, image, raw, lang):
                 result.append({
-                    "box": box,
-                    "text": text.strip()
+                    "box": prepared.to_original(box),
+                    "text": text
                 })
 
     return JSONResponse(content={
@@ -86,39 +86,24 @@ async def ocr_fullV2(file: UploadFile, model: str, lang: str):
     try:
         start_time = time.time()
         contents = await file.read()
-        image_np = read_image(contents)
+        prepared = await run_in_threadpool(prepare_image, contents)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid image file")
 
     result = []
 
-    if model == "paddle":
-        paddle = ocr_models[lang]
-        result = paddle.ocr(image_np, cls=True)
-
-    elif model == "tesseract":
-        paddle = ocr_models[lang]
-        raw = paddle.ocr(image_np, cls=True)
-        for block in raw:
-            for line in block:
-                box = line[0]
-                try:
-                    x_coords = [int(pt[0]) for pt in box]
-                    y_coords = [int(pt[1]) for pt in box]
-                    x_min, x_max = max(0, min(x_coords)), max(x_coords)
-                    y_min, y_max = max(0, min(y_coords)), max(y_coords)
-                    cropped = image_np[y_min:y_max, x_min:x_max]
-                except:
-                    continue
-
-                try:
-                    text = pytesseract.image_to_string(cropped, lang=lang)
-                except Exception as e:
-                    text = f"[ERROR: {str(e)}]"
+    with shared_image(prepared.array) as image:
+        if model == "paddle":
+            raw = await get_ocr_batcher("paddle", lang).run(image)
+            result = [[[prepared.to_original(line[0]), line[1]] for line in block] if block else block
+                      for block in raw]
 
+        elif model == "tesseract":
+            raw = await get_ocr_batcher("paddle", lang).run(image)
+            for box, text in await run_stage_async("ocr", recognize_detected, image, raw, lang):
                 result.append([
-                    box,
-                    [text.strip(), 1.0]
+                    prepared.to_original(box),
+                    [text, 1.0]
                 ])
 
     return JSONResponse(content={
@@ -128,11 +113,10 @@ async def ocr_fullV2(file: UploadFile, model: str, lang: str):
 
 
 def split_text_by_token(text: str, token: int):
-    """Chia text thành token-length segments"""
+    """Chia text thành các đoạn <= token token (tokenizer dùng chung trong chunking.py), gom theo câu"""
     if token <= 0:
         return [text]
-    words = text.split()
-    return [" ".join(words[i:i+token]) for i in range(0, len(words), token)]
+    return [chunk.text for chunk in split_into_chunks(text, token)]
 
 def split_text_by_chunk(text: str, chunk: int):
     """Chia text thành chunk-length segments theo ký tự"""
@@ -149,23 +133,25 @@ async def ocr_fulltext(file: UploadFile, model: str, lang: str, token: int = 0,
     try:
         start_time = time.time()
         contents = await file.read()
-        image_np = read_image(contents)
+        prepared = await run_in_threadpool(prepare_image, contents)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid image file")
 
     full_text = ""
 
-    if model == "paddle":
-        paddle = ocr_models[lang]
-        raw = paddle.ocr(image_np, cls=True)
-        lines = [line[1][0] for block in raw for line in block]
-        full_text = "\n".join(lines)
-
-    elif model == "tesseract":
-        try:
-            full_text = pytesseract.image_to_string(Image.fromarray(image_np), lang=lang)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Tesseract error: {str(e)}")
+    with shared_image(prepared.array) as image:
+        if model == "paddle":
+            raw = await get_ocr_batcher("paddle", lang).run(image)
+            lines = [line[1][0] for block in raw for line in block]
+            full_text = "\n".join(lines)
+
+        elif model == "tesseract":
+            try:
+                full_text = await run_stage_async("ocr", page_text, image, lang)
+            except StageOverloaded:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Tesseract error: {str(e)}")
 
     # Split text nếu token hoặc chunk > 0
     if token > 0:
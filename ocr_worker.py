@@ -0,0 +1,69 @@
+# ocr_worker.py
+"""
+Khởi tạo process worker của stage "ocr" (executors.py). OCR ảnh (ocr_service.py) và trang PDF scan
+(pdf_ocr.py) đều chạy trong các worker này, không chạy trong event loop của API.
+
+Mỗi worker khi khởi động:
+- giới hạn thread nội bộ (OpenMP/MKL, cpu_threads của PaddleOCR, Tesseract) ở OCR_WORKER_THREADS để
+  nhiều worker chạy song song không tranh nhau core
+- nếu OCR_PIN_CPUS=1: gán worker vào nhóm core riêng (worker i dùng các core i*threads ... (i+1)*threads - 1)
+- nạp trước các model trong OCR_PRELOAD (ocr_registry.py), mỗi worker một lần
+
+STAGE_OCR_WORKERS=<số core / 2>   số worker
+STAGE_OCR_QUEUE=<8 x số core>     số job chờ tối đa, đầy thì trả về 503
+OCR_WORKER_THREADS=0              thread mỗi worker (0 = số core / số worker)
+OCR_PIN_CPUS=0                    1 = gán core cố định cho từng worker (Linux)
+"""
+import os
+from typing import Any, Dict, List, Optional
+
+OCR_WORKER_THREADS = int(os.getenv("OCR_WORKER_THREADS", "0"))
+OCR_PIN_CPUS = os.getenv("OCR_PIN_CPUS", "0") == "1"
+
+_THREAD_ENV = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "OMP_THREAD_LIMIT")
+
+_worker: Dict[str, Any] = {}
+
+
+def worker_threads(workers: int) -> int:
+    if OCR_WORKER_THREADS > 0:
+        return OCR_WORKER_THREADS
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def _pin(index: int, threads: int) -> Optional[List[int]]:
+    if not OCR_PIN_CPUS or not hasattr(os, "sched_setaffinity"):
+        return None
+    available = sorted(os.sched_getaffinity(0))
+    start = (index * threads) % len(available)
+    cpus = sorted({available[(start + i) % len(available)] for i in range(min(threads, len(available)))})
+    try:
+        os.sched_setaffinity(0, cpus)
+    except OSError as e:
+        print(f"⚠️ Could not pin OCR worker {index} to CPUs {cpus}: {e}")
+        return None
+    return cpus
+
+
+def init_worker(counter, workers: int):
+    """Initializer của ProcessPoolExecutor: chạy trước mọi job, trước khi Paddle/Tesseract được import."""
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    threads = worker_threads(workers)
+    for var in _THREAD_ENV:
+        os.environ[var] = str(threads)
+    _worker.update(index=index, threads=threads, cpus=_pin(index, threads))
+
+    from ocr_registry import get_ocr_registry
+
+    registry = get_ocr_registry()
+    registry.cpu_threads = threads
+    registry.prewarm()
+
+
+def worker_stats() -> Dict[str, Any]:
+    """Thông tin của worker đang chạy job này: core, số thread và model đã nạp."""
+    from ocr_registry import get_ocr_registry
+
+    return {"pid": os.getpid(), **_worker, **get_ocr_registry().stats()}
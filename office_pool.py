@@ -0,0 +1,198 @@
+# office_pool.py
+"""
+Pool of long-lived headless LibreOffice instances driven over UNO.
+
+Each worker owns one `soffice` process listening on a named UNO pipe and its own
+user profile directory, so instances never fight over the profile lock. Pipe names
+are unique per process, so several uvicorn workers can each run their own pool
+without colliding on a shared port.
+Workers are health-checked before use and recycled after a fixed number of
+conversions to keep LibreOffice's memory growth in check.
+"""
+import atexit
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+    from com.sun.star.connection import NoConnectException
+except ImportError:  # python3-uno chưa được cài -> convert.py sẽ fallback về subprocess
+    uno = None
+
+OFFICE_POOL_SIZE = int(os.getenv("OFFICE_POOL_SIZE", "2"))
+OFFICE_POOL_MAX_JOBS = int(os.getenv("OFFICE_POOL_MAX_JOBS", "200"))
+OFFICE_POOL_START_TIMEOUT = float(os.getenv("OFFICE_POOL_START_TIMEOUT", "60"))
+OFFICE_POOL_ACQUIRE_TIMEOUT = float(os.getenv("OFFICE_POOL_ACQUIRE_TIMEOUT", "300"))
+
+
+def _prop(name: str, value):
+    p = PropertyValue()
+    p.Name = name
+    p.Value = value
+    return p
+
+
+class OfficeWorker:
+    """One warm soffice process with a dedicated UNO pipe and user profile."""
+
+    def __init__(self, soffice_path: str, pipe_name: str, profile_dir: Path):
+        self.soffice_path = soffice_path
+        self.pipe_name = pipe_name
+        self.profile_dir = profile_dir
+        self.process: Optional[subprocess.Popen] = None
+        self.desktop = None
+        self.jobs_done = 0
+
+    def start(self):
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        self.process = subprocess.Popen([
+            self.soffice_path,
+            "--headless",
+            "--invisible",
+            "--nologo",
+            "--nodefault",
+            "--norestore",
+            "--nolockcheck",
+            f"-env:UserInstallation={self.profile_dir.as_uri()}",
+            f"--accept=pipe,name={self.pipe_name};urp;StarOffice.ComponentContext",
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        local_ctx = uno.getComponentContext()
+        resolver = local_ctx.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local_ctx
+        )
+        deadline = time.monotonic() + OFFICE_POOL_START_TIMEOUT
+        while True:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"soffice on pipe {self.pipe_name} exited with code {self.process.returncode}")
+            try:
+                ctx = resolver.resolve(f"uno:pipe,name={self.pipe_name};urp;StarOffice.ComponentContext")
+                break
+            except NoConnectException:
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError(f"soffice on pipe {self.pipe_name} did not start in time")
+                time.sleep(0.25)
+
+        self.desktop = ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+        self.jobs_done = 0
+
+    def stop(self):
+        if self.desktop is not None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass
+            self.desktop = None
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+
+    def is_healthy(self) -> bool:
+        """The process must be alive and the UNO bridge must still answer."""
+        if self.process is None or self.process.poll() is not None or self.desktop is None:
+            return False
+        try:
+            self.desktop.getComponents()
+            return True
+        except Exception:
+            return False
+
+    def convert(self, source: Path, pdf_path: Path):
+        doc = self.desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(str(source.resolve())), "_blank", 0, (_prop("Hidden", True),)
+        )
+        if doc is None:
+            raise RuntimeError(f"LibreOffice could not open '{source.name}'.")
+        try:
+            if doc.supportsService("com.sun.star.presentation.PresentationDocument"):
+                filter_name = "impress_pdf_Export"
+            elif doc.supportsService("com.sun.star.sheet.SpreadsheetDocument"):
+                filter_name = "calc_pdf_Export"
+            else:
+                filter_name = "writer_pdf_Export"
+            doc.storeToURL(
+                uno.systemPathToFileUrl(str(pdf_path.resolve())), (_prop("FilterName", filter_name),)
+            )
+        finally:
+            doc.close(True)
+        self.jobs_done += 1
+
+
+class OfficePool:
+    """
+    Fixed-size pool of OfficeWorker instances.
+    Workers are started lazily, restarted when unhealthy and recycled after `max_jobs` conversions.
+    """
+
+    def __init__(self, soffice_path: str, size: int = OFFICE_POOL_SIZE, max_jobs: int = OFFICE_POOL_MAX_JOBS):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.profile_root = Path(tempfile.mkdtemp(prefix="office_pool_"))
+        # The mkdtemp name is already unique on this host; the pid makes the owning worker easy to spot
+        pipe_prefix = f"{self.profile_root.name}_{os.getpid()}"
+        self.workers: List[OfficeWorker] = [
+            OfficeWorker(soffice_path, f"{pipe_prefix}_{i}", self.profile_root / f"worker_{i}")
+            for i in range(size)
+        ]
+        self._idle: "queue.Queue[OfficeWorker]" = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+
+    def convert(self, source: Path, pdf_path: Path) -> Path:
+        """Convert one Office file on the next free worker and return the PDF path."""
+        try:
+            worker = self._idle.get(timeout=OFFICE_POOL_ACQUIRE_TIMEOUT)
+        except queue.Empty:
+            raise RuntimeError("No LibreOffice worker became available in time.")
+
+        try:
+            if worker.jobs_done >= self.max_jobs or not worker.is_healthy():
+                worker.stop()
+                worker.start()
+            try:
+                worker.convert(source, pdf_path)
+            except Exception:
+                # Worker có thể đã hỏng sau lỗi, khởi động lại ở lần dùng sau
+                if not worker.is_healthy():
+                    worker.stop()
+                raise
+        finally:
+            self._idle.put(worker)
+        return pdf_path
+
+    def shutdown(self):
+        for worker in self.workers:
+            worker.stop()
+        shutil.rmtree(self.profile_root, ignore_errors=True)
+
+
+_pool: Optional[OfficePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_office_pool(soffice_path: str) -> Optional[OfficePool]:
+    """
+    Returns the process-wide LibreOffice pool, creating it on first use.
+    Returns None when UNO is unavailable or the pool is disabled (OFFICE_POOL_SIZE=0).
+    """
+    global _pool
+    if uno is None or OFFICE_POOL_SIZE <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = OfficePool(soffice_path)
+            atexit.register(_pool.shutdown)
+    return _pool
@@ -0,0 +1,28 @@
+# ooxml.py
+"""Đọc phần chung của file Office Open XML (docx, pptx): relationships giữa các part trong zip."""
+import posixpath
+import xml.etree.ElementTree as ET
+import zipfile
+from typing import Dict, Tuple
+
+_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+def read_rels(z: zipfile.ZipFile, part: str) -> Dict[str, Tuple[str, str]]:
+    """{rId: (type, part đích)} của một part theo thứ tự khai báo; part không có file .rels thì trả về rỗng."""
+    base_dir, name = posixpath.split(part)
+    try:
+        data = z.read(posixpath.join(base_dir, "_rels", name + ".rels"))
+    except KeyError:
+        return {}
+    rels = {}
+    for rel in ET.fromstring(data).iter(_REL + "Relationship"):
+        if rel.get("TargetMode") == "External":
+            continue
+        target = rel.get("Target", "")
+        if target.startswith("/"):
+            target = target.lstrip("/")
+        else:
+            target = posixpath.normpath(posixpath.join(base_dir, target))
+        rels[rel.get("Id")] = (rel.get("Type", ""), target)
+    return rels
@@ -0,0 +1,233 @@
+# pdf_backends.py
+"""
+Các backend trích xuất text PDF, chọn theo request (pdf_backend=...) hoặc cấu hình PDF_BACKEND.
+
+- pypdf2:    PyPDF2 (mặc định, luôn có trong requirements)
+- pypdf:     pypdf, bản kế nhiệm PyPDF2, nhanh hơn và ít lỗi hơn
+- pymupdf:   PyMuPDF (fitz, MuPDF viết bằng C), thường nhanh nhất
+- pdfminer:  pdfminer.six, phân tích layout kỹ nhưng chậm
+- pdftotext: lệnh pdftotext của poppler-utils (chạy subprocess)
+Thư viện chỉ được import khi backend được dùng. So sánh trên bộ PDF của bạn:
+python benchmarks/bench_pdf.py --corpus <thư mục PDF>
+"""
+import abc
+import importlib.util
+import os
+import re
+import shutil
+import subprocess
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+PDF_BACKEND = os.getenv("PDF_BACKEND", "pypdf2")
+PDF_BACKEND_TIMEOUT = int(os.getenv("PDF_BACKEND_TIMEOUT", "300"))
+
+# Đầu của text thay cho trang lỗi; pptx_text.py dùng cùng dạng cho slide lỗi
+PAGE_ERROR_PREFIX = "[⚠️ Lỗi đọc "
+
+
+class PdfBackend(abc.ABC):
+    """
+    Giao diện chung: open -> page_count / page_text -> close.
+    extract_range dùng chung: trang lỗi được thay bằng thông báo lỗi, không làm hỏng cả file.
+    """
+
+    name = ""
+    requires = ""  # package Python cần có
+
+    def available(self) -> bool:
+        return importlib.util.find_spec(self.requires) is not None
+
+    @abc.abstractmethod
+    def open(self, path: str) -> Any:
+        ...
+
+    @abc.abstractmethod
+    def page_count(self, doc: Any) -> int:
+        ...
+
+    @abc.abstractmethod
+    def page_text(self, doc: Any, index: int) -> str:
+        ...
+
+    def close(self, doc: Any):
+        pass
+
+    def count_pages(self, path: str) -> int:
+        doc = self.open(path)
+        try:
+            return self.page_count(doc)
+        finally:
+            self.close(doc)
+
+    def extract_range(self, path: str, start: int = 0, end: Optional[int] = None,
+                      count: Optional[int] = None) -> List[str]:
+        """Text của các trang [start, end). `count`: số trang đã biết của file, để khỏi đếm lại."""
+        doc = self.open(path)
+        try:
+            return [self.safe_page_text(doc, i) for i in range(start, self.range_end(doc, end, count))]
+        finally:
+            self.close(doc)
+
+    def range_end(self, doc: Any, end: Optional[int], count: Optional[int]) -> int:
+        count = self.page_count(doc) if count is None else count
+        return count if end is None else min(end, count)
+
+    def safe_page_text(self, doc: Any, index: int) -> str:
+        """page_text đã strip; trang lỗi được thay bằng thông báo lỗi."""
+        try:
+            text = self.page_text(doc, index)
+            return text.strip() if text else ""
+        except Exception as e:
+            return f"{PAGE_ERROR_PREFIX}trang {index + 1}: {e}]"
+
+
+class PyPDF2Backend(PdfBackend):
+    name = "pypdf2"
+    requires = "PyPDF2"
+
+    def open(self, path: str) -> Any:
+        from PyPDF2 import PdfReader
+        return PdfReader(path)
+
+    def page_count(self, doc: Any) -> int:
+        return len(doc.pages)
+
+    def page_text(self, doc: Any, index: int) -> str:
+        return doc.pages[index].extract_text()
+
+
+class PypdfBackend(PyPDF2Backend):
+    name = "pypdf"
+    requires = "pypdf"
+
+    def open(self, path: str) -> Any:
+        from pypdf import PdfReader
+        return PdfReader(path)
+
+
+class PyMuPDFBackend(PdfBackend):
+    name = "pymupdf"
+    requires = "fitz"  # bản mới có thêm tên pymupdf, bản cũ chỉ có fitz
+
+    def open(self, path: str) -> Any:
+        try:
+            import pymupdf
+        except ImportError:
+            import fitz as pymupdf
+        return pymupdf.open(path)
+
+    def page_count(self, doc: Any) -> int:
+        return doc.page_count
+
+    def page_text(self, doc: Any, index: int) -> str:
+        # Không dùng sort=True: sắp xếp lại khối text chậm hơn hàng chục lần trên trang nhiều dòng
+        return doc.load_page(index).get_text("text")
+
+    def close(self, doc: Any):
+        doc.close()
+
+
+class PdfminerBackend(PdfBackend):
+    name = "pdfminer"
+    requires = "pdfminer"
+
+    def open(self, path: str) -> Any:
+        return path
+
+    def page_count(self, doc: Any) -> int:
+        from pdfminer.pdfpage import PDFPage
+        with open(doc, "rb") as f:
+            return sum(1 for _ in PDFPage.get_pages(f))
+
+    @staticmethod
+    def _layout_text(layout) -> str:
+        from pdfminer.layout import LTTextContainer
+
+        return "".join(element.get_text() for element in layout if isinstance(element, LTTextContainer))
+
+    def page_text(self, doc: Any, index: int) -> str:
+        from pdfminer.high_level import extract_pages
+
+        for layout in extract_pages(doc, page_numbers=[index]):
+            return self._layout_text(layout)
+        return ""
+
+    def extract_range(self, path: str, start: int = 0, end: Optional[int] = None,
+                      count: Optional[int] = None) -> List[str]:
+        # Một lần parse cho cả dải trang thay vì mở lại file cho từng trang
+        from pdfminer.high_level import extract_pages
+
+        end = self.range_end(path, end, count)
+        texts: List[str] = []
+        try:
+            for layout in extract_pages(path, page_numbers=range(start, end)):
+                texts.append(self._layout_text(layout).strip())
+        except Exception:
+            # Lỗi giữa chừng: đọc lại từng trang còn lại để chỉ trang lỗi bị thay bằng thông báo lỗi
+            texts.extend(self.safe_page_text(path, i) for i in range(start + len(texts), end))
+        return texts
+
+
+class PdftotextBackend(PdfBackend):
+    name = "pdftotext"
+    requires = "pdftotext"  # lệnh của poppler-utils, không phải package Python
+    _PAGES = re.compile(rb"^Pages:\s+(\d+)", re.MULTILINE)
+
+    def available(self) -> bool:
+        return shutil.which("pdftotext") is not None and shutil.which("pdfinfo") is not None
+
+    def open(self, path: str) -> Any:
+        return path
+
+    def page_count(self, doc: Any) -> int:
+        out = subprocess.run(["pdfinfo", doc], capture_output=True, timeout=PDF_BACKEND_TIMEOUT, check=True)
+        match = self._PAGES.search(out.stdout)
+        return int(match.group(1)) if match else 0
+
+    @staticmethod
+    def _run(path: str, start: int, end: int) -> List[str]:
+        out = subprocess.run(
+            ["pdftotext", "-enc", "UTF-8", "-f", str(start + 1), "-l", str(end), path, "-"],
+            capture_output=True, timeout=PDF_BACKEND_TIMEOUT, check=True,
+        )
+        # Mỗi trang kết thúc bằng form feed
+        pages = out.stdout.decode("utf-8", errors="replace").split("\f")[:end - start]
+        pages += [""] * (end - start - len(pages))
+        return [page.strip() for page in pages]
+
+    def page_text(self, doc: Any, index: int) -> str:
+        return self._run(doc, index, index + 1)[0]
+
+    def extract_range(self, path: str, start: int = 0, end: Optional[int] = None,
+                      count: Optional[int] = None) -> List[str]:
+        end = self.range_end(path, end, count)
+        if end <= start:
+            return []
+        try:
+            return self._run(path, start, end)
+        except (subprocess.SubprocessError, OSError):
+            # Một lệnh cho cả dải bị lỗi/timeout: chạy lại từng trang để chỉ trang lỗi bị thay bằng thông báo lỗi
+            return [self.safe_page_text(path, i) for i in range(start, end)]
+
+
+PDF_BACKENDS: Dict[str, PdfBackend] = {
+    backend.name: backend
+    for backend in (PyPDF2Backend(), PypdfBackend(), PyMuPDFBackend(), PdfminerBackend(), PdftotextBackend())
+}
+
+
+@lru_cache(maxsize=None)
+def available_backends() -> List[str]:
+    return [name for name, backend in PDF_BACKENDS.items() if backend.available()]
+
+
+def get_pdf_backend(name: str = "") -> PdfBackend:
+    """Backend theo tên (mặc định PDF_BACKEND). Raise ValueError nếu không có hoặc chưa cài."""
+    name = name or PDF_BACKEND
+    backend = PDF_BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"pdf_backend must be one of {', '.join(PDF_BACKENDS)}.")
+    if name not in available_backends():
+        raise ValueError(f"PDF backend '{name}' is not installed.")
+    return backend
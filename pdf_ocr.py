@@ -0,0 +1,136 @@
+# pdf_ocr.py
+"""
+OCR bổ sung cho các trang PDF không có lớp text (trang scan) hoặc lớp text quá mỏng.
+
+Chỉ những trang có ít hơn PDF_OCR_MIN_CHARS ký tự (không tính khoảng trắng) mới được render
+thành ảnh (pdftoppm, gói poppler-utils) và OCR, mỗi trang một job trong stage "ocr" nên các trang
+được OCR song song; kết quả được ghép lại đúng thứ tự trang. PDF có sẵn text không tốn chi phí OCR.
+Thiếu pdftoppm hoặc engine OCR thì bỏ qua (giữ nguyên text cũ), không làm hỏng request.
+"""
+import importlib.util
+import io
+import os
+import shutil
+import subprocess
+from collections import deque
+from pathlib import Path
+from typing import Deque, List, Tuple
+
+from executors import get_stage, in_worker_process
+
+PDF_OCR_FALLBACK = os.getenv("PDF_OCR_FALLBACK", "1") != "0"
+PDF_OCR_ENGINE = os.getenv("PDF_OCR_ENGINE", "tesseract")  # tesseract | paddle
+PDF_OCR_LANG = os.getenv("PDF_OCR_LANG", "eng")  # eng | vie (tesseract nhận cả dạng vie+eng)
+PDF_OCR_MIN_CHARS = int(os.getenv("PDF_OCR_MIN_CHARS", "20"))
+PDF_OCR_DPI = int(os.getenv("PDF_OCR_DPI", "300"))
+PDF_OCR_MAX_PAGES = int(os.getenv("PDF_OCR_MAX_PAGES", "500"))  # số trang OCR tối đa mỗi file (0 = không giới hạn)
+PDF_OCR_TIMEOUT = int(os.getenv("PDF_OCR_TIMEOUT", "120"))
+
+_warned = False
+
+
+def is_thin(text: str) -> bool:
+    return len("".join(text.split())) < PDF_OCR_MIN_CHARS
+
+
+def ocr_available(engine: str = PDF_OCR_ENGINE) -> bool:
+    """pdftoppm và engine OCR đã được cài chưa (chỉ cảnh báo một lần nếu thiếu)."""
+    global _warned
+    if engine == "paddle":
+        ok = importlib.util.find_spec("paddleocr") is not None
+    else:
+        ok = shutil.which("tesseract") is not None and importlib.util.find_spec("pytesseract") is not None
+    ok = ok and shutil.which("pdftoppm") is not None
+    if not ok and not _warned:
+        _warned = True
+        print(f"⚠️ PDF OCR fallback disabled: pdftoppm or the {engine} engine is not installed.")
+    return ok
+
+
+def render_page(path: str, page_number: int, dpi: int = PDF_OCR_DPI) -> bytes:
+    """PNG của một trang (bắt đầu từ 1), render bằng pdftoppm ra stdout."""
+    out = subprocess.run(
+        ["pdftoppm", "-png", "-r", str(dpi), "-f", str(page_number), "-l", str(page_number), "-singlefile", path],
+        capture_output=True, timeout=PDF_OCR_TIMEOUT, check=True,
+    )
+    return out.stdout
+
+
+def _ocr_image(png: bytes, engine: str, lang: str) -> str:
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(png))
+    if engine == "paddle":
+        import numpy as np
+        from ocr_registry import get_ocr_registry  # model được nạp trong process OCR, không phải process chính
+
+        with get_ocr_registry().use(lang) as paddle:
+            raw = paddle.ocr(np.array(image.convert("RGB")), cls=True)
+        return "\n".join(line[1][0] for block in raw or [] for line in block or [])
+
+    import pytesseract
+
+    return pytesseract.image_to_string(image, lang=lang)
+
+
+def ocr_page(path: str, page_number: int, engine: str = PDF_OCR_ENGINE, lang: str = PDF_OCR_LANG,
+             dpi: int = PDF_OCR_DPI) -> str:
+    """Render + OCR một trang, chạy trong process của stage "ocr"."""
+    # Mỗi trang đã là một job song song, không để tesseract tự mở thêm thread
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    return _ocr_image(render_page(path, page_number, dpi), engine, lang).strip()
+
+
+def ocr_thin_pages(path: Path, pages: List[str], block: bool = False) -> Tuple[List[str], bool]:
+    """
+    Thay text của các trang mỏng bằng kết quả OCR (nếu OCR ra text). Tối đa 2 * workers trang
+    đang OCR cùng lúc. block=False: raise StageOverloaded nếu stage ocr đầy ngay từ đầu.
+    Trả về (trang, complete); complete=False chỉ khi OCR một trang bị lỗi. Thiếu công cụ OCR (đã cảnh báo
+    một lần) hoặc vượt PDF_OCR_MAX_PAGES (chỉ OCR N trang mỏng đầu) không phải lỗi.
+    """
+    thin = [i for i, text in enumerate(pages) if is_thin(text)]
+    if PDF_OCR_MAX_PAGES > 0 and len(thin) > PDF_OCR_MAX_PAGES:
+        print(f"⚠️ {path.name}: {len(thin)} pages need OCR, only the first {PDF_OCR_MAX_PAGES} are processed "
+              f"(PDF_OCR_MAX_PAGES).")
+        thin = thin[:PDF_OCR_MAX_PAGES]
+    if not thin or not ocr_available():
+        return pages, True
+    complete = True
+
+    pages = list(pages)
+
+    def merge(i: int, text: str):
+        if len(text) > len(pages[i].strip()):
+            pages[i] = text
+
+    if in_worker_process():
+        for i in thin:
+            try:
+                merge(i, ocr_page(str(path), i + 1))
+            except Exception as e:
+                complete = False
+                print(f"⚠️ OCR failed for {path.name} page {i + 1}: {e}")
+        return pages, complete
+
+    stage = get_stage("ocr")
+    window = 2 * stage.workers
+    in_flight: Deque[Tuple[int, object]] = deque()
+    admitted = block
+
+    def collect():
+        nonlocal complete
+        i, future = in_flight.popleft()
+        try:
+            merge(i, future.result())
+        except Exception as e:
+            complete = False
+            print(f"⚠️ OCR failed for {path.name} page {i + 1}: {e}")
+
+    for i in thin:
+        if len(in_flight) >= window:
+            collect()
+        in_flight.append((i, stage.submit(ocr_page, str(path), i + 1, block=admitted)))
+        admitted = True
+    while in_flight:
+        collect()
+    return pages, complete
@@ -0,0 +1,233 @@
+# pdf_text.py
+"""
+Trích xuất text PDF song song theo trang + mô hình tài liệu dùng chung cho mọi endpoint.
+
+Dải trang của mỗi file được chia thành nhiều phần, mỗi phần chạy trong một process
+của stage "extract" (mỗi process tự mở file), kết quả được ghép lại đúng thứ tự trang.
+Với upload nhiều file, các phần của file sau được xử lý trong lúc file trước chưa xong.
+"""
+import os
+import threading
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from conversion_cache import file_sha256
+from executors import get_stage, in_worker_process
+from pdf_backends import PAGE_ERROR_PREFIX, get_pdf_backend
+from pdf_ocr import ocr_thin_pages
+
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "50"))
+
+
+def _extract_page_range(path: str, start: int = 0, end: Optional[int] = None, backend: str = "",
+                        count: Optional[int] = None) -> List[str]:
+    """
+    Text của các trang [start, end) bằng `backend` (pdf_backends.py), trang lỗi được thay bằng thông báo lỗi.
+    `count`: số trang đã đếm khi chia dải, backend không phải đếm lại cho từng dải.
+    """
+    return get_pdf_backend(backend).extract_range(path, start, end, count)
+
+
+def _page_ranges(paths: List[Path], backend: str = ""
+                 ) -> Iterator[Tuple[int, str, int, Optional[int], Optional[int]]]:
+    """(vị trí file, đường dẫn, start, end, số trang của file) của từng dải trang."""
+    for idx, path in enumerate(paths):
+        try:
+            page_count = get_pdf_backend(backend).count_pages(str(path))
+        except Exception:
+            # Để process con mở lại và raise lỗi thật cho caller
+            yield idx, str(path), 0, None, None
+            continue
+        for start in range(0, page_count, PDF_PAGES_PER_TASK):
+            yield idx, str(path), start, start + PDF_PAGES_PER_TASK, page_count
+
+
+def iter_pdfs_pages(paths: List[Path], workers: Optional[int] = None, block: bool = False,
+                    backend: str = "") -> Iterator[List[str]]:
+    """
+    Yield danh sách text theo trang của từng file, đúng thứ tự `paths`; backend mặc định là PDF_BACKEND.
+    Tối đa 2 * workers phần đang chạy cùng lúc. block=False: raise StageOverloaded nếu
+    stage extract đầy ngay từ đầu; khi đã được nhận thì các phần sau sẽ chờ chỗ trống.
+    """
+    workers = PDF_EXTRACT_WORKERS if workers is None else workers
+    if workers <= 1 or in_worker_process():
+        for path in paths:
+            yield _extract_page_range(str(path), backend=backend)
+        return
+
+    stage = get_stage("extract")
+    window = 2 * workers
+    plan = _page_ranges(paths, backend)
+    in_flight: Deque = deque()
+    admitted = block
+
+    def submit_more():
+        nonlocal admitted
+        while len(in_flight) < window:
+            item = next(plan, None)
+            if item is None:
+                return
+            idx, path, start, end, count = item
+            in_flight.append((idx, stage.submit(_extract_page_range, path, start, end, backend, count,
+                                                block=admitted)))
+            admitted = True
+
+    current_idx = 0
+    current_pages: List[str] = []
+    submit_more()
+    while in_flight:
+        idx, future = in_flight.popleft()
+        # File không có trang nào không tạo phần nào -> yield danh sách rỗng
+        while idx != current_idx:
+            yield current_pages
+            current_pages = []
+            current_idx += 1
+        current_pages.extend(future.result())
+        submit_more()
+
+    while current_idx < len(paths):
+        yield current_pages
+        current_pages = []
+        current_idx += 1
+
+
+def extract_pdf_pages(path: Path, workers: Optional[int] = None, block: bool = False,
+                      backend: str = "") -> List[str]:
+    """Text theo trang của một file PDF, chia dải trang cho `workers` process."""
+    return next(iter_pdfs_pages([path], workers, block, backend))
+
+
+PAGE_SEPARATOR = "\n\n"
+
+
+@dataclass
+class PdfDocument:
+    """
+    Kết quả trích xuất của một PDF: toàn bộ text + vị trí [start, end) của từng trang trong text.
+    Trang rỗng có start == end và không thêm dấu phân cách.
+    complete=False: có trang đọc lỗi hoặc OCR trang bị lỗi, kết quả không nên được lưu lâu dài.
+    """
+    name: str
+    sha256: str
+    text: str
+    starts: List[int]
+    ends: List[int]
+    complete: bool = True
+
+    @classmethod
+    def from_pages(cls, name: str, sha256: str, pages: List[str], complete: bool = True) -> "PdfDocument":
+        parts: List[str] = []
+        starts: List[int] = []
+        ends: List[int] = []
+        offset = 0
+        for page in pages:
+            if page:
+                if parts:
+                    parts.append(PAGE_SEPARATOR)
+                    offset += len(PAGE_SEPARATOR)
+                parts.append(page)
+            starts.append(offset)
+            offset += len(page)
+            ends.append(offset)
+        complete = complete and not any(page.startswith(PAGE_ERROR_PREFIX) for page in pages)
+        return cls(name, sha256, "".join(parts), starts, ends, complete)
+
+    @property
+    def pages(self) -> List[str]:
+        return [self.text[s:e] for s, e in zip(self.starts, self.ends)]
+
+    @property
+    def page_count(self) -> int:
+        return len(self.starts)
+
+    def page_at(self, offset: int) -> int:
+        """Số trang (bắt đầu từ 1) chứa vị trí `offset` trong text; dấu phân cách thuộc về trang sau."""
+        return max(1, min(self.page_count, bisect_right(self.ends, offset) + 1))
+
+
+def load_pdf_document(path: Path, sha256: str = "", workers: Optional[int] = None,
+                      block: bool = False, backend: str = "") -> PdfDocument:
+    """Trích xuất một PDF thành PdfDocument (không memo, dùng DocumentStore để tránh parse lại)."""
+    return PdfDocument.from_pages(path.name, sha256, extract_pdf_pages(path, workers, block, backend))
+
+
+class DocumentStore:
+    """
+    Memo PdfDocument theo SHA-256 trong phạm vi một request hoặc một job:
+    cùng nội dung thì chỉ parse một lần, kể cả khi nhiều thread cùng hỏi.
+    ocr=True: trang không có (hoặc quá ít) text được OCR bổ sung (pdf_ocr.py).
+    backend: tên backend trích xuất (pdf_backends.py), mặc định PDF_BACKEND.
+    """
+
+    def __init__(self, digests: Optional[Dict[str, str]] = None, base_dir: Optional[Path] = None,
+                 ocr: bool = False, backend: str = ""):
+        # digests: {đường dẫn tương đối với base_dir: sha256} tính sẵn lúc upload
+        self._digests = {base_dir / name: digest for name, digest in (digests or {}).items()} if base_dir else {}
+        self.ocr = ocr
+        self.backend = backend
+        self._docs: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def register(self, path: Path, sha256: str):
+        """Ghi nhận hash đã biết của một file (ví dụ tính lúc upload) để khỏi đọc lại file."""
+        self._digests[path] = sha256
+
+    def _key(self, path: Path) -> str:
+        return self._digests.get(path) or file_sha256(path)
+
+    def _claim(self, key: str) -> Tuple[Future, bool]:
+        with self._lock:
+            if key in self._docs:
+                return self._docs[key], False
+            future: Future = Future()
+            self._docs[key] = future
+            return future, True
+
+    def iter_documents(self, paths: List[Path], block: bool = False) -> Iterator[PdfDocument]:
+        """PdfDocument của từng file theo đúng thứ tự; file chưa có trong memo được trích xuất song song."""
+        keys = [self._key(p) for p in paths]
+        futures: List[Future] = []
+        claimed: List[Tuple[Path, str, Future]] = []
+        for path, key in zip(paths, keys):
+            future, owner = self._claim(key)
+            futures.append(future)
+            if owner:
+                claimed.append((path, key, future))
+
+        fresh = iter_pdfs_pages([p for p, _, _ in claimed], block=block, backend=self.backend)
+        pending = iter(claimed)
+        # Như iter_pdfs_pages: chỉ job OCR đầu tiên có thể bị từ chối, các file sau chờ tới lượt
+        ocr_admitted = block
+        try:
+            for future in futures:
+                # Xử lý các file mình đã nhận (theo thứ tự) cho tới khi file này có kết quả.
+                # Nếu file do thread khác nhận thì xử lý hết phần của mình trước rồi mới chờ, tránh chờ chéo nhau.
+                while not future.done():
+                    item = next(pending, None)
+                    if item is None:
+                        break
+                    c_path, c_key, c_future = item
+                    pages = next(fresh)
+                    complete = True
+                    if self.ocr:
+                        pages, complete = ocr_thin_pages(c_path, pages, ocr_admitted)
+                        ocr_admitted = True
+                    c_future.set_result(PdfDocument.from_pages(c_path.name, c_key, pages, complete))
+                yield future.result()
+        except BaseException as e:
+            # Không để thread khác chờ mãi các file đã nhận mà chưa xử lý
+            error = e if isinstance(e, Exception) else RuntimeError("PDF extraction was aborted.")
+            for _, c_key, c_future in claimed:
+                if not c_future.done():
+                    with self._lock:
+                        self._docs.pop(c_key, None)
+                    c_future.set_exception(error)
+            raise
+
+    def get(self, path: Path, block: bool = False) -> PdfDocument:
+        return next(self.iter_documents([path], block))
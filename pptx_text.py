@@ -0,0 +1,156 @@
+# pptx_text.py
+"""
+Trích xuất text PPTX theo slide.
+
+Thứ tự slide lấy từ presentation.xml (sldIdLst + relationships), không sắp xếp theo tên file
+(slide10 không còn đứng trước slide2). Các part XML được đọc lần lượt từng part từ zip,
+có thể kèm ghi chú (notes) và ô của bảng. Deck lớn được chia dải slide cho các process của stage "extract".
+"""
+import os
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import deque
+from pathlib import Path
+from typing import IO, Deque, Iterator, List, Optional
+
+from executors import get_stage, in_worker_process
+from ooxml import read_rels
+from pdf_backends import PAGE_ERROR_PREFIX
+
+PPTX_EXTRACT_WORKERS = int(os.getenv("PPTX_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PPTX_SLIDES_PER_TASK = int(os.getenv("PPTX_SLIDES_PER_TASK", "100"))
+
+_A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+_P = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+_R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_MC = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+
+_NOTES_SKIPPED_PLACEHOLDERS = {"sldNum", "sldImg", "dt", "hdr", "ftr"}
+
+NOTES_HEADING = "[Notes]"
+
+
+def _natural_key(name: str) -> list:
+    return [int(t) if t.isdigit() else t for t in re.split(r"(\d+)", name)]
+
+
+def slide_parts(z: zipfile.ZipFile) -> List[str]:
+    """Part XML của các slide theo thứ tự trình chiếu; file thiếu presentation.xml thì sắp xếp tự nhiên theo tên."""
+    names = set(z.namelist())
+    if "ppt/presentation.xml" in names:
+        rels = read_rels(z, "ppt/presentation.xml")
+        order = []
+        with z.open("ppt/presentation.xml") as f:
+            for _, elem in ET.iterparse(f):
+                if elem.tag == _P + "sldId":
+                    target = rels.get(elem.get(_R + "id"), ("", ""))[1]
+                    if target in names:
+                        order.append(target)
+                elif elem.tag == _P + "sldIdLst":
+                    break
+        if order:
+            return order
+    return sorted((n for n in names if re.fullmatch(r"ppt/slides/slide\d+\.xml", n)), key=_natural_key)
+
+
+def _paragraph_text(p: ET.Element) -> str:
+    return "".join(p.itertext()).strip()
+
+
+def _iter_shape_lines(shapes: ET.Element, include_tables: bool, notes: bool) -> Iterator[str]:
+    """Các dòng text của các shape theo thứ tự trong spTree: mỗi đoạn <a:p> một dòng, mỗi hàng bảng một dòng."""
+    for shape in shapes:
+        tag = shape.tag
+        if tag == _P + "grpSp":
+            yield from _iter_shape_lines(shape, include_tables, notes)
+            continue
+        if tag == _MC + "AlternateContent":
+            # Choice và Fallback là cùng một nội dung, chỉ đọc nhánh đầu
+            if len(shape):
+                yield from _iter_shape_lines(shape[0], include_tables, notes)
+            continue
+        if notes:
+            ph = shape.find(f"{_P}nvSpPr/{_P}nvPr/{_P}ph")
+            if ph is not None and ph.get("type") in _NOTES_SKIPPED_PLACEHOLDERS:
+                continue
+        if tag == _P + "graphicFrame":
+            if include_tables:
+                for tr in shape.iter(_A + "tr"):
+                    row = [" ".join(filter(None, (_paragraph_text(p) for p in tc.iter(_A + "p"))))
+                           for tc in tr.iter(_A + "tc")]
+                    if any(row):
+                        yield f"| {' | '.join(row)} |"
+            continue
+        for p in shape.iter(_A + "p"):
+            text = _paragraph_text(p)
+            if text:
+                yield text
+
+
+def _part_lines(stream: IO[bytes], include_tables: bool = True, notes: bool = False) -> List[str]:
+    """
+    Các dòng text của một part (slide hoặc notes). Mỗi lần chỉ parse một part:
+    slide nhỏ nên ET.parse (C) nhanh hơn iterparse từng sự kiện, bộ nhớ vẫn chỉ giữ một slide.
+    notes=True: bỏ placeholder số trang, ảnh slide, header/footer.
+    """
+    root = ET.parse(stream).getroot()
+    sp_tree = root.find(f"{_P}cSld/{_P}spTree")
+    if sp_tree is None:
+        return [text for text in map(_paragraph_text, root.iter(_A + "p")) if text]
+    return list(_iter_shape_lines(sp_tree, include_tables, notes))
+
+
+def _slide_text(z: zipfile.ZipFile, part: str, include_notes: bool, include_tables: bool) -> str:
+    with z.open(part) as f:
+        text = "\n".join(_part_lines(f, include_tables))
+    if include_notes:
+        notes = [target for rel_type, target in read_rels(z, part).values() if rel_type.endswith("/notesSlide")]
+        if notes:
+            with z.open(notes[0]) as f:
+                note_lines = _part_lines(f, include_tables, notes=True)
+            if note_lines:
+                text = "\n".join(filter(None, [text, NOTES_HEADING] + note_lines))
+    return text
+
+
+def _extract_slide_range(path: str, start: int = 0, end: Optional[int] = None, include_notes: bool = False,
+                         include_tables: bool = True) -> List[str]:
+    """Text của các slide [start, end) theo thứ tự trình chiếu, slide lỗi được thay bằng thông báo lỗi."""
+    texts = []
+    with zipfile.ZipFile(path, 'r') as z:
+        for part in slide_parts(z)[start:end]:
+            try:
+                texts.append(_slide_text(z, part, include_notes, include_tables))
+            except Exception as e:
+                texts.append(f"{PAGE_ERROR_PREFIX}{part}: {e}]")
+    return texts
+
+
+def extract_pptx_slides(path: Path, include_notes: bool = False, include_tables: bool = True,
+                        workers: Optional[int] = None, block: bool = False) -> List[str]:
+    """
+    Text của từng slide. Mỗi PPTX_SLIDES_PER_TASK slide là một phần chạy trong stage extract,
+    tối đa 2 * workers phần cùng lúc. block=False: raise StageOverloaded nếu stage đầy ngay từ đầu.
+    """
+    workers = PPTX_EXTRACT_WORKERS if workers is None else workers
+    if workers <= 1 or in_worker_process():
+        return _extract_slide_range(str(path), 0, None, include_notes, include_tables)
+
+    with zipfile.ZipFile(path, 'r') as z:
+        slide_count = len(slide_parts(z))
+
+    stage = get_stage("extract")
+    window = 2 * workers
+    in_flight: Deque = deque()
+    texts: List[str] = []
+    admitted = block
+    for start in range(0, max(slide_count, 1), PPTX_SLIDES_PER_TASK):
+        if len(in_flight) >= window:
+            texts.extend(in_flight.popleft().result())
+        in_flight.append(stage.submit(_extract_slide_range, str(path), start, start + PPTX_SLIDES_PER_TASK,
+                                      include_notes, include_tables, block=admitted))
+        admitted = True
+    while in_flight:
+        texts.extend(in_flight.popleft().result())
+    return texts
@@ -0,0 +1,213 @@
+# tesseract_engine.py
+"""
+Nhận dạng text trong các box (đã detect bằng PaddleOCR) bằng Tesseract, không tạo một process cho mỗi box.
+
+- tesserocr (pip install tesserocr): Tesseract được giữ sẵn trong process (pool tối đa TESSERACT_INSTANCES
+  instance cho mỗi ngôn ngữ). Ảnh trang được nạp một lần, mỗi box chỉ là SetRectangle trên ảnh đó,
+  không cắt/copy ảnh con.
+- Không có tesserocr: pytesseract chạy một lần cho cả trang (image_to_data), từng từ được gán vào box
+  chồng lấn nhiều nhất với nó. Một process tesseract mỗi trang thay vì mỗi box.
+Chạy trong worker của stage ocr (ocr_worker.py). So sánh độ trễ mỗi trang với cách cũ (pytesseract cho
+từng box): python benchmarks/bench_tesseract.py
+
+TESSERACT_ENGINE=auto       auto | tesserocr | pytesseract (auto: tesserocr nếu đã cài)
+TESSERACT_PSM=7             page segmentation mode cho mỗi box (7 = một dòng, đúng với box dòng của PaddleOCR)
+TESSERACT_INSTANCES=<số core>
+"""
+import importlib.util
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from image_prep import OcrImage, as_array, release_all
+
+TESSERACT_ENGINE = os.getenv("TESSERACT_ENGINE", "auto")
+TESSERACT_PSM = int(os.getenv("TESSERACT_PSM", "7"))
+TESSERACT_INSTANCES = int(os.getenv("TESSERACT_INSTANCES", str(os.cpu_count() or 1)))
+
+Rect = Tuple[int, int, int, int]  # x_min, y_min, x_max, y_max (pixel, x_max/y_max không tính)
+
+
+def box_to_rect(box: Sequence[Sequence[float]], width: int, height: int) -> Rect:
+    """Hình chữ nhật bao quanh box 4 điểm của PaddleOCR, cắt theo kích thước ảnh."""
+    xs = [int(pt[0]) for pt in box]
+    ys = [int(pt[1]) for pt in box]
+    return (min(max(0, min(xs)), width), min(max(0, min(ys)), height),
+            min(max(xs), width), min(max(ys), height))
+
+
+def tesserocr_available() -> bool:
+    return importlib.util.find_spec("tesserocr") is not None
+
+
+class _TesserocrPool:
+    """Các instance PyTessBaseAPI của một ngôn ngữ, tạo khi cần, dùng lại giữa các request."""
+
+    def __init__(self, lang: str, size: int = TESSERACT_INSTANCES):
+        self.lang = lang
+        self.size = max(1, size)
+        self._idle: "queue.LifoQueue[Any]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self) -> Iterator[Any]:
+        try:
+            api = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    api = self._create()
+                except BaseException:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                api = self._idle.get()
+        try:
+            yield api
+        finally:
+            self._idle.put(api)
+
+    def _create(self):
+        from tesserocr import PyTessBaseAPI
+
+        return PyTessBaseAPI(lang=self.lang, psm=TESSERACT_PSM)
+
+
+_pools: Dict[str, _TesserocrPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool(lang: str) -> _TesserocrPool:
+    with _pools_lock:
+        if lang not in _pools:
+            _pools[lang] = _TesserocrPool(lang)
+    return _pools[lang]
+
+
+def _recognize_tesserocr(image: np.ndarray, rects: List[Rect], lang: str) -> List[str]:
+    height, width = image.shape[:2]
+    channels = 1 if image.ndim == 2 else image.shape[2]
+    page = np.ascontiguousarray(image)
+    texts = []
+    with _pool(lang).acquire() as api:
+        # Một lần nạp ảnh cho cả trang; mỗi box chỉ giới hạn vùng nhận dạng
+        api.SetImageBytes(page.tobytes(), width, height, channels, page.strides[0])
+        for x_min, y_min, x_max, y_max in rects:
+            if x_max <= x_min or y_max <= y_min:
+                texts.append("")
+                continue
+            try:
+                api.SetRectangle(x_min, y_min, x_max - x_min, y_max - y_min)
+                texts.append(api.GetUTF8Text())
+            except Exception as e:
+                texts.append(f"[ERROR: {str(e)}]")
+        api.Clear()
+    return texts
+
+
+def _recognize_page_pass(image: np.ndarray, rects: List[Rect], lang: str) -> List[str]:
+    import pytesseract
+
+    data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+    words = [i for i, text in enumerate(data["text"]) if text and text.strip()]
+    if not words or not rects:
+        return [""] * len(rects)
+
+    left = np.array([data["left"][i] for i in words])
+    top = np.array([data["top"][i] for i in words])
+    right = left + np.array([data["width"][i] for i in words])
+    bottom = top + np.array([data["height"][i] for i in words])
+    r = np.array(rects)
+    # Diện tích giao nhau giữa từng từ (hàng) và từng box (cột)
+    overlap_w = np.minimum(right[:, None], r[None, :, 2]) - np.maximum(left[:, None], r[None, :, 0])
+    overlap_h = np.minimum(bottom[:, None], r[None, :, 3]) - np.maximum(top[:, None], r[None, :, 1])
+    overlap = np.clip(overlap_w, 0, None) * np.clip(overlap_h, 0, None)
+    owner = overlap.argmax(axis=1)
+    has_owner = overlap.max(axis=1) > 0
+
+    # Giữ thứ tự đọc của tesseract; xuống dòng khi từ thuộc một dòng khác trong cùng box
+    lines: List[List[Tuple[Tuple[int, int, int], List[str]]]] = [[] for _ in rects]
+    for n, i in enumerate(words):
+        if not has_owner[n]:
+            continue
+        line_id = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        box_lines = lines[owner[n]]
+        if not box_lines or box_lines[-1][0] != line_id:
+            box_lines.append((line_id, []))
+        box_lines[-1][1].append(data["text"][i].strip())
+    return ["\n".join(" ".join(ws) for _, ws in box_lines) for box_lines in lines]
+
+
+def _resolve(engine: str) -> str:
+    if engine == "auto":
+        return "tesserocr" if tesserocr_available() else "pytesseract"
+    return engine
+
+
+def recognize_boxes(image: np.ndarray, rects: List[Rect], lang: str, engine: str = TESSERACT_ENGINE) -> List[str]:
+    """Text của từng hình chữ nhật trên ảnh trang (numpy RGB hoặc grayscale), cùng thứ tự với rects."""
+    if _resolve(engine) == "tesserocr":
+        return _recognize_tesserocr(image, rects, lang)
+    return _recognize_page_pass(image, rects, lang)
+
+
+def recognize_detected(image: OcrImage, raw: Any, lang: str) -> List[Tuple[Any, str]]:
+    """Các box trong kết quả paddle.ocr + text Tesseract của từng box; lỗi được ghi vào text như cách cũ."""
+    try:
+        return _recognize_detected(as_array(image), raw, lang)
+    finally:
+        release_all([image])
+
+
+def _recognize_detected(image: np.ndarray, raw: Any, lang: str) -> List[Tuple[Any, str]]:
+    height, width = image.shape[:2]
+    boxes, rects = [], []
+    for block in raw:
+        for line in block or []:
+            try:
+                rects.append(box_to_rect(line[0], width, height))
+            except Exception:
+                continue
+            boxes.append(line[0])
+
+    try:
+        texts = recognize_boxes(image, rects, lang)
+    except Exception as e:
+        texts = [f"[ERROR: {str(e)}]"] * len(rects)
+    return [(box, text.strip()) for box, text in zip(boxes, texts)]
+
+
+def page_text(image: OcrImage, lang: str, engine: str = TESSERACT_ENGINE) -> str:
+    """Text của cả trang (page segmentation tự động)."""
+    try:
+        return _page_text(as_array(image), lang, engine)
+    finally:
+        release_all([image])
+
+
+def _page_text(image: np.ndarray, lang: str, engine: str) -> str:
+    if _resolve(engine) == "tesserocr":
+        height, width = image.shape[:2]
+        page = np.ascontiguousarray(image)
+        with _pool(lang).acquire() as api:
+            api.SetPageSegMode(3)
+            try:
+                api.SetImageBytes(page.tobytes(), width, height, 1 if page.ndim == 2 else page.shape[2], page.strides[0])
+                return api.GetUTF8Text()
+            finally:
+                api.SetPageSegMode(TESSERACT_PSM)
+                api.Clear()
+
+    import pytesseract
+
+    return pytesseract.image_to_string(image, lang=lang)
@@ -0,0 +1,74 @@
+# test_incremental.py
+"""
+/super-extract?incremental=true: PDF có trang trắng trên máy không có công cụ OCR vẫn được trích xuất
+thành công (files.added), lần gọi sau với manifest nhận được thì file không đổi (files.unchanged).
+Chạy từ thư mục gốc của repo: python -m pytest -q tests
+"""
+import io
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Cấu hình phải có trước khi import main: chunk store / job riêng cho test, trích xuất PDF trong thread
+_TMP = tempfile.mkdtemp(prefix="test_incremental_")
+os.environ.setdefault("CHUNK_STORE_DIR", os.path.join(_TMP, "chunk_store"))
+os.environ.setdefault("JOB_DIR", os.path.join(_TMP, "jobs"))
+os.environ.setdefault("PDF_EXTRACT_WORKERS", "1")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+import pdf_ocr  # noqa: E402
+
+
+def blank_middle_pdf() -> bytes:
+    """PDF 3 trang, trang 2 trắng (giống trang bìa / trang chỉ có số trang)."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    c.drawString(72, 760, "First page of the contract with enough text to skip OCR entirely.")
+    c.showPage()
+    c.showPage()
+    c.drawString(72, 760, "Third page of the contract with enough text to skip OCR entirely.")
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Không có pdftoppm / tesseract như cấu hình mặc định trong Readme
+    monkeypatch.setattr(pdf_ocr.shutil, "which", lambda name: None)
+    monkeypatch.setattr(pdf_ocr, "_warned", False)
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_blank_page_without_ocr_tools_is_added_then_unchanged(client):
+    pdf = blank_middle_pdf()
+
+    first = client.post("/super-extract", params={"incremental": "true"},
+                        files=[("files", ("mixed.pdf", pdf, "application/pdf"))])
+    assert first.status_code == 200
+    body = first.json()
+    assert body["files"]["added"] == ["mixed.pdf"]
+    assert body["files"]["failed"] == []
+    assert "mixed.pdf" in body["manifest"]["members"]
+    assert body["added"]
+
+    second = client.post("/super-extract",
+                         files=[("files", ("mixed.pdf", pdf, "application/pdf")),
+                                ("manifest", ("manifest.json", json.dumps(body["manifest"]), "application/json"))])
+    assert second.status_code == 200
+    body = second.json()
+    assert body["files"]["unchanged"] == ["mixed.pdf"]
+    assert body["files"]["failed"] == []
+    assert body["added"] == [] and body["removed"] == []
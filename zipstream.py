@@ -0,0 +1,58 @@
+# zipstream.py
+"""
+Ghi file ZIP dạng stream: mỗi entry được gửi cho client ngay khi file sẵn sàng,
+không tạo file zip trên đĩa, bộ nhớ chỉ giữ một khối dữ liệu tại một thời điểm.
+"""
+import zipfile
+from pathlib import Path
+from typing import Iterable, Iterator, Tuple
+
+ZIP_STREAM_BLOCK_SIZE = 64 * 1024
+
+# File đã nén sẵn, nén thêm chỉ tốn CPU
+_STORED_SUFFIXES = {".pdf", ".zip", ".png", ".jpg", ".jpeg", ".docx", ".pptx", ".xlsx"}
+
+
+class _StreamSink:
+    """File-like chỉ ghi (không seek/tell) để ZipFile dùng data descriptor thay vì quay lại sửa header."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data) -> int:
+        self._buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def stream_zip(entries: Iterable[Tuple[Path, str]]) -> Iterator[bytes]:
+    """
+    Nhận các cặp (đường dẫn file, tên trong zip) và yield các khối bytes của file ZIP.
+    `entries` có thể là generator: entry tiếp theo chỉ được lấy sau khi entry trước đã gửi xong.
+    """
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zipf:
+        for file_path, arcname in entries:
+            zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+            if file_path.suffix.lower() in _STORED_SUFFIXES:
+                zinfo.compress_type = zipfile.ZIP_STORED
+            else:
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+            with open(file_path, "rb") as src, zipf.open(zinfo, "w") as dst:
+                for block in iter(lambda: src.read(ZIP_STREAM_BLOCK_SIZE), b""):
+                    dst.write(block)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    # Central directory được ghi khi đóng ZipFile
+    yield sink.drain()